@@ -68,15 +68,27 @@ def run(args):
     instance_ids = []
     status_only = args.status_only or args.streams > 1
     try:
+        if args.streams > 1:
+            print("Starting {} pipelines".format(args.streams))
+            started_instance_ids = start_pipelines(args.server_address,
+                                                   args.pipeline,
+                                                   request,
+                                                   args.streams,
+                                                   show_request=args.show_request)
         for stream in range(args.streams):
-            if status_only:
+            if status_only and args.streams == 1:
                 print("Starting pipeline {}".format(stream+1))
             try:
-                started_instance_id = start_pipeline(args.server_address,
-                                                    args.pipeline,
-                                                    request,
-                                                    verbose=args.verbose,
-                                                    show_request=args.show_request)
+                if args.streams > 1:
+                    started_instance_id = started_instance_ids[stream]
+                    if started_instance_id is None:
+                        continue
+                else:
+                    started_instance_id = start_pipeline(args.server_address,
+                                                         args.pipeline,
+                                                         request,
+                                                         verbose=args.verbose,
+                                                         show_request=args.show_request)
                 instance_ids.append(started_instance_id)
                 if wait_for_pipeline_running(args.server_address, started_instance_id):
                     log_pipeline_running(started_instance_id, stream+1, args.verbose, status_only)
@@ -92,8 +104,11 @@ def run(args):
             print_fps(status)
     except KeyboardInterrupt:
         print()
-        for instance_id in instance_ids:
-            stop_pipeline(args.server_address, instance_id)
+        if len(instance_ids) > 1:
+            stop_pipelines(args.server_address, instance_ids)
+        else:
+            for instance_id in instance_ids:
+                stop_pipeline(args.server_address, instance_id)
         print_fps(wait_for_all_pipeline_completions(args.server_address, instance_ids))
     except Exception as exception:
         raise RuntimeError(exception) from exception
@@ -217,12 +232,7 @@ def update_request_options(request,
         with open(args.request_file, 'r') as request_file:
             request.update(json.load(request_file))
 
-def start_pipeline(server_address,
-                   pipeline,
-                   request,
-                   verbose=True,
-                   show_request=False):
-    """Launch requested pipeline"""
+def remove_destination_file(request):
     try:
         if request['destination']['metadata']['type'] == 'file':
             output_file = request['destination']['metadata']['path']
@@ -234,6 +244,14 @@ def start_pipeline(server_address,
     except OSError as error:
         raise OSError("Unable to delete destination metadata file {}".format(output_file)) from error
 
+def start_pipeline(server_address,
+                   pipeline,
+                   request,
+                   verbose=True,
+                   show_request=False):
+    """Launch requested pipeline"""
+    remove_destination_file(request)
+
     pipeline_url = urljoin(server_address, "pipelines/" + pipeline)
     instance_id = post(pipeline_url, request, show_request)
     if instance_id:
@@ -247,6 +265,35 @@ def start_pipeline(server_address,
 
     return None
 
+def start_pipelines(server_address,
+                    pipeline,
+                    request,
+                    count,
+                    show_request=False):
+    """Launch count instances of requested pipeline in a single batch request"""
+    remove_destination_file(request)
+
+    batch_url = urljoin(server_address, "/".join(["pipelines", pipeline, "batch"]))
+    results = post(batch_url, [request] * count, show_request)
+    instance_ids = []
+    for stream, result in enumerate(results):
+        if "id" in result:
+            print("Started pipeline {}, instance = {}".format(stream+1, result["id"]))
+            instance_ids.append(result["id"])
+        else:
+            print("Pipeline {} failed to start: {}".format(stream+1, result.get("error")))
+            instance_ids.append(None)
+    return instance_ids
+
+def stop_pipelines(server_address, instance_ids, show_request=False):
+    if not show_request:
+        print("Stopping Pipelines...")
+    stop_url = urljoin(server_address, "pipelines/stop")
+    results = post(stop_url, {"instances": instance_ids}, show_request)
+    stopped = [result for result in results if "error" not in result]
+    print("{} of {} pipelines stopped".format(len(stopped), len(instance_ids)))
+    return len(stopped) == len(instance_ids)
+
 def stop_pipeline(server_address, instance_id, show_request=False):
     if not show_request:
         print("Stopping Pipeline...")
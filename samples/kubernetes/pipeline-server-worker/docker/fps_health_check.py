@@ -15,7 +15,8 @@ AVAILABLE = 100
 NO_OF_RUNNING_PIPELINES = 0
 if TARGET_FPS > 0 or MAX_RUNNING_PIPELINES > 0:
     try:
-        status_all = requests.get('http://localhost:8080/pipelines/status')
+        status_all = requests.get('http://localhost:8080/pipelines/status',
+                                  params={'state': 'RUNNING', 'fields': 'state,avg_fps'})
         if status_all.status_code == 200:
             status_array = json.loads(status_all.text)
             for status in status_array:
@@ -0,0 +1,205 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import time
+from collections import deque
+from threading import Event, Lock, Thread
+from server.common.utils import logging
+from server.pipeline import Pipeline
+from server.pipeline_metrics import FrameRateMeter
+
+
+class FpsAdmissionController:
+    '''
+    Feedback controller that adjusts the number of pipeline instances
+    with a target fps allowed to run based on their frame rate.
+    Instances without a target are not limited.
+
+    Every evaluation interval the windowed fps of each running instance
+    that has a target is compared with that target. If any instance is
+    below target the limit is lowered below the current running count so
+    queued work is held. If every measured instance is above target by
+    more than the hysteresis margin, and none is still warming up, the
+    limit is raised in proportion to the smallest fps headroom. Once no
+    instance with a target is running the limit is removed.
+    '''
+
+    EVALUATION_INTERVAL = 1.0
+    MAX_DECISIONS = 100
+
+    def __init__(self, get_running, on_raise, target_fps=-1, hysteresis=0.1,
+                 window=10.0, max_running_pipelines=-1):
+        self._logger = logging.get_logger('FpsAdmissionController', is_static=True)
+        self._get_running = get_running
+        self._on_raise = on_raise
+        self.target_fps = target_fps
+        self.hysteresis = max(0.0, hysteresis)
+        self.window = max(FpsAdmissionController.EVALUATION_INTERVAL, window)
+        self.max_running_pipelines = max_running_pipelines
+        self.limit = None
+        self._lock = Lock()
+        self._targets = {}
+        self._samples = {}
+        self._decisions = deque(maxlen=FpsAdmissionController.MAX_DECISIONS)
+        self._last_evaluation = None
+        self._thread = None
+        self._stop_event = Event()
+        if self.target_fps > 0:
+            self._activate()
+
+    def enabled(self):
+        return self._thread is not None
+
+    def set_target(self, instance_id, target_fps):
+        if target_fps is None:
+            target_fps = self.target_fps
+        if target_fps is None or target_fps <= 0:
+            return
+        with self._lock:
+            self._targets[instance_id] = target_fps
+        self._activate()
+
+    def remove(self, instance_id):
+        with self._lock:
+            self._targets.pop(instance_id, None)
+            self._samples.pop(instance_id, None)
+
+    def admit(self, instance_id, running_instances):
+        limit = self.limit
+        if limit is None:
+            return True
+        with self._lock:
+            if instance_id not in self._targets:
+                return True
+            running_count = sum(1 for running_id in running_instances
+                                if running_id in self._targets)
+        return running_count < limit
+
+    def stop(self):
+        self._stop_event.set()
+
+    def get_state(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled(),
+                "target_fps": self.target_fps,
+                "hysteresis": self.hysteresis,
+                "window": self.window,
+                "limit": self.limit,
+                "last_evaluation": self._last_evaluation,
+                "decisions": list(self._decisions)
+            }
+
+    def _get_targeted_running(self):
+        # Read outside of the lock, the scheduler calls admit() with its
+        # own lock held
+        running = self._get_running()
+        with self._lock:
+            return [(instance_id, pipeline) for instance_id, pipeline in running
+                    if instance_id in self._targets]
+
+    def _activate(self):
+        running_count = len(self._get_targeted_running())
+        with self._lock:
+            if self.limit is None:
+                self.limit = max(1, running_count)
+            if self._thread:
+                return
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.wait(FpsAdmissionController.EVALUATION_INTERVAL):
+            try:
+                if self.evaluate():
+                    self._on_raise()
+            except Exception as error:
+                self._logger.error("Error evaluating admission limit: {}".format(error))
+
+    def _status_window_fps(self, status):
+        # Instances in worker processes, on other nodes or run by ffmpeg
+        # report windowed fps in their status
+        window_fps = status.get("fps")
+        if not window_fps:
+            return status["avg_fps"]
+        for window in FrameRateMeter.WINDOWS:
+            if window >= self.window:
+                break
+        return window_fps.get("{}s".format(window))
+
+    def _window_fps(self, instance_id, pipeline, status, now):
+        frame_count = getattr(pipeline, "frame_count", None)
+        if frame_count is None:
+            return self._status_window_fps(status)
+        samples = self._samples.setdefault(instance_id, deque())
+        samples.append((now, frame_count))
+        while len(samples) > 2 and now - samples[1][0] >= self.window:
+            samples.popleft()
+        elapsed = now - samples[0][0]
+        if elapsed < self.window:
+            return None
+        return (frame_count - samples[0][1]) / elapsed
+
+    def evaluate(self):
+        # pylint: disable=too-many-locals
+        now = time.time()
+        min_ratio = None
+        slowest = None
+        warming = 0
+        running = self._get_targeted_running()
+        with self._lock:
+            for instance_id, pipeline in running:
+                target = self._targets.get(instance_id)
+                if not target:
+                    continue
+                status = pipeline.status()
+                if status["state"] is not Pipeline.State.RUNNING:
+                    warming += 1
+                    continue
+                fps = self._window_fps(instance_id, pipeline, status, now)
+                if (fps is None) or (status["elapsed_time"] or 0) < self.window:
+                    warming += 1
+                    continue
+                ratio = fps / target
+                if min_ratio is None or ratio < min_ratio:
+                    min_ratio = ratio
+                    slowest = {"id": instance_id, "fps": fps, "target_fps": target}
+
+            running_count = len(running)
+            limit = self.limit
+            if not running:
+                action = "reset"
+                limit = None
+            elif min_ratio is None:
+                action = "hold"
+            elif min_ratio < 1.0:
+                action = "lower"
+                limit = max(1, min(running_count - 1, int(running_count * min_ratio)))
+            elif min_ratio >= 1.0 + self.hysteresis and not warming:
+                action = "raise"
+                limit = max(limit or 0, running_count + 1,
+                            int(running_count * min_ratio / (1.0 + self.hysteresis)))
+                if self.max_running_pipelines > 0:
+                    limit = min(limit, self.max_running_pipelines)
+            else:
+                action = "hold"
+
+            self._last_evaluation = {
+                "time": now,
+                "action": action,
+                "running": running_count,
+                "warming": warming,
+                "min_fps_ratio": min_ratio,
+                "slowest": slowest,
+                "limit": limit
+            }
+            raised = (self.limit is not None) and ((limit is None) or limit > self.limit)
+            if limit != self.limit:
+                self._decisions.append(self._last_evaluation)
+                self._logger.info("Admission limit {} from {} to {}".format(
+                    "raised" if raised else "lowered", self.limit, limit))
+                self.limit = limit
+        return raised
@@ -27,6 +27,76 @@ def parse_options(args=None):
     parser.add_argument("--max_running_pipelines", action="store",
                         dest="max_running_pipelines",
                         type=int, default=int(os.getenv('MAX_RUNNING_PIPELINES', '-1')))
+    parser.add_argument("--node_budget", action="store",
+                        dest="node_budget",
+                        type=str, default=os.getenv('NODE_BUDGET', '{}'))
+    parser.add_argument("--target_fps", action="store",
+                        dest="target_fps",
+                        type=float, default=float(os.getenv('TARGET_FPS', '-1')))
+    parser.add_argument("--fps_hysteresis", action="store",
+                        dest="fps_hysteresis",
+                        type=float, default=float(os.getenv('FPS_HYSTERESIS', '0.1')))
+    parser.add_argument("--fps_window", action="store",
+                        dest="fps_window",
+                        type=float, default=float(os.getenv('FPS_WINDOW', '10')))
+    parser.add_argument("--instance_ttl", action="store",
+                        dest="instance_ttl",
+                        type=float, default=float(os.getenv('INSTANCE_TTL', '-1')))
+    parser.add_argument("--max_stopped_instances", action="store",
+                        dest="max_stopped_instances",
+                        type=int, default=int(os.getenv('MAX_STOPPED_INSTANCES', '-1')))
+    parser.add_argument("--start_workers", action="store",
+                        dest="start_workers",
+                        type=int, default=int(os.getenv('START_WORKERS', '4')))
+    parser.add_argument("--mainloop_shards", action="store",
+                        dest="mainloop_shards",
+                        type=int, default=int(os.getenv('MAINLOOP_SHARDS', '1')))
+    parser.add_argument("--worker_processes", action="store",
+                        dest="worker_processes",
+                        type=int, default=int(os.getenv('WORKER_PROCESSES', '0')))
+    parser.add_argument("--coordinator",
+                        dest="coordinator",
+                        action="store",
+                        type=lambda x: bool(util.strtobool(x)),
+                        default=bool(util.strtobool(os.getenv('COORDINATOR', 'false'))))
+    parser.add_argument("--coordinator_nodes", action="store",
+                        dest="coordinator_nodes",
+                        type=str, default=os.getenv('COORDINATOR_NODES', ''))
+    parser.add_argument("--model_manifest", action="store",
+                        dest="model_manifest",
+                        type=str, default=os.getenv('MODEL_MANIFEST', ''))
+    parser.add_argument("--model_scan", action="store",
+                        dest="model_scan",
+                        choices=['all', 'referenced'], default=os.getenv('MODEL_SCAN', 'all'))
+    parser.add_argument("--model_reload_interval", action="store",
+                        dest="model_reload_interval",
+                        type=float, default=float(os.getenv('MODEL_RELOAD_INTERVAL', '0')))
+    parser.add_argument("--model_cache_dir", action="store",
+                        dest="model_cache_dir",
+                        type=str, default=os.getenv('MODEL_CACHE_DIR', ''))
+    parser.add_argument("--model_cache_size", action="store",
+                        dest="model_cache_size",
+                        type=int, default=int(os.getenv('MODEL_CACHE_SIZE', '-1')))
+    parser.add_argument("--shared_inference",
+                        dest="shared_inference",
+                        action="store",
+                        type=lambda x: bool(util.strtobool(x)),
+                        default=bool(util.strtobool(os.getenv('SHARED_INFERENCE', 'false'))))
+    parser.add_argument("--max_batch_size", action="store",
+                        dest="max_batch_size",
+                        type=int, default=int(os.getenv('MAX_BATCH_SIZE', '8')))
+    parser.add_argument("--pipeline_pool_size", action="store",
+                        dest="pipeline_pool_size",
+                        type=int, default=int(os.getenv('PIPELINE_POOL_SIZE', '0')))
+    parser.add_argument("--preload_pipelines", action="store",
+                        dest="preload_pipelines",
+                        type=str, default=os.getenv('PRELOAD_PIPELINES', ''))
+    parser.add_argument("--latency_sample_interval", action="store",
+                        dest="latency_sample_interval",
+                        type=int, default=int(os.getenv('LATENCY_SAMPLE_INTERVAL', '30')))
+    parser.add_argument("--profile_sample_rate", action="store",
+                        dest="profile_sample_rate",
+                        type=float, default=float(os.getenv('PROFILE_SAMPLE_RATE', '0')))
     parser.add_argument("--log_level", action="store",
                         dest="log_level",
                         choices=['INFO', 'DEBUG'], default=os.getenv('LOG_LEVEL', 'INFO'))
@@ -62,6 +132,9 @@ def parse_options(args=None):
     try:
         result = parser.parse_args(args)
         parse_network_preference(result)
+        parse_node_budget(result)
+        parse_coordinator_nodes(result)
+        parse_preload_pipelines(result)
     except Exception:
         print("Unrecognized argument passed to PipelineServer")
         parser.print_help()
@@ -74,3 +147,39 @@ def parse_network_preference(options):
         options.network_preference = json.loads(options.network_preference)
     except Exception:
         options.network_preference = {}
+
+
+def parse_node_budget(options):
+    try:
+        budget = json.loads(options.node_budget)
+    except ValueError as error:
+        raise ValueError("Invalid node budget {}: {}".format(options.node_budget, error))
+    if not isinstance(budget, dict):
+        raise ValueError("Invalid node budget {}: expected an object".format(
+            options.node_budget))
+    for resource, value in budget.items():
+        try:
+            if isinstance(value, bool):
+                raise ValueError()
+            budget[resource] = float(value)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid node budget value {} for resource {}".format(
+                json.dumps(value), resource))
+    options.node_budget = budget
+
+
+def parse_coordinator_nodes(options):
+    options.coordinator_nodes = [node.strip() for node in options.coordinator_nodes.split(",")
+                                 if node.strip()]
+
+
+def parse_preload_pipelines(options):
+    # name/version[:device...], e.g. object_detection/person_vehicle_bike:CPU:GPU
+    preload_pipelines = {}
+    for entry in options.preload_pipelines.split(","):
+        if not entry.strip():
+            continue
+        pipeline, *devices = entry.strip().split(":")
+        name, version = pipeline.split("/")
+        preload_pipelines[(name, version)] = devices
+    options.preload_pipelines = preload_pipelines
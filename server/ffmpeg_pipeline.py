@@ -4,7 +4,6 @@
 * SPDX-License-Identifier: BSD-3-Clause
 '''
 
-import string
 import shlex
 import subprocess
 import time
@@ -13,6 +12,7 @@ from threading import Lock
 from threading import Thread
 import shutil
 import re
+from collections import ChainMap
 from collections import OrderedDict
 from collections import namedtuple
 from collections import Counter
@@ -20,7 +20,9 @@ import json
 import os
 from datetime import datetime, timedelta
 
-from server.pipeline import Pipeline
+from server.pipeline import Pipeline, StartPhases
+from server.pipeline_metrics import FrameRateMeter
+from server.pipeline_template import PipelineTemplate
 from server.common.utils import logging
 
 
@@ -47,26 +49,35 @@ class FFmpegPipeline(Pipeline):
     Input = namedtuple("Input", ["range", "token", "properties"])
     Output = namedtuple("Output", ["range", "token", "format", "properties"])
 
+    SPLIT_CACHE_SIZE = 128
+    _split_cache = OrderedDict()
+    _split_cache_lock = Lock()
+
     def __init__(self, identifier, config, model_manager, request, finished_callback, _unused_options):
         # TODO: refactor as abstract interface
         # pylint: disable=super-init-not-called
         self.config = config
-        self.models = model_manager.models
         self.model_manager = model_manager
+        self._models = None
         self.template = config['template']
         self.identifier = identifier
         self._process = None
         self.start_time = None
         self.stop_time = None
+        self._start_phases = StartPhases()
         self._ffmpeg_launch_string = None
         self.request = request
         self.state = Pipeline.State.QUEUED
         self.fps = 0
+        self._fps_meter = FrameRateMeter()
+        self._frame_count = 0
+        self._dropped_frames = 0
         self._finished_callback = finished_callback
         self._logger = logging.get_logger('FFmpegPipeline', is_static=True)
         self._fps_regex = re.compile(
             r"\s*frame=\s*(?P<frame_count>\d+)\s*fps=\s*(?P<fps>\d+\.?\d*).*"
             r"time=(?P<duration>\d+:\d+:\d+\.\d+).*speed=\s*(?P<speed>\d+\.\d+)x")
+        self._drop_regex = re.compile(r"drop=\s*(?P<drop>\d+)")
         self._recording_started_regex = re.compile(
             r"\[segment @ 0x.*?\] Opening '(.*?)' for writing")
         self._recording_prefix = None
@@ -119,12 +130,24 @@ class FFmpegPipeline(Pipeline):
             "id": self.identifier,
             "state": self.state,
             "avg_fps": self.fps,
+            # ffmpeg reports progress about twice a second, so a stall
+            # shows as falling rates until the next report
+            "fps": self._fps_meter.rates(self.stop_time or time.time()),
+            "frames": self._get_frame_counts(),
             "start_time": self.start_time,
-            "elapsed_time": elapsed_time
+            "elapsed_time": elapsed_time,
+            "start_phases": self._start_phases.durations()
         }
 
         return status_obj
 
+    def _get_frame_counts(self):
+        # As last reported by ffmpeg
+        return {
+            "processed": self._frame_count,
+            "dropped": self._dropped_frames
+        }
+
     @staticmethod
     def validate_config(config):
         pass
@@ -138,6 +161,13 @@ class FFmpegPipeline(Pipeline):
 
         matched = self._fps_regex.match(next_line)
         if (matched):
+            if int(matched.group("frame_count")) > 0:
+                self._start_phases.end("first_frame")
+            self._frame_count = int(matched.group("frame_count"))
+            dropped = self._drop_regex.search(next_line)
+            if dropped:
+                self._dropped_frames = int(dropped.group("drop"))
+            self._fps_meter.update(self._frame_count)
             fps = float(matched.group('fps'))
 
             if (fps > 0):
@@ -212,6 +242,8 @@ class FFmpegPipeline(Pipeline):
                                                  bufsize=1,
                                                  universal_newlines=True)
                 self.state = Pipeline.State.RUNNING
+                self._fps_meter.start()
+                self._start_phases.end("preroll")
             else:
                 self._finished_callback()
                 return
@@ -260,7 +292,7 @@ class FFmpegPipeline(Pipeline):
                         _filter.properties["device"] = "CPU"
 
                     _filter.properties["model"] = self.model_manager.get_default_network_for_device(
-                        _filter.properties["device"], _filter.properties["model"])
+                        _filter.properties["device"], _filter.properties["model"], self._models)
 
                     self._logger.debug("Setting model to {} for filter {}".format(
                         _filter.properties["model"], _filter_key))
@@ -271,8 +303,9 @@ class FFmpegPipeline(Pipeline):
                 if ((_filter_key[0] in FFmpegPipeline.GVA_INFERENCE_FILTER_TYPES)):
                     if "model_proc" not in _filter.properties:
                         model_proc = None
-                        if _filter.properties["model"] in self.model_manager.model_procs:
-                            model_proc = self.model_manager.model_procs[_filter.properties["model"]]
+                        model_procs = self._models.model_properties["model-proc"]
+                        if _filter.properties["model"] in model_procs:
+                            model_proc = model_procs[_filter.properties["model"]]
                         if model_proc is not None:
                             _filter.properties["model_proc"] = model_proc
                             self._logger.debug("Setting model proc to {} for filter {}".format(
@@ -508,11 +541,26 @@ class FFmpegPipeline(Pipeline):
 
         return result
 
+    @staticmethod
+    def _split_launch_string(launch_string):
+        # Instances of a pipeline often render the same launch string
+        with FFmpegPipeline._split_cache_lock:
+            args = FFmpegPipeline._split_cache.get(launch_string)
+            if args is not None:
+                FFmpegPipeline._split_cache.move_to_end(launch_string)
+                return list(args)
+        args = tuple(shlex.split(launch_string))
+        with FFmpegPipeline._split_cache_lock:
+            FFmpegPipeline._split_cache[launch_string] = args
+            if len(FFmpegPipeline._split_cache) > FFmpegPipeline.SPLIT_CACHE_SIZE:
+                FFmpegPipeline._split_cache.popitem(last=False)
+        return list(args)
+
     def _parse_ffmpeg_launch_string(self, launch_string):
         # TODO: Fully parse ffmpeg syntax
 
         self._ffmpeg_args = ['ffmpeg']
-        self._ffmpeg_args.extend(shlex.split(launch_string))
+        self._ffmpeg_args.extend(FFmpegPipeline._split_launch_string(launch_string))
         self._video_filters = self._get_video_filters(self._ffmpeg_args)
         self._outputs = self._get_outputs(self._ffmpeg_args)
         self._inputs = self._get_inputs(self._ffmpeg_args)
@@ -656,21 +704,25 @@ class FFmpegPipeline(Pipeline):
                 self._set_recording_prefix(segment_key)
 
     def start(self):
+        self._start_phases.end("queued")
         with(self._create_delete_lock):
             if (self.start_time is not None):
                 return
             self._logger.debug("Starting Pipeline %s", self.identifier)
-            self.request["models"] = self.models
             self._escape_source()
-            self._ffmpeg_launch_string = string.Formatter().vformat(
-                self.template, [], self.request)
+            # Models are resolved from one snapshot for the whole start
+            self._models = self.model_manager.snapshot
+            self._ffmpeg_launch_string = PipelineTemplate.get(self.template).render(
+                ChainMap({"models": self._models.models}, self.request))
             self._parse_ffmpeg_launch_string(self._ffmpeg_launch_string)
+            self._start_phases.end("parse")
             self._set_properties()
             self._set_default_models()
             self._set_model_proc()
             self._initialize_segment_recording()
             self._generate_ffmpeg_launch_args()
             self._unescape_source()
+            self._start_phases.end("configure")
             thread = Thread(target=self._spawn, args=[self._ffmpeg_args])
             self.start_time = time.time()
             thread.start()
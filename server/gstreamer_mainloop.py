@@ -0,0 +1,129 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import time
+from threading import Event, Lock, Thread
+
+from gi.repository import GLib
+from server.common.utils import logging
+from server.pipeline_metrics import LatencyHistogram
+
+
+class GStreamerMainLoop:
+    '''
+    GLib main loop running on its own thread. Shard 0 runs the default
+    main context, other shards run a private context. Pipeline bus
+    watches are attached to the context of the shard they are assigned to.
+    '''
+
+    def __init__(self, index):
+        self.index = index
+        if index == 0:
+            self.context = GLib.MainContext.default()
+        else:
+            self.context = GLib.MainContext.new()
+        self.mainloop = GLib.MainLoop.new(self.context, False)
+        self.pipelines = 0
+        self.lag = LatencyHistogram()
+        self.last_lag = None
+        self._probe_pending = False
+        self._thread = Thread(target=self._loop, daemon=True,
+                              name="GStreamerMainLoop{}".format(index))
+
+    def _loop(self):
+        if self.index != 0:
+            self.context.push_thread_default()
+        try:
+            self.mainloop.run()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+
+    def start(self):
+        self._thread.start()
+
+    def quit(self):
+        self.mainloop.quit()
+
+    def add_signal_watch(self, bus):
+        self.context.push_thread_default()
+        try:
+            bus.add_signal_watch()
+        finally:
+            self.context.pop_thread_default()
+
+    def probe(self):
+        # Skip while the previous probe is undispatched so a stalled
+        # loop is not flooded; its lag is recorded when it runs.
+        if self._probe_pending:
+            return
+        self._probe_pending = True
+        source = GLib.idle_source_new()
+        source.set_priority(GLib.PRIORITY_DEFAULT)
+        source.set_callback(self._on_probe, time.time())
+        source.attach(self.context)
+
+    def _on_probe(self, scheduled):
+        self.last_lag = time.time() - scheduled
+        self.lag.record(self.last_lag)
+        self._probe_pending = False
+        return GLib.SOURCE_REMOVE
+
+    def get_metrics(self):
+        return {
+            "shard": self.index,
+            "pipelines": self.pipelines,
+            "last_lag": self.last_lag,
+            "lag": self.lag.snapshot()
+        }
+
+
+class GStreamerMainLoops:
+    '''
+    Set of main loop shards. Pipelines are assigned to the shard with
+    the fewest pipelines. A probe thread periodically schedules an idle
+    callback at default priority on every shard and records the delay
+    until it is dispatched, which is the time a bus message waits behind
+    other work on that loop.
+    '''
+
+    LAG_PROBE_INTERVAL = 1.0
+
+    def __init__(self, shards=1):
+        self._logger = logging.get_logger('GStreamerMainLoops', is_static=True)
+        self._lock = Lock()
+        self._stop_event = Event()
+        self.shards = [GStreamerMainLoop(index) for index in range(max(1, shards))]
+        for shard in self.shards:
+            shard.start()
+        self._probe_thread = Thread(target=self._probe, daemon=True)
+        self._probe_thread.start()
+        self._logger.debug("Started {} GLib main loop shards".format(len(self.shards)))
+
+    def assign(self):
+        with self._lock:
+            shard = min(self.shards, key=lambda shard: shard.pipelines)
+            shard.pipelines += 1
+            return shard
+
+    def release(self, shard):
+        with self._lock:
+            shard.pipelines = max(0, shard.pipelines - 1)
+
+    def quit(self):
+        self._stop_event.set()
+        for shard in self.shards:
+            shard.quit()
+
+    def _probe(self):
+        while not self._stop_event.wait(GStreamerMainLoops.LAG_PROBE_INTERVAL):
+            for shard in self.shards:
+                try:
+                    shard.probe()
+                except Exception as error:
+                    self._logger.debug("Main loop lag probe failed: {}".format(error))
+
+    def get_metrics(self):
+        return [shard.get_metrics() for shard in self.shards]
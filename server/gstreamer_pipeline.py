@@ -6,10 +6,13 @@
 import copy
 import json
 import os
+import re
 import string
 import time
-from threading import Lock, Thread
-from collections import namedtuple
+import traceback
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from collections import ChainMap, namedtuple
 
 import gi
 gi.require_version('Gst', '1.0')
@@ -19,7 +22,13 @@ from gi.repository import GLib, Gst, GstApp
 from server.app_destination import AppDestination
 from server.app_source import AppSource
 from server.common.utils import logging
-from server.pipeline import Pipeline
+from server.pipeline import Pipeline, StartPhases
+from server.pipeline_metrics import FrameRateMeter, LatencyHistogram
+from server.pipeline_template import PipelineTemplate
+from server.gstreamer_mainloop import GStreamerMainLoops
+from server.gstreamer_pipeline_pool import GStreamerPipelinePool
+from server.gstreamer_pipeline_profiler import GStreamerPipelineProfiler, PadSampler
+from server.inference_registry import InferenceRegistry
 from server.rtsp.gstreamer_rtsp_destination import GStreamerRtspDestination
 from server.rtsp.gstreamer_rtsp_server import GStreamerRtspServer
 from server.webrtc.gstreamer_webrtc_destination import GStreamerWebRTCDestination
@@ -37,6 +46,7 @@ class GStreamerPipeline(Pipeline):
                                    "GvaClassifyBin",
                                    "GvaInferenceBin",
                                    "GvaActionRecognitionBin"]
+    GVA_INFERENCE_ELEMENT_TYPE_SET = frozenset(GVA_INFERENCE_ELEMENT_TYPES)
     GVA_ELEMENT_ENUM_TYPES = ["GstGVAMetaPublishFileFormat",
                               "InferenceRegionType",
                               "GstGVAMetaconvertFormatType",
@@ -49,21 +59,27 @@ class GStreamerPipeline(Pipeline):
     SOURCE_ALIAS = "auto_source"
     GST_ELEMENTS_WITH_SOURCE_SETUP = ("GstURISourceBin")
 
+    TEARDOWN_WORKERS = 4
+    PRELOAD_ELEMENTS = ("gvadetect", "gvaclassify", "gvainference")
+    PRELOAD_TIMEOUT = 300
+    PRELOAD_MODEL_REFERENCE = re.compile(
+        r"model=\"?\{models\[([^\]]+)\]\[([^\]]+)\]\[network\]\}")
+
     _inference_element_cache = {}
-    _mainloop = None
-    _mainloop_thread = None
+    _property_cache = {}
+    _preloaded = {}
+    _inference_registry = None
+    _pipeline_pool = None
+    _mainloops = None
+    _mainloops_lock = Lock()
+    _teardown_executor = None
+    _teardown_executor_lock = Lock()
+    _bus_call_latency = LatencyHistogram()
+    _teardown_latency = LatencyHistogram()
     _rtsp_server = None
     _webrtc_manager = None
     CachedElement = namedtuple("CachedElement", ["element", "pipelines"])
 
-    @staticmethod
-    def gobject_mainloop():
-        GStreamerPipeline._mainloop = GLib.MainLoop.new(None, False)
-        try:
-            GStreamerPipeline._mainloop.run()
-        except (KeyboardInterrupt, SystemExit):
-            pass
-
     def __init__(self, identifier, config, model_manager, request, finished_callback, options):
         # TODO: refactor as abstract interface
         # pylint: disable=super-init-not-called
@@ -72,18 +88,25 @@ class GStreamerPipeline(Pipeline):
         self.pipeline = None
         self.template = config['template']
         self.model_manager = model_manager
+        self._models = None
         self.request = request
         self._auto_source = None
         self._unset_properties = []
         self.state = Pipeline.State.QUEUED
-        self.frame_count = 0
+        self._frame_count = 0
+        self._counting_sink = None
         self.start_time = None
         self.stop_time = None
+        self._start_phases = StartPhases()
         self._avg_fps = 0
+        self._fps_meter = FrameRateMeter()
+        self._qos_dropped = {}
         self._gst_launch_string = None
-        self.latency_times = dict()
-        self.sum_pipeline_latency = 0
-        self.count_pipeline_latency = 0
+        self._latency = None
+        self._latency_sample_interval = config.get(
+            "latency_sample_interval", getattr(options, "latency_sample_interval", 30))
+        if self._latency_sample_interval > 0:
+            self._latency = PadSampler(sample_interval=self._latency_sample_interval)
         self._real_base = None
         self._stream_base = None
         self._year_base = None
@@ -92,22 +115,36 @@ class GStreamerPipeline(Pipeline):
         self._dir_name = None
         self._bus_connection_id = None
         self._create_delete_lock = Lock()
+        self._delete_scheduled = False
         self._finished_callback = finished_callback
+        self._finished = False
         self._bus_messages = False
         self.appsrc_element = None
         self._app_source = None
         self.appsink_element = None
         self._app_destinations = []
         self._cached_element_keys = []
+        self._inference_elements = []
+        self._uses_compiled_model_cache = False
         self._logger = logging.get_logger('GSTPipeline', is_static=True)
         self.rtsp_path = None
-
-        if (not GStreamerPipeline._mainloop):
-            GStreamerPipeline._mainloop_thread = Thread(
-                target=GStreamerPipeline.gobject_mainloop)
-            GStreamerPipeline._mainloop_thread.daemon = True
-            GStreamerPipeline._mainloop_thread.start()
+        self._mainloop_shard = None
+        self._profile_sample_rate = config.get(
+            "profile_sample_rate", getattr(options, "profile_sample_rate", 0))
+        self._profiler = None
+        self._sampling_sources = []
+
+        self._pool_size = config.get("pool_size", getattr(options, "pipeline_pool_size", 0))
+        with GStreamerPipeline._mainloops_lock:
+            if (not GStreamerPipeline._mainloops):
+                GStreamerPipeline._mainloops = GStreamerMainLoops(
+                    getattr(options, "mainloop_shards", 1))
+            if (self._pool_size > 0) and (not GStreamerPipeline._pipeline_pool):
+                GStreamerPipeline._pipeline_pool = GStreamerPipelinePool()
         if options:
+            if (getattr(options, "shared_inference", False)
+                    and not GStreamerPipeline._inference_registry):
+                GStreamerPipeline._inference_registry = InferenceRegistry(options.max_batch_size)
             if (options.enable_rtsp and not GStreamerPipeline._rtsp_server):
                 GStreamerPipeline._rtsp_server = GStreamerRtspServer(options.rtsp_port)
                 GStreamerPipeline._rtsp_server.start()
@@ -127,11 +164,126 @@ class GStreamerPipeline(Pipeline):
         if (GStreamerPipeline._webrtc_manager):
             GStreamerPipeline._webrtc_manager.stop()
             GStreamerPipeline._webrtc_manager = None
-        if (GStreamerPipeline._mainloop):
-            GStreamerPipeline._mainloop.quit()
-            GStreamerPipeline._mainloop = None
-        if (GStreamerPipeline._mainloop_thread):
-            GStreamerPipeline._mainloop_thread = None
+        with GStreamerPipeline._mainloops_lock:
+            if (GStreamerPipeline._mainloops):
+                GStreamerPipeline._mainloops.quit()
+                GStreamerPipeline._mainloops = None
+            if (GStreamerPipeline._pipeline_pool):
+                GStreamerPipeline._pipeline_pool.stop()
+                GStreamerPipeline._pipeline_pool = None
+        with GStreamerPipeline._teardown_executor_lock:
+            if (GStreamerPipeline._teardown_executor):
+                GStreamerPipeline._teardown_executor.shutdown(wait=False)
+                GStreamerPipeline._teardown_executor = None
+        for _, pipeline in GStreamerPipeline._preloaded.values():
+            pipeline.set_state(Gst.State.NULL)
+        GStreamerPipeline._preloaded.clear()
+
+    @staticmethod
+    def get_metrics():
+        return {
+            "mainloop": {
+                "bus_call": GStreamerPipeline._bus_call_latency.snapshot(),
+                "shards": (GStreamerPipeline._mainloops.get_metrics()
+                           if GStreamerPipeline._mainloops else [])
+            },
+            "teardown": GStreamerPipeline._teardown_latency.snapshot(),
+            "inference_instances": (GStreamerPipeline._inference_registry.get_metrics()
+                                    if GStreamerPipeline._inference_registry else []),
+            "pipeline_pool": (GStreamerPipeline._pipeline_pool.get_metrics()
+                              if GStreamerPipeline._pipeline_pool else {})
+        }
+
+    @staticmethod
+    def _get_inference_models(template):
+        for segment in template.split("!"):
+            tokens = segment.split()
+            if tokens and tokens[0] in GStreamerPipeline.PRELOAD_ELEMENTS:
+                match = GStreamerPipeline.PRELOAD_MODEL_REFERENCE.search(segment)
+                if match:
+                    yield tokens[0], match.group(1), match.group(2)
+
+    @staticmethod
+    def preload(config, model_manager, devices):
+        for factory, model, version in GStreamerPipeline._get_inference_models(config["template"]):
+            for device in devices:
+                GStreamerPipeline._preload_element(model_manager, factory, model, version, device)
+
+    @staticmethod
+    def _preload_element(model_manager, factory, model, version, device):
+        """Prerolls a frame through an inference element and holds it paused.
+
+        Pipeline elements with no model-instance-id whose type and
+        engine properties (InferenceRegistry.PROPERTIES) match the held
+        element share its inference instance, so they do not read and
+        compile the network again.
+        """
+        logger = logging.get_logger('GSTPipeline', is_static=True)
+        start = time.time()
+        models = model_manager.snapshot
+        network = string.Formatter().vformat("{{models[{}][{}][network]}}".format(model, version),
+                                             [], {"models": models.models})
+        network = model_manager.get_default_network_for_device(device, network, models)
+        element = Gst.ElementFactory.make(factory, "inference")
+        if not element:
+            raise Exception("Element {} not found".format(factory))
+        element.set_property("model", network)
+        element.set_property("device", device)
+        for property_name in ("model-proc", "labels"):
+            value = models.model_properties[property_name].get(network)
+            if value:
+                element.set_property(property_name, value)
+        if model_manager.compiled_model_cache:
+            element.set_property("ie-config", model_manager.compiled_model_cache.configure(
+                element.get_property("ie-config"), network, device))
+        # Set up like a pipeline element with default properties, so only
+        # elements whose engine would be configured the same share it
+        key = InferenceRegistry.get_key(element, GStreamerPipeline._get_properties(element))
+        if key in GStreamerPipeline._preloaded:
+            return
+        instance_id = "preload_{}_{}_{}_{}".format(factory, model, version, device)
+        element.set_property("model-instance-id", instance_id)
+        source = Gst.ElementFactory.make("videotestsrc", "source")
+        source.set_property("num-buffers", 1)
+        convert = Gst.ElementFactory.make("videoconvert", "convert")
+        sink = Gst.ElementFactory.make("fakesink", "sink")
+        pipeline = Gst.Pipeline.new(instance_id)
+        for pipeline_element in (source, convert, element, sink):
+            pipeline.add(pipeline_element)
+        if not (source.link(convert) and convert.link(element) and element.link(sink)):
+            raise Exception("Unable to link preload pipeline for {}".format(network))
+        pipeline.set_state(Gst.State.PAUSED)
+        message = pipeline.get_bus().timed_pop_filtered(
+            GStreamerPipeline.PRELOAD_TIMEOUT * Gst.SECOND,
+            Gst.MessageType.ASYNC_DONE | Gst.MessageType.ERROR)
+        if (message is None) or (message.type == Gst.MessageType.ERROR):
+            pipeline.set_state(Gst.State.NULL)
+            error = message.parse_error()[0].message if message else "timed out"
+            raise Exception("Preloading {} on {} failed: {}".format(network, device, error))
+        GStreamerPipeline._preloaded[key] = (instance_id, pipeline)
+        if model_manager.compiled_model_cache:
+            model_manager.compiled_model_cache.schedule_update()
+        logger.info("Preloaded {} for {} on {} in {:.2f}s".format(
+            factory, network, device, time.time() - start))
+
+    @staticmethod
+    def _get_properties(element):
+        # Properties are fixed per GType, so list them once per process
+        type_name = element.__gtype__.name
+        properties = GStreamerPipeline._property_cache.get(type_name)
+        if properties is None:
+            properties = {paramspec.name: paramspec for paramspec in element.list_properties()}
+            GStreamerPipeline._property_cache[type_name] = properties
+        return properties
+
+    @staticmethod
+    def _get_teardown_executor():
+        with GStreamerPipeline._teardown_executor_lock:
+            if (not GStreamerPipeline._teardown_executor):
+                GStreamerPipeline._teardown_executor = ThreadPoolExecutor(
+                    max_workers=GStreamerPipeline.TEARDOWN_WORKERS,
+                    thread_name_prefix="GStreamerTeardown")
+            return GStreamerPipeline._teardown_executor
 
     def _verify_and_set_frame_destinations(self):
         destination = self.request.get("destination", {})
@@ -162,6 +314,7 @@ class GStreamerPipeline(Pipeline):
             self._app_destinations.append(webrtc_destination)
 
     def _delete_pipeline(self, new_state):
+        self._delete_scheduled = True
         self._cal_avg_fps()
         self.state = new_state
         self.stop_time = time.time()
@@ -169,12 +322,26 @@ class GStreamerPipeline(Pipeline):
                            " State to {next_state}".format(id=self.identifier,
                                                            next_state=new_state.name))
         if self.pipeline:
+            # Final count is read before the sink resets its statistics
+            self._fps_meter.update(self.frame_count, self.stop_time)
+            self._counting_sink = None
             bus = self.pipeline.get_bus()
             if self._bus_connection_id:
                 bus.remove_signal_watch()
                 bus.disconnect(self._bus_connection_id)
                 self._bus_connection_id = None
+            for source in self._sampling_sources:
+                source.destroy()
+            self._sampling_sources.clear()
+            if self._latency:
+                self._latency.stop()
+            if self._profiler:
+                self._profiler.stop()
+            if self._mainloop_shard and GStreamerPipeline._mainloops:
+                GStreamerPipeline._mainloops.release(self._mainloop_shard)
+            self._mainloop_shard = None
             self.pipeline.set_state(Gst.State.NULL)
+            self._inference_elements = []
             del self.pipeline
             self.pipeline = None
 
@@ -198,16 +365,63 @@ class GStreamerPipeline(Pipeline):
 
         if (new_state == Pipeline.State.ERROR):
             for key in self._cached_element_keys:
-                for pipeline in GStreamerPipeline._inference_element_cache[key].pipelines:
+                # Another pipeline sharing the element may have errored first
+                cached_element = GStreamerPipeline._inference_element_cache.pop(key, None)
+                if cached_element is None:
+                    continue
+                for pipeline in cached_element.pipelines:
                     if (self != pipeline):
                         pipeline.stop()
-                del GStreamerPipeline._inference_element_cache[key]
+        else:
+            for key in self._cached_element_keys:
+                cached_element = GStreamerPipeline._inference_element_cache.get(key)
+                if cached_element and self in cached_element.pipelines:
+                    cached_element.pipelines.remove(self)
+        self._cached_element_keys.clear()
+
+        if GStreamerPipeline._inference_registry:
+            GStreamerPipeline._inference_registry.release(
+                self, error=(new_state == Pipeline.State.ERROR))
 
+        self._call_finished_callback()
+
+    def _call_finished_callback(self):
+        if self._finished:
+            return
+        self._finished = True
         self._finished_callback()
 
     def _delete_pipeline_with_lock(self, new_state):
+        start = time.time()
         with(self._create_delete_lock):
-            self._delete_pipeline(new_state)
+            # Teardown runs on an executor that discards exceptions, and
+            # the instance must still release its slot and reservation
+            try:
+                self._delete_pipeline(new_state)
+            except Exception as error:
+                self._logger.error("Error on Pipeline {id}: Error in teardown: {err}".format(
+                    id=self.identifier, err=error))
+                self._logger.error(traceback.format_exc())
+                self.state = Pipeline.State.ERROR
+            finally:
+                try:
+                    self._call_finished_callback()
+                except Exception as error:
+                    self._logger.error("Error on Pipeline {id}: Error in finished callback: {err}".format(
+                        id=self.identifier, err=error))
+                    self._logger.error(traceback.format_exc())
+        GStreamerPipeline._teardown_latency.record(time.time() - start)
+
+    def _schedule_delete_pipeline(self, new_state):
+        # Teardown sets the pipeline to NULL, finishes app sources and
+        # destinations and starts queued work, so it runs on a worker
+        # instead of blocking bus messages for every other pipeline.
+        with(self._create_delete_lock):
+            if self._delete_scheduled:
+                return
+            self._delete_scheduled = True
+        GStreamerPipeline._get_teardown_executor().submit(
+            self._delete_pipeline_with_lock, new_state)
 
     def stop(self):
         with(self._create_delete_lock):
@@ -249,15 +463,48 @@ class GStreamerPipeline(Pipeline):
             "id": self.identifier,
             "state": self.state,
             "avg_fps": self.get_avg_fps(),
+            "fps": self._fps_meter.rates(self.stop_time),
+            "frames": self._get_frame_counts(),
             "start_time": self.start_time,
-            "elapsed_time": elapsed_time
+            "elapsed_time": elapsed_time,
+            "start_phases": self._start_phases.durations()
         }
-        if self.count_pipeline_latency != 0:
-            status_obj["avg_pipeline_latency"] = self.sum_pipeline_latency / \
-                self.count_pipeline_latency
+        if self._latency:
+            status_obj["pipeline_latency"] = self._get_latency()
 
         return status_obj
 
+    def profile(self):
+        if not self._profiler:
+            return {}
+        profile = self._profiler.snapshot()
+        profile["pipeline"] = self._get_latency() if self._latency else None
+        return profile
+
+    def _get_latency(self):
+        latency = self._latency.snapshot()
+        latency["sample_interval"] = self._latency_sample_interval
+        return latency
+
+    def _get_frame_counts(self):
+        # Read from the sink's statistics and QoS messages rather than
+        # probes on every buffer
+        return {
+            "processed": self.frame_count,
+            "dropped": sum(self._qos_dropped.values())
+        }
+
+    def _sample_frame_rate(self):
+        self._fps_meter.update(self.frame_count)
+
+    @property
+    def frame_count(self):
+        counting_sink = self._counting_sink
+        if counting_sink is not None:
+            rendered = counting_sink.get_property("stats").get_value("rendered")
+            self._frame_count = max(self._frame_count, rendered)
+        return self._frame_count
+
     def get_avg_fps(self):
         self._cal_avg_fps()
         return self._avg_fps
@@ -313,7 +560,7 @@ class GStreamerPipeline(Pipeline):
                                 element, property_name, request[key], format_type)
 
     def _set_element_property(self, element, property_name, property_value, format_type=None):
-        if (property_name in [x.name for x in element.list_properties()]):
+        if (property_name in GStreamerPipeline._get_properties(element)):
             if (format_type == "json"):
                 element.set_property(
                     property_name, json.dumps(property_value))
@@ -330,35 +577,34 @@ class GStreamerPipeline(Pipeline):
                                      property_name, element.__gtype__.name))
             self._unset_properties.append([element.__gtype__.name, property_name, property_value])
 
-    def _cache_inference_elements(self):
+    def _cache_inference_element(self, element, properties):
         model_instance_id = "model-instance-id"
-        gva_elements = [(element, element.__gtype__.name + '_'
-                         + element.get_property(model_instance_id))
-                        for element in self.pipeline.iterate_elements()
-                        if (element.__gtype__.name in self.GVA_INFERENCE_ELEMENT_TYPES
-                            and model_instance_id in [x.name for x in element.list_properties()]
-                            and element.get_property(model_instance_id))]
-        for element, key in gva_elements:
-            if key not in GStreamerPipeline._inference_element_cache:
-                GStreamerPipeline._inference_element_cache[key] = GStreamerPipeline.CachedElement(
-                    element, [])
-            self._cached_element_keys.append(key)
-            GStreamerPipeline._inference_element_cache[key].pipelines.append(self)
-
-    def _set_default_models(self):
+        if model_instance_id not in properties or not element.get_property(model_instance_id):
+            return
+        instance_id = element.get_property(model_instance_id)
+        # Preloaded instances are held by the server for its lifetime, so an
+        # error in one stream must not stop every stream that uses them
+        if any(instance_id == preloaded_id
+               for preloaded_id, _ in GStreamerPipeline._preloaded.values()):
+            return
+        key = element.__gtype__.name + '_' + instance_id
+        cached_element = GStreamerPipeline._inference_element_cache.setdefault(
+            key, GStreamerPipeline.CachedElement(element, []))
+        self._cached_element_keys.append(key)
+        cached_element.pipelines.append(self)
+
+    def _set_default_models(self, element, properties):
         model_device_pairing = [("model", "device"),
                                 ("enc-model", "enc-device"),
                                 ("dec-model", "dec-device")]
 
         for model_name, device_name in model_device_pairing:
-            gva_elements = [element for element in self.pipeline.iterate_elements() if (
-                element.__gtype__.name in self.GVA_INFERENCE_ELEMENT_TYPES and
-                element.find_property(model_name) and
-                "VA_DEVICE_DEFAULT" in element.get_property(model_name))]
-
-            for element in gva_elements:
+            if model_name not in properties:
+                continue
+            model = element.get_property(model_name)
+            if model and "VA_DEVICE_DEFAULT" in model:
                 network = self.model_manager.get_default_network_for_device(
-                    element.get_property(device_name), element.get_property(model_name))
+                    element.get_property(device_name), model, self._models)
                 self._logger.debug("Setting {} to {} for element {}".format(
                     model_name, network, element.get_name()))
                 element.set_property(model_name, network)
@@ -368,24 +614,39 @@ class GStreamerPipeline(Pipeline):
         return [element for element in pipeline.iterate_elements()
                 if element.__gtype__.name in type_strings]
 
-    def _set_model_property(self, property_name):
-        gva_elements = [element for element in self.pipeline.iterate_elements() if (
-            element.__gtype__.name in self.GVA_INFERENCE_ELEMENT_TYPES)]
-        for element in gva_elements:
-            if element.find_property(property_name) and not element.get_property(property_name):
-                if element.get_property("model") in self.model_manager.model_properties[property_name]:
-                    property_value = self.model_manager.model_properties[property_name][element.get_property("model")]
-                    if property_value is None:
-                        continue
-                    self._logger.debug("Setting {} to {} for element {}".format(
-                        property_name, property_value, element.get_name()))
-                    element.set_property(property_name, property_value)
+    def _set_model_property(self, element, properties, property_name):
+        if property_name in properties and not element.get_property(property_name):
+            model_properties = self._models.model_properties[property_name]
+            if element.get_property("model") in model_properties:
+                property_value = model_properties[element.get_property("model")]
+                if property_value is None:
+                    return
+                self._logger.debug("Setting {} to {} for element {}".format(
+                    property_name, property_value, element.get_name()))
+                element.set_property(property_name, property_value)
+
+    def _find_inference_elements(self):
+        self._inference_elements = [
+            (element, GStreamerPipeline._get_properties(element))
+            for element in self.pipeline.iterate_elements()
+            if element.__gtype__.name in self.GVA_INFERENCE_ELEMENT_TYPE_SET]
+
+    def _configure_inference_elements(self):
+        """Configures models and model instances in one pass over the inference elements"""
+        for element, properties in self._inference_elements:
+            self._set_default_models(element, properties)
+            self._set_model_property(element, properties, "model-proc")
+            self._set_model_property(element, properties, "labels")
+            self._set_compiled_model_cache(element, properties)
+            self._set_preloaded_instance_id(element, properties)
+            self._cache_inference_element(element, properties)
+            self._set_shared_instance_id(element, properties)
+            self._set_model_instance_id(element, properties)
 
     @staticmethod
     def validate_config(config):
         template = config["template"]
-        field_names = [fname for _, fname, _, _ in string.Formatter().parse(template)]
-        if GStreamerPipeline.SOURCE_ALIAS in field_names:
+        if GStreamerPipeline.SOURCE_ALIAS in PipelineTemplate.get(template).field_names:
             template = template.replace("{"+ GStreamerPipeline.SOURCE_ALIAS +"}", "fakesrc")
         pipeline = Gst.parse_launch(template)
         logger = logging.get_logger('GSTPipeline', is_static=True)
@@ -497,16 +758,54 @@ class GStreamerPipeline(Pipeline):
                 break
         return src
 
-    def _set_model_instance_id(self):
+    def _set_compiled_model_cache(self, element, properties):
+        compiled_model_cache = self.model_manager.compiled_model_cache
+        if not (compiled_model_cache and "ie-config" in properties and "device" in properties
+                and element.get_property("model")):
+            return
+        try:
+            ie_config = compiled_model_cache.configure(element.get_property("ie-config"),
+                                                       element.get_property("model"),
+                                                       element.get_property("device"))
+        except OSError as error:
+            self._logger.warning("Compiled model cache not used for element {}: {}".format(
+                element.get_name(), error))
+            return
+        self._logger.debug("Setting ie-config to {} for element {}".format(
+            ie_config, element.get_name()))
+        element.set_property("ie-config", ie_config)
+        self._uses_compiled_model_cache = True
+
+    def _set_preloaded_instance_id(self, element, properties):
+        model_instance_id = "model-instance-id"
+        if (not GStreamerPipeline._preloaded or model_instance_id not in properties
+                or element.get_property(model_instance_id)):
+            return
+        preloaded = GStreamerPipeline._preloaded.get(
+            InferenceRegistry.get_key(element, properties))
+        if preloaded:
+            element.set_property(model_instance_id, preloaded[0])
+
+    def _set_shared_instance_id(self, element, properties):
+        registry = GStreamerPipeline._inference_registry
+        model_instance_id = "model-instance-id"
+        if (not registry or model_instance_id not in properties
+                or element.get_property(model_instance_id)):
+            return
+        instance = registry.acquire(InferenceRegistry.get_key(element, properties), self)
+        element.set_property(model_instance_id, instance.identifier)
+        if ("batch-size" in properties) and (element.get_property("batch-size") == 1):
+            element.set_property("batch-size", instance.batch_size)
+        self._logger.debug("Setting {} to {} with batch-size {} for element {}".format(
+            model_instance_id, instance.identifier, instance.batch_size, element.get_name()))
+
+    def _set_model_instance_id(self, element, properties):
         model_instance_id = "model-instance-id"
-        gva_elements = [element for element in self.pipeline.iterate_elements()
-                        if (element.__gtype__.name in self.GVA_INFERENCE_ELEMENT_TYPES)
-                        and model_instance_id in [x.name for x in element.list_properties()]
-                        and not element.get_property(model_instance_id)]
-        for element in gva_elements:
-            name = element.get_property("name")
-            instance_id = name + "_" + str(self.identifier)
-            element.set_property(model_instance_id, instance_id)
+        if model_instance_id not in properties or element.get_property(model_instance_id):
+            return
+        name = element.get_property("name")
+        instance_id = name + "_" + str(self.identifier)
+        element.set_property(model_instance_id, instance_id)
 
     def _set_source_and_sink(self):
         src = self._get_any_source()
@@ -515,49 +814,65 @@ class GStreamerPipeline(Pipeline):
         sink = self.pipeline.get_by_name("appsink")
         if (not sink):
             sink = self.pipeline.get_by_name("sink")
-        if src and sink:
+        if src and sink and self._latency:
             src_pad = src.get_static_pad("src")
             if (src_pad):
-                src_pad.add_probe(Gst.PadProbeType.BUFFER,
-                                    GStreamerPipeline.source_probe_callback, self)
+                self._latency.add_start_pad(src_pad)
             else:
                 src.connect(
                     "pad-added", GStreamerPipeline.source_pad_added_callback, self)
-            sink_pad = sink.get_static_pad("sink")
-            sink_pad.add_probe(Gst.PadProbeType.BUFFER,
-                                GStreamerPipeline.appsink_probe_callback, self)
+            self._latency.add_end_pad(sink.get_static_pad("sink"))
 
     def start(self):
-        if self.model_manager:
-            self.request["models"] = self.model_manager.models
-        field_names = [fname for _, fname, _, _ in string.Formatter().parse(self.template)]
-        if self.SOURCE_ALIAS in field_names:
-            self._set_auto_source()
-            self.request[self.SOURCE_ALIAS] = self._auto_source
-        self._gst_launch_string = string.Formatter().vformat(
-            self.template, [], self.request)
-
+        self._start_phases.end("queued")
         with(self._create_delete_lock):
             if (self.start_time is not None):
                 return
 
+            if self.state.stopped():
+                # Stopped while waiting for a start worker
+                self._delete_pipeline(self.state)
+                return
+
             self._logger.debug("Starting Pipeline {id}".format(id=self.identifier))
-            self._logger.debug(self._gst_launch_string)
 
             try:
-                self.pipeline = Gst.parse_launch(self._gst_launch_string)
+                template = PipelineTemplate.get(self.template)
+                if self.SOURCE_ALIAS in template.field_names:
+                    self._set_auto_source()
+                    self.request[self.SOURCE_ALIAS] = self._auto_source
+                values = self.request
+                if self.model_manager:
+                    # Models are resolved from one snapshot for the whole
+                    # start, so a concurrent reload cannot mix two sets
+                    self._models = self.model_manager.snapshot
+                    values = ChainMap({"models": self._models.models}, self.request)
+                self._gst_launch_string = template.render(values)
+                self._logger.debug(self._gst_launch_string)
+
+                if (self._pool_size > 0) and GStreamerPipeline._pipeline_pool:
+                    self.pipeline = GStreamerPipeline._pipeline_pool.take(
+                        (self.config["name"], self.config["version"]),
+                        self._gst_launch_string, self._pool_size)
+                if self.pipeline is None:
+                    self.pipeline = Gst.parse_launch(self._gst_launch_string)
+                self._start_phases.end("parse")
                 self._set_properties()
                 self._set_bus_messages_flag()
-                self._set_default_models()
-                self._set_model_property("model-proc")
-                self._set_model_property("labels")
-                self._cache_inference_elements()
-                self._set_model_instance_id()
+                self._find_inference_elements()
+                self._configure_inference_elements()
                 self._set_source_and_sink()
+                if self._profile_sample_rate > 0:
+                    self._profiler = GStreamerPipelineProfiler(self._profile_sample_rate)
+                    self._profiler.attach(self.pipeline)
 
                 bus = self.pipeline.get_bus()
-                bus.add_signal_watch()
+                self._mainloop_shard = GStreamerPipeline._mainloops.assign()
+                self._mainloop_shard.add_signal_watch(bus)
                 self._bus_connection_id = bus.connect("message", self.bus_call)
+                self._add_sampling(FrameRateMeter.MIN_SAMPLE_INTERVAL, self._sample_frame_rate)
+                if self._profiler:
+                    self._add_sampling(1 / self._profile_sample_rate, self._profiler.sample)
                 splitmuxsink = self.pipeline.get_by_name("splitmuxsink")
                 self._real_base = None
 
@@ -573,6 +888,7 @@ class GStreamerPipeline(Pipeline):
                 if "prepare-pads" in self.config:
                     self.config["prepare-pads"](self.pipeline)
 
+                self._start_phases.end("configure")
                 self.pipeline.set_state(Gst.State.PLAYING)
                 self.start_time = time.time()
             except Exception as error:
@@ -581,6 +897,19 @@ class GStreamerPipeline(Pipeline):
                 # Context is already within _create_delete_lock
                 self._delete_pipeline(Pipeline.State.ERROR)
 
+    def _add_sampling(self, interval, sample):
+        # Samples are taken on the main loop the pipeline's bus is
+        # watched on, so they cost no thread of their own
+        source = GLib.timeout_source_new(max(1, int(interval * 1000)))
+        source.set_callback(GStreamerPipeline._sample_callback, sample)
+        source.attach(self._mainloop_shard.context)
+        self._sampling_sources.append(source)
+
+    @staticmethod
+    def _sample_callback(sample):
+        sample()
+        return GLib.SOURCE_CONTINUE
+
     def _log_launch_string(self):
         if not self._gst_launch_string or not logging.is_debug_level(self._logger):
             return
@@ -607,14 +936,14 @@ class GStreamerPipeline(Pipeline):
         properties_str = ""
         for element in self.pipeline.iterate_elements():
             if element_name in element.__gtype__.name.lower():
-                for paramspec in element.list_properties():
+                for paramspec in GStreamerPipeline._get_properties(element).values():
                     # Skipping adding of caps and params that aren't writable
                     if paramspec.name in ['caps', 'parent', 'name'] or paramspec.flags == 225:
                         continue
                     if add_defaults or paramspec.default_value != element.get_property(paramspec.name):
                         property_value = element.get_property(
                             paramspec.name)
-                        if element.find_property(paramspec.name).value_type.name \
+                        if paramspec.value_type.name \
                                 in self.GVA_ELEMENT_ENUM_TYPES:
                             property_value = property_value.value_nick
                         properties_str = "{} {}={}".format(
@@ -643,14 +972,26 @@ class GStreamerPipeline(Pipeline):
             self._app_destinations.append(app_destination)
 
         if self.appsink_element is not None:
-            self.appsink_element.set_property("emit-signals", True)
             self.appsink_element.set_property('sync', False)
 
             if not self._app_destinations:
-                self.appsink_element.connect("new-sample", self.on_sample)
+                self._set_counting_sink(self.appsink_element)
             else:
+                self.appsink_element.set_property("emit-signals", True)
                 self.appsink_element.connect("new-sample", self.on_sample_app_destination)
 
+    def _set_counting_sink(self, sink):
+        # Without an application destination samples are not needed, so
+        # instead of pulling each one into Python the sink discards them
+        # and frames are counted from its rendered statistics. A one shot
+        # probe records the first frame.
+        sink.set_property("emit-signals", False)
+        sink.set_property("drop", True)
+        sink.set_property("max-buffers", 1)
+        sink.set_property("wait-on-eos", False)
+        sink.get_static_pad("sink").add_probe(Gst.PadProbeType.BUFFER,
+                                              GStreamerPipeline.first_frame_probe_callback, self)
+        self._counting_sink = sink
 
     def on_need_data_app_source(self, src, _):
         try:
@@ -697,32 +1038,14 @@ class GStreamerPipeline(Pipeline):
 
     @staticmethod
     def source_pad_added_callback(unused_element, pad, self):
-        pad.add_probe(Gst.PadProbeType.BUFFER,
-                      GStreamerPipeline.source_probe_callback, self)
+        self._latency.add_start_pad(pad)
         return Gst.FlowReturn.OK
 
-    @staticmethod
-    def source_probe_callback(unused_pad, info, self):
-        buffer = info.get_buffer()
-        pts = buffer.pts
-        self.latency_times[pts] = time.time()
-        return Gst.PadProbeReturn.OK
-
     def source_setup_callback(self, unused_bin, src_element, unused_udata):
         for (element_name, property_name, property_value) in self._unset_properties:
             if element_name in self.GST_ELEMENTS_WITH_SOURCE_SETUP:
                 self._set_element_property(src_element, property_name, property_value, None)
 
-    @staticmethod
-    def appsink_probe_callback(unused_pad, info, self):
-        buffer = info.get_buffer()
-        pts = buffer.pts
-        source_time = self.latency_times.pop(pts, -1)
-        if source_time != -1:
-            self.sum_pipeline_latency += time.time() - source_time
-            self.count_pipeline_latency += 1
-        return Gst.PadProbeReturn.OK
-
     def on_sample_app_destination(self, sink):
         self._logger.debug("Received Sample from Pipeline {id}".format(
             id=self.identifier))
@@ -736,41 +1059,59 @@ class GStreamerPipeline(Pipeline):
                 id=self.identifier, err=error))
             return Gst.FlowReturn.ERROR
 
-        self.frame_count += 1
+        if not self._frame_count:
+            self._start_phases.end("first_frame")
+        self._frame_count += 1
         return Gst.FlowReturn.OK
 
-    def on_sample(self, sink):
-        _ = sink.emit("pull-sample")
-
-        self.frame_count += 1
-        return Gst.FlowReturn.OK
+    @staticmethod
+    def first_frame_probe_callback(unused_pad, unused_info, self):
+        self._start_phases.end("first_frame")
+        return Gst.PadProbeReturn.REMOVE
 
     def bus_call(self, unused_bus, message, unused_data=None):
+        start = time.time()
+        try:
+            return self._handle_bus_message(message)
+        finally:
+            GStreamerPipeline._bus_call_latency.record(time.time() - start)
+
+    def _handle_bus_message(self, message):
         message_type = message.type
         if message_type == Gst.MessageType.APPLICATION:
             self._logger.info("Pipeline {id} Aborted".format(id=self.identifier))
-            self._delete_pipeline_with_lock(Pipeline.State.ABORTED)
+            self._schedule_delete_pipeline(Pipeline.State.ABORTED)
         if message_type == Gst.MessageType.EOS:
             self._logger.info("Pipeline {id} Ended".format(id=self.identifier))
-            self._delete_pipeline_with_lock(Pipeline.State.COMPLETED)
+            self._schedule_delete_pipeline(Pipeline.State.COMPLETED)
         elif message_type == Gst.MessageType.ERROR:
             err, debug = message.parse_error()
             self._logger.error(
                 "Error on Pipeline {id}: {err}: {debug}".format(id=self.identifier,
                                                                 err=err,
                                                                 debug=debug))
-            self._delete_pipeline_with_lock(Pipeline.State.ERROR)
+            self._schedule_delete_pipeline(Pipeline.State.ERROR)
         elif message_type == Gst.MessageType.STATE_CHANGED:
             old_state, new_state, unused_pending_state = message.parse_state_changed()
             if message.src == self.pipeline:
                 if old_state == Gst.State.PAUSED and new_state == Gst.State.PLAYING:
                     if self.state is Pipeline.State.ABORTED:
-                        self._delete_pipeline_with_lock(Pipeline.State.ABORTED)
+                        self._schedule_delete_pipeline(Pipeline.State.ABORTED)
                     if self.state is Pipeline.State.QUEUED:
                         self._logger.info(
                             "Setting Pipeline {id} State to RUNNING".format(id=self.identifier))
                         self.state = Pipeline.State.RUNNING
                         self.start_time = time.time()
+                        self._fps_meter.start(self.start_time)
+                        self._start_phases.end("preroll")
+                        if self._uses_compiled_model_cache:
+                            # Networks are loaded and compiled models written
+                            self.model_manager.compiled_model_cache.schedule_update()
+        elif message_type == Gst.MessageType.QOS:
+            frame_format, _, dropped = message.parse_qos_stats()
+            if frame_format == Gst.Format.BUFFERS:
+                # Dropped counts are totals for each reporting element
+                self._qos_dropped[message.src.get_name()] = dropped
         else:
             if self._bus_messages:
                 structure = Gst.Message.get_structure(message)
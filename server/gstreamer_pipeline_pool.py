@@ -0,0 +1,113 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from gi.repository import Gst
+from server.common.utils import logging
+
+
+class GStreamerPipelinePool:
+    '''
+    Pipelines parsed ahead of demand, keyed by pipeline version and
+    launch string. Starting an instance takes a pooled pipeline instead
+    of parsing its launch string, and the pool is refilled in the
+    background.
+
+    Pooled pipelines are used once. Links to dynamic pads made by
+    parse_launch are only made once, so a pipeline that has run cannot
+    be reset and reused for another source. They are held in NULL so
+    elements that open resources in READY, such as capture devices,
+    are configured for the request before they do. Inference elements
+    therefore load their models when the instance starts, not in the
+    pool; preloaded models are shared instead of compiled again.
+    '''
+
+    MAX_LAUNCH_STRINGS = 4
+
+    def __init__(self):
+        self._logger = logging.get_logger('GStreamerPipelinePool', is_static=True)
+        self._lock = Lock()
+        self._pools = {}
+        self._refilling = set()
+        self._stats = {}
+        self._executor = ThreadPoolExecutor(max_workers=1,
+                                            thread_name_prefix="GStreamerPipelinePool")
+
+    def take(self, pipeline, launch_string, size):
+        """Returns a pooled pipeline for launch_string or None"""
+        if size <= 0:
+            return None
+        with self._lock:
+            launch_strings = self._pools.setdefault(pipeline, OrderedDict())
+            pool = launch_strings.get(launch_string)
+            if pool is None:
+                pool = launch_strings[launch_string] = deque()
+                while len(launch_strings) > GStreamerPipelinePool.MAX_LAUNCH_STRINGS:
+                    _, evicted = launch_strings.popitem(last=False)
+                    self._release(evicted)
+            launch_strings.move_to_end(launch_string)
+            stats = self._stats.setdefault(pipeline, {"hits": 0, "misses": 0})
+            result = pool.popleft() if pool else None
+            if result is not None:
+                stats["hits"] += 1
+            else:
+                stats["misses"] += 1
+            key = (pipeline, launch_string)
+            if key not in self._refilling:
+                self._refilling.add(key)
+                self._executor.submit(self._refill, pipeline, launch_string, size)
+        return result
+
+    def _refill(self, pipeline, launch_string, size):
+        try:
+            while True:
+                with self._lock:
+                    pool = self._pools.get(pipeline, {}).get(launch_string)
+                    if (pool is None) or (len(pool) >= size):
+                        break
+                gst_pipeline = Gst.parse_launch(launch_string)
+                with self._lock:
+                    pool = self._pools.get(pipeline, {}).get(launch_string)
+                    if pool is not None:
+                        pool.append(gst_pipeline)
+                        continue
+                gst_pipeline.set_state(Gst.State.NULL)
+                break
+        except Exception as error:
+            self._logger.warning("Error pooling pipeline {}/{}: {}".format(
+                pipeline[0], pipeline[1], error))
+        finally:
+            with self._lock:
+                self._refilling.discard((pipeline, launch_string))
+
+    @staticmethod
+    def _release(pool):
+        while pool:
+            pool.popleft().set_state(Gst.State.NULL)
+
+    def stop(self):
+        with self._lock:
+            for launch_strings in self._pools.values():
+                for pool in launch_strings.values():
+                    self._release(pool)
+            self._pools.clear()
+        self._executor.shutdown(wait=False)
+
+    def get_metrics(self):
+        with self._lock:
+            metrics = {}
+            for pipeline, stats in self._stats.items():
+                requests = stats["hits"] + stats["misses"]
+                metrics["{}/{}".format(*pipeline)] = {
+                    "hits": stats["hits"],
+                    "misses": stats["misses"],
+                    "hit_rate": (stats["hits"] / requests) if requests else None,
+                    "pooled": sum(len(pool) for pool in self._pools.get(pipeline, {}).values())
+                }
+            return metrics
@@ -0,0 +1,211 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import time
+from threading import Lock
+
+from gi.repository import Gst
+from server.pipeline_metrics import LatencyTracker
+
+
+class PadSampler:
+    '''
+    Latency of sampled buffers from a set of start pads to a set of end
+    pads, matched by buffer timestamp.
+
+    With a sample_interval, a probe stays on the start pads and samples
+    one in every sample_interval buffers. Otherwise sample() adds a
+    probe to the start pads that samples the next buffer and removes
+    itself. The sample is held in the ring of a
+    LatencyTracker until a buffer with the same timestamp passes an end
+    pad, so it is recorded however long it takes, including longer than
+    the time between samples. Probes are attached to the end pads only
+    while samples are pending. A sample is counted as unmatched when
+    the ring evicts it, so a buffer that never leaves, such as one that
+    was dropped or whose timestamp was rewritten, keeps the end pad
+    probes attached until size more samples have been taken.
+    '''
+
+    def __init__(self, size=LatencyTracker.SIZE, sample_interval=0):
+        self.sample_interval = sample_interval
+        self.tracker = LatencyTracker(sample_interval, size)
+        self._lock = Lock()
+        self._stopped = False
+        self._start_pads = []
+        self._end_pads = []
+        self._start_probes = {}
+        self._end_probes = {}
+
+    def add_start_pad(self, pad):
+        with self._lock:
+            self._start_pads.append(pad)
+            if (self.sample_interval > 0) and (not self._stopped):
+                index = len(self._start_pads) - 1
+                self._start_probes[index] = pad.add_probe(
+                    Gst.PadProbeType.BUFFER, self._start_probe, index)
+
+    def add_end_pad(self, pad):
+        with self._lock:
+            self._end_pads.append(pad)
+            if self._end_probes:
+                self._add_end_probe(len(self._end_pads) - 1)
+
+    def sample(self):
+        with self._lock:
+            if self._stopped or self._start_probes:
+                # Stopped, sampling by interval or no buffer since the
+                # last sample
+                return
+            for index, pad in enumerate(self._start_pads):
+                self._start_probes[index] = pad.add_probe(
+                    Gst.PadProbeType.BUFFER, self._start_probe, index)
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            self.tracker.clear()
+            self._remove_probes(self._start_pads, self._start_probes)
+            self._remove_probes(self._end_pads, self._end_probes)
+
+    @staticmethod
+    def _remove_probes(pads, probes, current=None):
+        # The probe being called removes itself by its return value
+        for index, probe_id in probes.items():
+            if index != current:
+                pads[index].remove_probe(probe_id)
+        probes.clear()
+
+    def _add_end_probe(self, index):
+        self._end_probes[index] = self._end_pads[index].add_probe(
+            Gst.PadProbeType.BUFFER, self._end_probe, index)
+
+    def _start_probe(self, unused_pad, info, index):
+        pts = info.get_buffer().pts
+        with self._lock:
+            if index not in self._start_probes:
+                return Gst.PadProbeReturn.REMOVE
+            if self.sample_interval > 0:
+                if pts != Gst.CLOCK_TIME_NONE:
+                    self._start(pts)
+                return Gst.PadProbeReturn.OK
+            self._remove_probes(self._start_pads, self._start_probes, index)
+            if pts != Gst.CLOCK_TIME_NONE:
+                self._start(pts)
+        return Gst.PadProbeReturn.REMOVE
+
+    def _start(self, pts):
+        if self.tracker.start(pts) and not self._end_probes:
+            for end_index in range(len(self._end_pads)):
+                self._add_end_probe(end_index)
+
+    def _end_probe(self, unused_pad, info, index):
+        pts = info.get_buffer().pts
+        now = time.perf_counter()
+        with self._lock:
+            if index not in self._end_probes:
+                return Gst.PadProbeReturn.REMOVE
+            if (not self.tracker.end(pts, now)) or self.tracker.pending:
+                return Gst.PadProbeReturn.OK
+            self._remove_probes(self._end_pads, self._end_probes, index)
+        return Gst.PadProbeReturn.REMOVE
+
+    def snapshot(self):
+        return self.tracker.snapshot()
+
+
+class ProfiledElement:
+    '''
+    Latency of sampled buffers through one element, from its sink pads
+    to its src pads.
+    '''
+
+    # Elements that drop buffers or rewrite their timestamps never match
+    # some samples, so a small ring bounds how long those keep the src
+    # pad probes attached
+    RING_SIZE = 16
+
+    __slots__ = ("type", "sampler", "sink", "src")
+
+    def __init__(self, element):
+        self.type = element.__gtype__.name
+        self.sampler = PadSampler(ProfiledElement.RING_SIZE)
+        self.sink = False
+        self.src = False
+
+
+class GStreamerPipelineProfiler:
+    '''
+    Per element latency of a pipeline, measured on the sink and src
+    pads of every element including elements added after the pipeline
+    starts, such as the children of decodebin.
+
+    sample() is called sample_rate times a second and samples the next
+    buffer entering each element. Up to ProfiledElement.RING_SIZE
+    samples per element are in flight at once, so an element is sampled
+    correctly while its latency is below RING_SIZE / sample_rate
+    seconds; past that, samples are evicted and counted as unmatched.
+    Sink pad probes are only attached until the next buffer and src pad
+    probes while samples are in flight. Once an element's latency
+    exceeds 1 / sample_rate its src pads are probed for every buffer.
+    '''
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self._elements = {}
+        self._lock = Lock()
+
+    def attach(self, pipeline):
+        for element in pipeline.iterate_recurse():
+            self._add_element(element)
+        pipeline.connect("deep-element-added", self._deep_element_added)
+
+    def _deep_element_added(self, unused_bin, unused_sub_bin, element):
+        self._add_element(element)
+
+    def _add_element(self, element):
+        with self._lock:
+            name = element.get_name()
+            if name in self._elements:
+                return
+            profiled = self._elements[name] = ProfiledElement(element)
+        for pad in element.pads:
+            self._add_pad(pad, profiled)
+        element.connect("pad-added", self._pad_added, profiled)
+
+    def _pad_added(self, unused_element, pad, profiled):
+        self._add_pad(pad, profiled)
+
+    @staticmethod
+    def _add_pad(pad, profiled):
+        if pad.get_direction() == Gst.PadDirection.SINK:
+            profiled.sink = True
+            profiled.sampler.add_start_pad(pad)
+        elif pad.get_direction() == Gst.PadDirection.SRC:
+            profiled.src = True
+            profiled.sampler.add_end_pad(pad)
+
+    def _get_profiled(self):
+        with self._lock:
+            return [(name, profiled) for name, profiled in self._elements.items()
+                    if profiled.sink and profiled.src]
+
+    def sample(self):
+        for _, profiled in self._get_profiled():
+            profiled.sampler.sample()
+
+    def stop(self):
+        for _, profiled in self._get_profiled():
+            profiled.sampler.stop()
+
+    def snapshot(self):
+        result = {}
+        for name, profiled in self._get_profiled():
+            result[name] = profiled.sampler.snapshot()
+            result[name]["type"] = profiled.type
+        return {
+            "sample_rate": self.sample_rate,
+            "elements": result
+        }
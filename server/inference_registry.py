@@ -0,0 +1,122 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import itertools
+from threading import Lock
+
+
+class InferenceInstance:
+    '''
+    Inference instance shared by elements with the same configuration.
+    The engine is created with the batch size of the instance by the
+    first element attached to it and freed when the last one detaches.
+    '''
+
+    def __init__(self, key, identifier, batch_size):
+        self.key = key
+        self.identifier = identifier
+        self.batch_size = batch_size
+        self.pipelines = {}
+        self.retired = False
+
+    def info(self):
+        properties = dict(self.key[1:])
+        return {
+            "id": self.identifier,
+            "element": self.key[0],
+            "model": properties.get("model"),
+            "device": properties.get("device"),
+            "batch_size": self.batch_size,
+            "streams": sum(self.pipelines.values())
+        }
+
+
+class InferenceRegistry:
+    '''
+    Groups inference elements that have no model-instance-id into
+    shared inference instances by element type and the properties that
+    configure the engine, so streams running the same model share one
+    engine and can be batched together.
+
+    Instances are reference counted by attached elements. The first
+    instance of a configuration has a batch size of one, so a single
+    stream is not delayed filling batches. When a second stream is
+    attached, it and later streams go to an instance with max_batch_size
+    that keeps accepting streams, and the first instance is freed when
+    its stream finishes. A configuration therefore has at most two
+    engines, rather than one per doubling of its streams. Elements with
+    an explicit batch-size are grouped by it and keep it.
+    '''
+
+    PROPERTIES = ("model", "device", "model-proc", "labels", "ie-config", "nireq",
+                  "pre-process-backend", "inference-region", "reshape", "reshape-width",
+                  "reshape-height", "cpu-throughput-streams", "gpu-throughput-streams",
+                  "device-extensions")
+
+    def __init__(self, max_batch_size=1):
+        self.max_batch_size = max(1, max_batch_size)
+        self._lock = Lock()
+        self._current = {}
+        self._instances = {}
+        self._sequence = itertools.count()
+
+    BATCH_SIZE = "batch-size"
+
+    @staticmethod
+    def get_key(element, property_names):
+        key = (element.__gtype__.name,) + tuple(
+            (name, str(element.get_property(name)))
+            for name in InferenceRegistry.PROPERTIES if name in property_names)
+        if InferenceRegistry.BATCH_SIZE in property_names:
+            # The default of one leaves the batch size to the registry
+            batch_size = element.get_property(InferenceRegistry.BATCH_SIZE)
+            if batch_size != 1:
+                key += ((InferenceRegistry.BATCH_SIZE, str(batch_size)),)
+        return key
+
+    def _get_batch_size(self, key, instance):
+        properties = dict(key[1:])
+        if InferenceRegistry.BATCH_SIZE in properties:
+            return int(properties[InferenceRegistry.BATCH_SIZE])
+        if instance is None:
+            return 1
+        return self.max_batch_size
+
+    def acquire(self, key, pipeline):
+        """Attaches an element of pipeline and returns its shared instance"""
+        with self._lock:
+            instance = self._current.get(key)
+            batch_size = self._get_batch_size(key, instance)
+            if (instance is None) or ((batch_size > instance.batch_size)
+                                      and (pipeline not in instance.pipelines)):
+                if instance is not None:
+                    instance.retired = True
+                instance = InferenceInstance(
+                    key, "shared_{}".format(next(self._sequence)), batch_size)
+                self._current[key] = instance
+                self._instances[instance.identifier] = instance
+            instance.pipelines[pipeline] = instance.pipelines.get(pipeline, 0) + 1
+            return instance
+
+    def release(self, pipeline, error=False):
+        """Detaches the elements of pipeline, retiring their instances on error"""
+        with self._lock:
+            for identifier, instance in list(self._instances.items()):
+                if pipeline not in instance.pipelines:
+                    continue
+                del instance.pipelines[pipeline]
+                if error:
+                    instance.retired = True
+                if instance.retired and self._current.get(instance.key) is instance:
+                    del self._current[instance.key]
+                if not instance.pipelines:
+                    del self._instances[identifier]
+                    if self._current.get(instance.key) is instance:
+                        del self._current[instance.key]
+
+    def get_metrics(self):
+        with self._lock:
+            return [instance.info() for instance in self._instances.values()]
@@ -0,0 +1,200 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import bisect
+import heapq
+import itertools
+import json
+from collections import defaultdict
+from threading import Lock
+
+from server.pipeline import Pipeline
+
+
+class SequenceIndex:
+    '''
+    Instance ids ordered by creation sequence. A sorted list of sequences
+    allows iterating from a cursor without visiting earlier entries and a
+    dict from sequence to id provides membership.
+    '''
+
+    __slots__ = ("_sequences", "_ids")
+
+    def __init__(self):
+        self._sequences = []
+        self._ids = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, sequence):
+        return sequence in self._ids
+
+    def add(self, sequence, instance_id):
+        if self._sequences and sequence < self._sequences[-1]:
+            bisect.insort(self._sequences, sequence)
+        else:
+            self._sequences.append(sequence)
+        self._ids[sequence] = instance_id
+
+    def discard(self, sequence):
+        if self._ids.pop(sequence, None) is None:
+            return
+        del self._sequences[bisect.bisect_left(self._sequences, sequence)]
+
+    def after(self, cursor):
+        start = bisect.bisect_right(self._sequences, cursor)
+        return map(self._sequences.__getitem__, range(start, len(self._sequences)))
+
+    def get(self, sequence):
+        return self._ids[sequence]
+
+
+class InstanceIndex:
+    '''
+    Secondary indexes over pipeline instances by pipeline name/version,
+    tag and state. Instances are added as QUEUED, move to RUNNING when
+    the scheduler starts them and to their final state when they stop.
+    Each index keeps its instances in creation order, so a query walks
+    the smallest matching index from the cursor and a page costs in
+    proportion to the instances visited to fill it rather than to the
+    size of the index.
+    '''
+
+    QUERY_BATCH = 64
+
+    def __init__(self):
+        self._lock = Lock()
+        self._sequence = itertools.count(1)
+        self._order = {}
+        self._keys = {}
+        self._all = SequenceIndex()
+        self._by_state = defaultdict(SequenceIndex)
+        self._by_pipeline = defaultdict(SequenceIndex)
+        self._by_name = defaultdict(SequenceIndex)
+        self._by_tag = defaultdict(SequenceIndex)
+
+    @staticmethod
+    def tag_key(key, value=None):
+        if value is None:
+            return (key, None)
+        return (key, json.dumps(value, sort_keys=True))
+
+    @staticmethod
+    def parse_tag(tag):
+        key, separator, value = tag.partition(":")
+        if not separator:
+            return InstanceIndex.tag_key(key)
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        return InstanceIndex.tag_key(key, value)
+
+    def add(self, instance_id, name, version, tags=None):
+        tag_keys = []
+        for key, value in (tags or {}).items():
+            tag_keys.append(InstanceIndex.tag_key(key))
+            try:
+                tag_keys.append(InstanceIndex.tag_key(key, value))
+            except (TypeError, ValueError):
+                pass
+        with self._lock:
+            sequence = self._order[instance_id] = next(self._sequence)
+            self._keys[instance_id] = ((name, version), tag_keys, Pipeline.State.QUEUED)
+            self._all.add(sequence, instance_id)
+            self._by_state[Pipeline.State.QUEUED].add(sequence, instance_id)
+            self._by_pipeline[(name, version)].add(sequence, instance_id)
+            self._by_name[name].add(sequence, instance_id)
+            for tag_key in tag_keys:
+                self._by_tag[tag_key].add(sequence, instance_id)
+
+    def set_running(self, instance_id):
+        with self._lock:
+            keys = self._keys.get(instance_id)
+            if (keys is not None) and (keys[2] is Pipeline.State.QUEUED):
+                self._set_state(instance_id, keys, Pipeline.State.RUNNING)
+
+    def set_stopped(self, instance_id, state):
+        with self._lock:
+            keys = self._keys.get(instance_id)
+            if (keys is not None) and (not keys[2].stopped()):
+                self._set_state(instance_id, keys, state)
+
+    def _set_state(self, instance_id, keys, state):
+        pipeline_key, tag_keys, previous = keys
+        sequence = self._order[instance_id]
+        self._keys[instance_id] = (pipeline_key, tag_keys, state)
+        self._discard(self._by_state, previous, sequence)
+        self._by_state[state].add(sequence, instance_id)
+
+    def remove(self, instance_id):
+        with self._lock:
+            keys = self._keys.pop(instance_id, None)
+            if keys is None:
+                return
+            pipeline_key, tag_keys, state = keys
+            sequence = self._order.pop(instance_id)
+            self._all.discard(sequence)
+            self._discard(self._by_state, state, sequence)
+            self._discard(self._by_pipeline, pipeline_key, sequence)
+            self._discard(self._by_name, pipeline_key[0], sequence)
+            for tag_key in tag_keys:
+                self._discard(self._by_tag, tag_key, sequence)
+
+    def _get_filters(self, states, pipeline, tags):
+        filters = []
+        if pipeline:
+            name, _, version = pipeline.partition("/")
+            if version:
+                filters.append([self._by_pipeline.get((name, version), SequenceIndex())])
+            else:
+                filters.append([self._by_name.get(name, SequenceIndex())])
+        for tag in tags or []:
+            filters.append([self._by_tag.get(InstanceIndex.parse_tag(tag), SequenceIndex())])
+        if states:
+            filters.append([self._by_state.get(state, SequenceIndex()) for state in states])
+        return filters
+
+    def query(self, states=None, pipeline=None, tags=None, cursor=None):
+        '''
+        Yields instance ids matching all filters, in creation order,
+        created after cursor. Ids are read in batches under the lock, so consuming only a page
+        of results only visits the instances needed to fill it.
+        '''
+        cursor = cursor or 0
+        while True:
+            with self._lock:
+                filters = self._get_filters(states, pipeline, tags)
+                if filters:
+                    filters.sort(key=lambda union: sum(len(index) for index in union))
+                    base = filters.pop(0)
+                else:
+                    base = [self._all]
+                batch = []
+                for sequence in heapq.merge(*[index.after(cursor) for index in base]):
+                    cursor = sequence
+                    if all(any(sequence in index for index in union) for union in filters):
+                        batch.append(self._all.get(sequence))
+                        if len(batch) >= InstanceIndex.QUERY_BATCH:
+                            break
+                else:
+                    cursor = None
+            yield from batch
+            if cursor is None:
+                return
+
+    def cursor(self, instance_id):
+        return self._order.get(instance_id)
+
+    @staticmethod
+    def _discard(index, key, sequence):
+        ids = index.get(key)
+        if ids is None:
+            return
+        ids.discard(sequence)
+        if not ids:
+            del index[key]
@@ -0,0 +1,208 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import hashlib
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from server.common.utils import logging
+
+
+class CompiledModelCache:
+    '''
+    Directory of OpenVINO compiled model caches, one per network and
+    device. Inference elements are given their directory as CACHE_DIR
+    in ie-config so a network compiled once is loaded from disk by
+    later instances and after restarts.
+
+    A cache directory name includes a digest of the network and weights
+    file sizes and modification times, so a changed network gets a new
+    directory and the directory of the previous network is removed.
+    When the total size exceeds max_size, the least recently used
+    directories are removed.
+
+    Only directories holding the MARKER file are managed, so other
+    content of the cache path is never removed. Removal and size
+    accounting run on a background thread after a miss and after an
+    element has loaded its network, when the compiled model has been
+    written. Directory sizes are measured once and kept.
+    '''
+
+    CACHE_DIR_KEY = "CACHE_DIR"
+    MARKER = ".compiled_model_cache"
+
+    def __init__(self, path, max_size=-1):
+        self._logger = logging.get_logger('CompiledModelCache', is_static=True)
+        self.path = os.path.abspath(path)
+        self.max_size = max_size
+        self._lock = Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._scheduled = False
+        self._current = {}
+        self._pending = set()
+        self._sizes = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        os.makedirs(self.path, exist_ok=True)
+        self.schedule_update()
+
+    @staticmethod
+    def create(options):
+        if not getattr(options, "model_cache_dir", None):
+            return None
+        max_size = options.model_cache_size
+        if max_size >= 0:
+            max_size = max_size * 1024 * 1024
+        return CompiledModelCache(options.model_cache_dir, max_size)
+
+    @staticmethod
+    def _digest(value):
+        return hashlib.sha1(value.encode("utf-8")).hexdigest()[:8]
+
+    @staticmethod
+    def _network_files(network):
+        files = [network]
+        weights = os.path.splitext(network)[0] + ".bin"
+        if os.path.isfile(weights):
+            files.append(weights)
+        return files
+
+    def _get_prefix(self, network, device):
+        name = os.path.splitext(os.path.basename(network))[0]
+        return re.sub(r"[^\w.-]", "_", "{}_{}_{}_".format(
+            name, device, CompiledModelCache._digest(network)))
+
+    def _get_name(self, network, device):
+        stats = ["{}:{}:{}".format(path, os.stat(path).st_size, os.stat(path).st_mtime_ns)
+                 for path in CompiledModelCache._network_files(network)]
+        return self._get_prefix(network, device) + CompiledModelCache._digest(",".join(stats))
+
+    def get_cache_dir(self, network, device):
+        name = self._get_name(network, device)
+        cache_dir = os.path.join(self.path, name)
+        hit = os.path.isdir(cache_dir) and any(
+            entry != CompiledModelCache.MARKER for entry in os.listdir(cache_dir))
+        if not hit:
+            os.makedirs(cache_dir, exist_ok=True)
+            open(os.path.join(cache_dir, CompiledModelCache.MARKER), 'a').close()
+        # Directory modification time records the last use for eviction
+        os.utime(cache_dir)
+        with self._lock:
+            if hit:
+                self.hits += 1
+                return cache_dir
+            self.misses += 1
+            self._current[self._get_prefix(network, device)] = name
+            self._pending.add(name)
+        self.schedule_update()
+        return cache_dir
+
+    def configure(self, ie_config, network, device):
+        """Returns ie_config with CACHE_DIR set for network and device"""
+        if ie_config and CompiledModelCache.CACHE_DIR_KEY in ie_config:
+            return ie_config
+        cache_dir = self.get_cache_dir(network, device)
+        entry = "{}={}".format(CompiledModelCache.CACHE_DIR_KEY, cache_dir)
+        return "{},{}".format(ie_config, entry) if ie_config else entry
+
+    def schedule_update(self):
+        """Removes changed and least recently used entries on the background thread"""
+        with self._lock:
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._executor.submit(self._update)
+
+    @staticmethod
+    def _get_size(path):
+        size = 0
+        for root, _, files in os.walk(path):
+            for file in files:
+                try:
+                    size += os.path.getsize(os.path.join(root, file))
+                except OSError:
+                    pass
+        return size
+
+    def _get_entries(self):
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.is_dir() and os.path.isfile(
+                    os.path.join(entry.path, CompiledModelCache.MARKER)):
+                entries.append((entry.stat().st_mtime, entry.name))
+        return sorted(entries)
+
+    def _update(self):
+        with self._lock:
+            self._scheduled = False
+            current = dict(self._current)
+            pending = set(self._pending)
+        try:
+            sizes = dict(self._sizes)
+            entries = []
+            written = set()
+            for mtime, name in self._get_entries():
+                prefix = name[:name.rfind("_") + 1]
+                if current.get(prefix, name) != name:
+                    self._logger.info("Removing compiled model cache {} for changed network"
+                                      .format(name))
+                    shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+                    with self._lock:
+                        self.invalidations += 1
+                    continue
+                if (name not in sizes) or (name in pending):
+                    size = CompiledModelCache._get_size(os.path.join(self.path, name))
+                    # An entry holding only its marker is still being written
+                    if size:
+                        sizes[name] = size
+                        written.add(name)
+                entries.append((mtime, name))
+            names = {name for _, name in entries}
+            sizes = {name: size for name, size in sizes.items() if name in names}
+            evicted = self._evict(entries, sizes, pending - written)
+            for name in evicted:
+                del sizes[name]
+            self._sizes = sizes
+            with self._lock:
+                self._pending -= written | (pending - names)
+                self.evictions += len(evicted)
+        except Exception as error:
+            self._logger.warning("Error updating compiled model cache {}: {}".format(
+                self.path, error))
+
+    def _evict(self, entries, sizes, pending):
+        evicted = []
+        if self.max_size < 0:
+            return evicted
+        size = sum(sizes.values())
+        for _, name in entries:
+            if size <= self.max_size:
+                break
+            if (name in pending) or (name not in sizes):
+                continue
+            self._logger.info("Evicting compiled model cache {}".format(name))
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+            size -= sizes[name]
+            evicted.append(name)
+        return evicted
+
+    def get_stats(self):
+        sizes = self._sizes
+        with self._lock:
+            return {
+                "path": self.path,
+                "entries": len(sizes),
+                "size": sum(sizes.values()),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
@@ -6,8 +6,11 @@
 
 from collections.abc import MutableMapping
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock, Thread
 import os
-import fnmatch
+import re
+import json
 import string
 from server.common.utils import logging
 
@@ -27,7 +30,7 @@ class ModelsDict(MutableMapping):
     def __getitem__(self, key):
         if (key == "network"):
             if ('default' in self._dict["networks"]):
-                return self._dict["networks"]["default"]
+                return self._dict["networks"]["default"]["network"]
             return "{{models[{}][{}][VA_DEVICE_DEFAULT][network]}}".format(self._model_name,
                                                                            self._model_version)
         if (key in self._dict["networks"]):
@@ -41,14 +44,46 @@ class ModelsDict(MutableMapping):
         return len(self._dict)
 
 
+class ModelSnapshot:
+    '''
+    Loaded models, the model-proc and labels of each network and the
+    preferred network of each model version per device. A reload swaps
+    in a new snapshot with a single assignment, so a reader that takes
+    the snapshot once sees one consistent set of models.
+    '''
+
+    __slots__ = ("models", "model_properties", "default_networks")
+
+    def __init__(self, models=None, model_properties=None, default_networks=None):
+        self.models = models if models is not None else defaultdict(dict)
+        self.model_properties = model_properties if model_properties is not None \
+            else defaultdict(dict)
+        self.default_networks = default_networks or {}
+
+
 class ModelManager:
 
-    def __init__(self, model_dir, network_preference=None, ignore_init_errors=False):
+    SCAN_WORKERS = 16
+    MANIFEST_VERSION = 1
+    DEFAULT_NETWORK_REFERENCE = re.compile(
+        r"^\{models\[([^\]]+)\]\[([^\]]+)\]\[VA_DEVICE_DEFAULT\]\[network\]\}$")
+
+    def __init__(self, model_dir, network_preference=None, ignore_init_errors=False,
+                 manifest_path=None, model_names=None, reload_callback=None,
+                 compiled_model_cache=None):
         self.logger = logging.get_logger('ModelManager', is_static=True)
         self.model_dir = model_dir
         self.network_preference = network_preference
-        self.models = defaultdict(dict)
-        self.model_properties = defaultdict(dict)
+        self.manifest_path = manifest_path
+        self.model_names = model_names
+        self.compiled_model_cache = compiled_model_cache
+        self.snapshot = ModelSnapshot()
+        self._reload_lock = Lock()
+        self._scan_cache = None
+        self._scan_errors = {}
+        self._reload_callback = reload_callback
+        self._watcher = None
+        self._stop_event = Event()
 
         if not self.network_preference:
             self.network_preference = {'CPU': ["FP32"],
@@ -67,60 +102,215 @@ class ModelManager:
             raise Exception("Error Initializing Models")
 
 
-    def _get_model_property(self, path, model_property, extension):
-        candidates = fnmatch.filter(os.listdir(path), "*.{}".format(extension))
+    @property
+    def models(self):
+        return self.snapshot.models
+
+    @property
+    def model_properties(self):
+        return self.snapshot.model_properties
+
+    @staticmethod
+    def _scan_directory(path):
+        # One listing per directory, which matters on network file systems
+        procs = []
+        labels = []
+        networks = []
+        subdirs = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    subdirs.append(entry.name)
+                elif entry.name.endswith(".json"):
+                    procs.append(os.path.abspath(entry.path))
+                elif entry.name.endswith(".txt"):
+                    labels.append(os.path.abspath(entry.path))
+                elif entry.name.endswith((".xml", ".blob")):
+                    networks.append(os.path.abspath(entry.path))
+        return procs, labels, networks, subdirs
+
+    @staticmethod
+    def _get_single(candidates, message):
         if (len(candidates) > 1):
-            raise Exception("Multiple {} files found in {}".format(model_property, path))
-        if (len(candidates) == 1):
-            return os.path.abspath(os.path.join(path, candidates[0]))
-        return None
-
-    def _get_model_network(self, path):
-        extensions = (".xml", ".blob")
-        candidates = [os.path.abspath(os.path.join(path, candidate))
-                      for candidate in os.listdir(path)
-                      if candidate.endswith(extensions)]
-        if (len(candidates) > 1):
-            raise Exception("Multiple networks found in %s" % (path,))
+            raise Exception(message)
         if (len(candidates) == 1):
             return candidates[0]
         return None
 
-    def _get_model_networks(self, path):
-        networks = {}
-        default = self._get_model_network(path)
+    def _scan_model_version(self, path):
+        mtimes = {"": os.stat(path).st_mtime_ns}
+        procs, labels, networks, subdirs = self._scan_directory(path)
+        result = {
+            "mtimes": mtimes,
+            "proc": self._get_single(
+                procs, "Multiple model-proc files found in {}".format(path)),
+            "labels": self._get_single(
+                labels, "Multiple labels files found in {}".format(path)),
+            "networks": {}
+        }
+        default = self._get_single(networks, "Multiple networks found in %s" % (path,))
         if (default):
-            networks["default"] = default
-        for network_type in os.listdir(path):
+            result["networks"]["default"] = default
+        for network_type in subdirs:
             network_type_path = os.path.join(path, network_type)
-            if (os.path.isdir(network_type_path)):
-                network = self._get_model_network(network_type_path)
-                if (network):
-                    networks[network_type] = {'network': network}
-        return networks
-
-    def get_network(self, model, network):
+            mtimes[network_type] = os.stat(network_type_path).st_mtime_ns
+            _, _, networks, _ = self._scan_directory(network_type_path)
+            network = self._get_single(
+                networks, "Multiple networks found in %s" % (network_type_path,))
+            if (network):
+                result["networks"][network_type] = network
+        return result
+
+    @staticmethod
+    def _is_current(path, cached):
+        try:
+            return all(os.stat(os.path.join(path, subdir)).st_mtime_ns == mtime
+                       for subdir, mtime in cached["mtimes"].items())
+        except OSError:
+            return False
+
+    def _scan_model(self, model_path, cached):
+        model_mtime = os.stat(model_path).st_mtime_ns
+        if cached and cached["mtime"] == model_mtime:
+            version_dirs = cached["version_dirs"]
+        else:
+            with os.scandir(model_path) as entries:
+                version_dirs = [entry.name for entry in entries if entry.is_dir()]
+        cached_versions = cached["versions"] if cached else {}
+        versions = {}
+        rescanned = 0
+        for version_dir in version_dirs:
+            version_path = os.path.join(model_path, version_dir)
+            version = cached_versions.get(version_dir)
+            if (not version) or (not self._is_current(version_path, version)):
+                version = self._scan_model_version(version_path)
+                rescanned += 1
+            versions[version_dir] = version
+        return {"mtime": model_mtime,
+                "version_dirs": version_dirs,
+                "versions": versions}, rescanned
+
+    def _read_manifest(self):
+        if not self.manifest_path:
+            return {}
+        try:
+            with open(self.manifest_path, 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+            if (manifest.get("version") == ModelManager.MANIFEST_VERSION and
+                    manifest.get("model_dir") == os.path.abspath(self.model_dir)):
+                return manifest["models"]
+            self.logger.info("Ignoring model manifest {} for a different model directory "
+                             "or format".format(self.manifest_path))
+        except FileNotFoundError:
+            pass
+        except Exception as error:
+            self.logger.warning("Unable to read model manifest {}: {}".format(
+                self.manifest_path, error))
+        return {}
+
+    def _write_manifest(self, models):
+        if not self.manifest_path:
+            return
+        manifest = {"version": ModelManager.MANIFEST_VERSION,
+                    "model_dir": os.path.abspath(self.model_dir),
+                    "models": models}
+        temp_path = "{}.{}.tmp".format(self.manifest_path, os.getpid())
+        try:
+            with open(temp_path, 'w') as manifest_file:
+                json.dump(manifest, manifest_file)
+            os.replace(temp_path, self.manifest_path)
+        except Exception as error:
+            self.logger.warning("Unable to write model manifest {}: {}".format(
+                self.manifest_path, error))
+
+    def _scan_models(self, model_dir):
+        """Scans model directories in parallel, reusing unchanged entries from the last scan"""
+        if self._scan_cache is None:
+            self._scan_cache = self._read_manifest()
+        cached_models = self._scan_cache
+        model_names = [model_name for model_name in os.listdir(model_dir)
+                       if (self.model_names is None) or (model_name in self.model_names)]
+        scans = {}
+        with ThreadPoolExecutor(max_workers=ModelManager.SCAN_WORKERS) as executor:
+            futures = {model_name: executor.submit(self._scan_model,
+                                                   os.path.join(model_dir, model_name),
+                                                   cached_models.get(model_name))
+                       for model_name in model_names
+                       if os.path.isdir(os.path.join(model_dir, model_name))}
+            for model_name, future in futures.items():
+                try:
+                    scans[model_name] = future.result()
+                except Exception as error:
+                    scans[model_name] = error
+        total = sum(len(scan[0]["versions"]) for scan in scans.values()
+                    if not isinstance(scan, Exception))
+        rescanned = sum(scan[1] for scan in scans.values() if not isinstance(scan, Exception))
+        self.logger.debug("Scanned {} of {} model versions".format(rescanned, total))
+        # Models outside model_names keep their entries for a later full scan
+        manifest = {model_name: cached for model_name, cached in cached_models.items()
+                    if model_name not in model_names}
+        manifest.update({model_name: scan[0] for model_name, scan in scans.items()
+                         if not isinstance(scan, Exception)})
+        # Unchanged scan errors do not count as a change so a broken model
+        # is not reloaded and reported again on every watch interval
+        errors = {model_name: str(scan) for model_name, scan in scans.items()
+                  if isinstance(scan, Exception)}
+        changed = (manifest != cached_models) or (errors != self._scan_errors)
+        self._scan_errors = errors
+        if manifest != cached_models:
+            self._write_manifest(manifest)
+        self._scan_cache = manifest
+        return scans, changed
+
+    def get_network(self, model, network, snapshot=None):
+        snapshot = snapshot or self.snapshot
         preferred_model = model.replace("VA_DEVICE_DEFAULT", network)
         try:
             preferred_model = string.Formatter().vformat(
-                preferred_model, [], {'models': self.models})
+                preferred_model, [], {'models': snapshot.models})
             return preferred_model
         except Exception:
             pass
         return None
 
-    def get_default_network_for_device(self, device, model):
+    def _get_preference_device(self, device):
+        if device not in self.network_preference:
+            mixed_device = [device_type for device_type in [
+                "HETERO", "AUTO", "MULTI"] if device.startswith(device_type)]
+            if mixed_device and mixed_device[0] in self.network_preference:
+                return mixed_device[0]
+            if 'DEFAULT' in self.network_preference:
+                return 'DEFAULT'
+        return device
+
+    def _build_default_networks(self, models):
+        """Resolves the preferred network of every model version for every device"""
+        default_networks = {}
+        for model_name, versions in models.items():
+            for version, model in versions.items():
+                networks = model["networks"]
+                for device, preferences in self.network_preference.items():
+                    for preference in preferences:
+                        if preference in networks:
+                            default_networks[(model_name, str(version), device)] = \
+                                networks[preference]["network"]
+                            break
+        return default_networks
+
+    def get_default_network_for_device(self, device, model, snapshot=None):
         if "VA_DEVICE_DEFAULT" in model:
-            if device not in self.network_preference:
-                mixed_device = [device_type for device_type in [
-                    "HETERO", "AUTO", "MULTI"] if device.startswith(device_type)]
-                if mixed_device and mixed_device[0] in self.network_preference:
-                    device = mixed_device[0]
-                elif 'DEFAULT' in self.network_preference:
-                    device = 'DEFAULT'
-
+            snapshot = snapshot or self.snapshot
+            match = ModelManager.DEFAULT_NETWORK_REFERENCE.match(model)
+            if match:
+                network = snapshot.default_networks.get(
+                    (match.group(1), match.group(2), self._get_preference_device(device)))
+                if network:
+                    return network
+            # Not a plain model reference or no preferred network, resolve
+            # by formatting so unresolved preferences are reported
+            device = self._get_preference_device(device)
             for preference in self.network_preference[device]:
-                ret = self.get_network(model, preference)
+                ret = self.get_network(model, preference, snapshot)
                 if ret:
                     return ret
                 self.logger.info(
@@ -140,11 +330,7 @@ class ModelManager:
         return version
 
     def load_models(self, model_dir, network_preference):
-        #TODO: refactor
-        #pylint: disable=too-many-nested-blocks
-
         self.log_banner("Loading Models")
-        error_occurred = False
 
         self.logger.info("Loading Models from Path {path}".format(
             path=os.path.abspath(self.model_dir)))
@@ -152,71 +338,125 @@ class ModelManager:
             self.logger.warning("Models directory is symbolic link")
         if os.path.ismount(self.model_dir):
             self.logger.warning("Models directory is mount point")
-        models = defaultdict(dict)
         if (network_preference):
             for key in network_preference:
                 if (isinstance(network_preference[key], str)):
                     network_preference[key] = network_preference[key].split(
                         ',')
             self.network_preference.update(network_preference)
-        for model_name in os.listdir(model_dir):
+        scans, _ = self._scan_models(model_dir)
+        models, model_properties, failed = self._build_models(model_dir, scans)
+        self._swap(models, model_properties)
+        self.log_banner("Completed Loading Models")
+        return not failed
+
+    def reload(self):
+        """Loads added, changed and removed models and swaps them in.
+
+        Only directories that changed since the last scan are rescanned.
+        Running instances keep the networks they resolved at start, new
+        instances use the reloaded models. A model that fails to load
+        keeps its previously loaded versions. Returns True if the loaded
+        models changed.
+        """
+        with self._reload_lock:
+            scans, changed = self._scan_models(self.model_dir)
+            if not changed:
+                return False
+            self.log_banner("Reloading Models")
+            models, model_properties, failed = self._build_models(self.model_dir, scans)
+            current = self.snapshot
+            for model_name in failed:
+                if model_name in current.models:
+                    self.logger.warning("Keeping previously loaded versions of model {}".format(
+                        model_name))
+                    models[model_name] = current.models[model_name]
+                    for version in models[model_name].values():
+                        for network in version["networks"].values():
+                            for property_name in ("model-proc", "labels"):
+                                model_properties[property_name][network["network"]] = \
+                                    current.model_properties[property_name].get(
+                                        network["network"])
+            self._swap(models, model_properties)
+            self.log_banner("Completed Reloading Models")
+            return True
+
+    def _swap(self, models, model_properties):
+        self.snapshot = ModelSnapshot(models, model_properties,
+                                      self._build_default_networks(models))
+
+    def watch(self, interval):
+        """Reloads models every interval seconds until stopped"""
+        if self._watcher is None and interval > 0:
+            self._watcher = Thread(target=self._watch, args=(interval,), daemon=True)
+            self._watcher.start()
+
+    def _watch(self, interval):
+        while not self._stop_event.wait(interval):
             try:
-                model_path = os.path.join(model_dir, model_name)
-
-                if (not os.path.isdir(model_path)):
-                    continue
-
-                for version in os.listdir(model_path):
-                    version_path = os.path.join(model_path, version)
-                    if (os.path.isdir(version_path)):
-                        version = self.convert_version(version)
-                        proc = self._get_model_property(
-                            version_path, "model-proc", "json")
-                        labels = self._get_model_property(
-                            version_path, "labels", "txt")
-                        if proc is None:
-                            self.logger.info("Model {model}/{ver} is missing Model-Proc".format(
-                                model=model_name, ver=version))
-                        networks = self._get_model_networks(
-                            version_path)
-                        if (networks):
-                            for key in networks:
-                                networks[key].update({"proc": proc,
-                                                      "labels": labels,
-                                                      "version": version,
-                                                      "type": "IntelDLDT",
-                                                      "description": model_name})
-                                self.model_properties["model-proc"][networks[key]["network"]] = proc
-                                self.model_properties["labels"][networks[key]["network"]] = labels
-
-                            models[model_name][version] = ModelsDict(model_name,
-                                                                     version,
-                                                                     {"networks": networks,
-                                                                      "proc": proc,
-                                                                      "labels" : labels,
-                                                                      "version": version,
-                                                                      "type": "IntelDLDT",
-                                                                      "description": model_name
-                                                                      })
-                            network_paths = {
-                                key: value["network"] for key, value in networks.items()}
-                            network_paths["model-proc"] = proc
-                            network_paths["labels"] = labels
-                            self.logger.info("Loading Model: {} version: {} "
-                                             "type: {} from {}".format(
-                                                 model_name, version, "IntelDLDT", network_paths))
-                        else:
-                            raise Exception("{model}/{ver} is missing Network"
-                                            .format(model=model_name, ver=version))
+                if self.reload() and self._reload_callback:
+                    self._reload_callback()
+            except Exception as error:
+                self.logger.error("Error reloading models: {}".format(error))
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _build_models(self, model_dir, scans):
+        #TODO: refactor
+        #pylint: disable=too-many-nested-blocks
+        models = defaultdict(dict)
+        model_properties = defaultdict(dict)
+        failed = []
+        for model_name, scan in scans.items():
+            try:
+                if isinstance(scan, Exception):
+                    raise scan
+                for version_dir, version_scan in scan[0]["versions"].items():
+                    version = self.convert_version(version_dir)
+                    proc = version_scan["proc"]
+                    labels = version_scan["labels"]
+                    if proc is None:
+                        self.logger.info("Model {model}/{ver} is missing Model-Proc".format(
+                            model=model_name, ver=version))
+                    networks = {key: {"network": network}
+                                for key, network in version_scan["networks"].items()}
+                    if (networks):
+                        for key in networks:
+                            networks[key].update({"proc": proc,
+                                                  "labels": labels,
+                                                  "version": version,
+                                                  "type": "IntelDLDT",
+                                                  "description": model_name})
+                            model_properties["model-proc"][networks[key]["network"]] = proc
+                            model_properties["labels"][networks[key]["network"]] = labels
+
+                        models[model_name][version] = ModelsDict(model_name,
+                                                                 version,
+                                                                 {"networks": networks,
+                                                                  "proc": proc,
+                                                                  "labels" : labels,
+                                                                  "version": version,
+                                                                  "type": "IntelDLDT",
+                                                                  "description": model_name
+                                                                  })
+                        network_paths = {
+                            key: value["network"] for key, value in networks.items()}
+                        network_paths["model-proc"] = proc
+                        network_paths["labels"] = labels
+                        self.logger.info("Loading Model: {} version: {} "
+                                         "type: {} from {}".format(
+                                             model_name, version, "IntelDLDT", network_paths))
+                    else:
+                        raise Exception("{model}/{ver} is missing Network"
+                                        .format(model=model_name, ver=version))
 
             except Exception as error:
-                error_occurred = True
+                failed.append(model_name)
                 self.logger.error("Error Loading Model {model_name}"
                                   " from: {model_dir}: {err}".format(
                                       err=error, model_name=model_name, model_dir=model_dir))
-        self.models = models
-        self.log_banner("Completed Loading Models")
-        return not error_occurred
+        return models, model_properties, failed
 
     def log_banner(self, heading):
         banner = "="*len(heading)
@@ -225,17 +465,21 @@ class ModelManager:
         self.logger.info(banner)
 
     def get_model_parameters(self, name, version):
-        if name not in self.models or version not in self.models[name]:
+        return self._get_model_parameters(self.snapshot.models, name, version)
+
+    @staticmethod
+    def _get_model_parameters(models, name, version):
+        if name not in models or version not in models[name]:
             return None
         params_obj = {
             "name": name,
             "version": version
         }
 
-        if "networks" in self.models[name][version]:
+        if "networks" in models[name][version]:
             proc = None
             labels = None
-            for _, value in self.models[name][version]['networks'].items():
+            for _, value in models[name][version]['networks'].items():
                 proc = value['proc']
                 labels = value['labels']
                 break
@@ -244,21 +488,22 @@ class ModelManager:
                 'labels' : labels,
                 'networks': {key: value['network']
                              for key, value
-                             in self.models[name][version]['networks'].items()}}
+                             in models[name][version]['networks'].items()}}
 
-        if "type" in self.models[name][version]:
-            params_obj["type"] = self.models[name][version]["type"]
+        if "type" in models[name][version]:
+            params_obj["type"] = models[name][version]["type"]
 
-        if "description" in self.models[name][version]:
-            params_obj["description"] = self.models[name][version]["description"]
+        if "description" in models[name][version]:
+            params_obj["description"] = models[name][version]["description"]
         return params_obj
 
     def get_loaded_models(self):
         results = []
-        if self.models is not None:
-            for model in self.models:
-                for version in self.models[model].keys():
-                    result = self.get_model_parameters(model, version)
+        models = self.snapshot.models
+        if models is not None:
+            for model in models:
+                for version in models[model].keys():
+                    result = self._get_model_parameters(models, model, version)
                     if result:
                         results.append(result)
         return results
@@ -0,0 +1,389 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import copy
+import json
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urljoin
+from threading import Event, Lock, Thread
+from server.common.utils import logging
+from server.pipeline import Pipeline, StartPhases
+from server.pipeline_metrics import FrameRateMeter
+
+
+class Node:
+    '''
+    Pipeline server node registered with the coordinator, and the load
+    it reported in the last poll.
+    '''
+
+    REQUEST_TIMEOUT = 10.0
+
+    def __init__(self, url):
+        if not url.endswith("/"):
+            url += "/"
+        self.url = url
+        self.healthy = False
+        self.failures = 0
+        self.last_update = None
+        self.capacity = {}
+        self.pipelines = set()
+        self.fps = {}
+        self.pending = 0
+        self.pending_cost = {}
+        self.instances = {}
+        self.statuses = {}
+
+    def request(self, method, path, body=None):
+        data = None
+        headers = {}
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        request = urllib.request.Request(urljoin(self.url, path), data=data,
+                                         headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=Node.REQUEST_TIMEOUT) as response:
+                content = response.read().decode("utf-8")
+        except urllib.error.HTTPError as error:
+            raise RuntimeError("{} {} on node {} failed: {} {}".format(
+                method, path, self.url, error.code,
+                error.read().decode("utf-8", "replace").strip())) from error
+        except (urllib.error.URLError, OSError) as error:
+            raise RuntimeError("Node {} unreachable: {}".format(self.url, error)) from error
+        return json.loads(content) if content else None
+
+    def update(self):
+        capacity = self.request("GET", "pipelines/capacity")
+        pipelines = self.request("GET", "pipelines")
+        statuses = self.request("GET", "pipelines/status?state=RUNNING,QUEUED&"
+                                "fields=id,state,avg_fps,fps,frames,start_time")
+        self.capacity = capacity
+        self.pipelines = {"{}/{}".format(pipeline["name"], pipeline["version"])
+                          for pipeline in pipelines}
+        fps = [status["avg_fps"] for status in statuses
+               if status.get("state") == "RUNNING" and status.get("avg_fps") is not None]
+        self.fps = {
+            "mean": (sum(fps) / len(fps)) if fps else None,
+            "min": min(fps) if fps else None
+        }
+        self.statuses = {status["id"]: status for status in statuses}
+        self.pending = 0
+        self.pending_cost = {}
+        self.last_update = time.time()
+        return self.statuses
+
+    def utilization(self):
+        '''Largest fraction of a budgeted resource in use, None without a budget'''
+        budget = self.capacity.get("budget") or {}
+        used = self.capacity.get("used") or {}
+        fractions = [(used.get(resource, 0) + self.pending_cost.get(resource, 0)) / value
+                     for resource, value in budget.items() if value]
+        return max(fractions) if fractions else None
+
+    def load(self):
+        running = self.capacity.get("running", 0)
+        queued = self.capacity.get("queued", 0)
+        instances = running + queued + self.pending
+        utilization = self.utilization()
+        max_running = self.capacity.get("max_running_pipelines", -1)
+        if utilization is None and max_running and max_running > 0:
+            utilization = instances / max_running
+        saturated = queued > 0 or (utilization is not None and utilization >= 1.0)
+        return (saturated, utilization or 0.0, instances)
+
+    def reserve(self, pipeline):
+        self.pending += 1
+        cost = self.capacity.get("pipelines", {}).get(pipeline, {})
+        for resource, value in cost.items():
+            self.pending_cost[resource] = self.pending_cost.get(resource, 0) + value
+
+    def info(self):
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "failures": self.failures,
+            "last_update": self.last_update,
+            "instances": len(self.instances),
+            "pipelines": sorted(self.pipelines),
+            "capacity": self.capacity,
+            "fps": self.fps,
+            "load": list(self.load())
+        }
+
+
+class NodeCoordinator:
+    '''
+    Places pipeline instances on registered pipeline server nodes.
+
+    Every poll interval each node reports its capacity, loaded pipelines
+    and the state and fps of its instances. A new instance is placed on
+    the healthy node that has its pipeline and the lowest load: nodes
+    that are not saturated (nothing queued and budget not exhausted)
+    first, then by budget utilization, then by instance count.
+    Placements made since the last poll count towards a node's load so
+    bursts are spread across nodes. Instances whose node is
+    unreachable for several polls are reported as failed.
+    '''
+
+    POLL_INTERVAL = 2.0
+    FAILURE_LIMIT = 3
+
+    def __init__(self, nodes=None):
+        self._logger = logging.get_logger('NodeCoordinator', is_static=True)
+        self._lock = Lock()
+        self._nodes = {}
+        self._stop_event = Event()
+        for url in nodes or []:
+            self.register(url)
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def register(self, url):
+        node = Node(url)
+        with self._lock:
+            if node.url in self._nodes:
+                node = self._nodes[node.url]
+            else:
+                self._nodes[node.url] = node
+                self._logger.info("Registered node {}".format(node.url))
+        self._poll(node)
+        return node.info()
+
+    def get_nodes(self):
+        with self._lock:
+            return [node.info() for node in self._nodes.values()]
+
+    def supports(self, request):
+        return Pipeline.is_portable(request)
+
+    def create_pipeline(self, identifier, config, request, finished_callback):
+        pipeline = "{}/{}".format(config["name"], config["version"])
+        with self._lock:
+            nodes = [node for node in self._nodes.values()
+                     if node.healthy and pipeline in node.pipelines]
+            if not nodes:
+                return None
+            node = min(nodes, key=lambda node: node.load())
+            node.reserve(pipeline)
+        return NodePipeline(node, identifier, config, request, finished_callback)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.wait(NodeCoordinator.POLL_INTERVAL):
+            with self._lock:
+                nodes = list(self._nodes.values())
+            for node in nodes:
+                self._poll(node)
+
+    def _poll(self, node):
+        try:
+            statuses = node.update()
+            node.healthy = True
+            node.failures = 0
+        except Exception as error:
+            node.failures += 1
+            self._logger.warning("Failed to poll node {}: {}".format(node.url, error))
+            if node.failures >= NodeCoordinator.FAILURE_LIMIT and node.healthy:
+                node.healthy = False
+                self._logger.error("Node {} is unavailable".format(node.url))
+            if not node.healthy:
+                for pipeline in list(node.instances.values()):
+                    pipeline.finished(None, None)
+            return
+        # Only queued and running instances are polled, so the final state
+        # of the others is read once
+        for remote_id, pipeline in list(node.instances.items()):
+            status = statuses.get(remote_id)
+            if (status is None) or Pipeline.State[status["state"]].stopped():
+                pipeline.refresh_finished()
+
+
+class NodePipeline:
+    '''
+    Pipeline instance running on another pipeline server node. Start
+    and stop are forwarded to the node's REST API using the instance id
+    assigned by the node. Status is served from the node's last poll and
+    reports the local instance id and the node url.
+    '''
+
+    def __init__(self, node, identifier, config, request, finished_callback):
+        self._node = node
+        self.identifier = identifier
+        self.config = config
+        self.request = request
+        self.remote_id = None
+        self.state = Pipeline.State.QUEUED
+        self._finished_callback = finished_callback
+        self._logger = logging.get_logger('NodePipeline', is_static=True)
+        self._lock = Lock()
+        self._started = False
+        self._stop_requested = False
+        self._final_status = None
+        self._final_params = None
+        self._remote_params = None
+        self._final_profile = None
+        self._start_phases = StartPhases()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            stopped = self.state.stopped()
+        if stopped:
+            self.finished(None, None)
+            return
+        body = {key: value for key, value in self.request.items()
+                if key not in ("pipeline", "models")}
+        try:
+            remote_id = self._node.request("POST", "pipelines/{}/{}".format(
+                self.config["name"], self.config["version"]), body)
+        except Exception as error:
+            self._logger.error("Error on Pipeline {id}: {err}".format(
+                id=self.identifier, err=error))
+            self.finished(None, None)
+            return
+        with self._lock:
+            self.remote_id = remote_id
+            self._node.instances[remote_id] = self
+            stop_requested = self._stop_requested
+        self._logger.info("Started Pipeline {id} on node {node} as {remote_id}".format(
+            id=self.identifier, node=self._node.url, remote_id=remote_id))
+        if stop_requested:
+            self.stop()
+
+    def stop(self):
+        with self._lock:
+            if not self._started:
+                if not self.state.stopped():
+                    self.state = Pipeline.State.ABORTED
+                return self.status()
+            if self.remote_id is None:
+                self._stop_requested = True
+                return self.status()
+        if self._final_status is None:
+            try:
+                return self._convert_status(self._node.request(
+                    "DELETE", "pipelines/{}".format(self.remote_id)))
+            except RuntimeError as error:
+                self._logger.warning("Error stopping Pipeline {id}: {err}".format(
+                    id=self.identifier, err=error))
+        return self.status()
+
+    def _convert_status(self, status):
+        status["id"] = self.identifier
+        status["state"] = Pipeline.State[status["state"]]
+        status["node"] = self._node.url
+        self.state = status["state"]
+        return status
+
+    def _local_status(self):
+        return {
+            "id": self.identifier,
+            "state": self.state,
+            "avg_fps": 0,
+            "fps": FrameRateMeter.unmeasured(),
+            "frames": {"processed": 0, "dropped": 0},
+            "start_time": None,
+            "elapsed_time": None,
+            "start_phases": self._start_phases.durations(),
+            "node": self._node.url
+        }
+
+    def _polled_status(self, polled):
+        status = self._local_status()
+        status.update(polled)
+        if status["start_time"] is not None:
+            status["elapsed_time"] = max(0, time.time() - status["start_time"])
+        return self._convert_status(status)
+
+    def status(self):
+        if self._final_status is not None:
+            return dict(self._final_status)
+        if self.remote_id is not None:
+            polled = self._node.statuses.get(self.remote_id)
+            if polled is not None:
+                return self._polled_status(polled)
+        return self._local_status()
+
+    def _local_params(self):
+        request = copy.deepcopy(self.request)
+        request.pop("models", None)
+        return {
+            "id": self.identifier,
+            "request": request,
+            "type": self.config["type"],
+            "launch_command": None
+        }
+
+    def params(self):
+        if self._final_params is not None:
+            return copy.deepcopy(self._final_params)
+        if self._remote_params is not None:
+            return copy.deepcopy(self._remote_params)
+        if self.remote_id is not None:
+            # Parameters do not change once the node has created the
+            # instance, so they are fetched once
+            try:
+                params = self._node.request("GET", "pipelines/{}".format(self.remote_id))
+                params["id"] = self.identifier
+                params["request"]["pipeline"] = self.request["pipeline"]
+                self._remote_params = params
+                return copy.deepcopy(params)
+            except (RuntimeError, KeyError, TypeError):
+                pass
+        return self._local_params()
+
+    def _request_profile(self):
+        try:
+            return self._node.request(
+                "GET", "pipelines/{}/profile".format(self.remote_id)) or {}
+        except RuntimeError:
+            return {}
+
+    def profile(self):
+        # The profile of a stopped instance is read once when it finishes
+        if self._final_profile is not None:
+            return self._final_profile
+        if (self.remote_id is None) or (not self._node.healthy):
+            return {}
+        return self._request_profile()
+
+    def refresh_finished(self):
+        try:
+            status = self._convert_status(self._node.request(
+                "GET", "pipelines/status/{}".format(self.remote_id)))
+            params = self.params()
+        except RuntimeError:
+            # Evicted by the node before its final state was read
+            status = None
+            params = None
+        if status is None:
+            self.finished(None, None)
+        elif status["state"].stopped():
+            self.finished(status, params, self._request_profile())
+
+    def finished(self, status, params, profile=None):
+        with self._lock:
+            if self._final_status is not None:
+                return
+            self._final_profile = profile or {}
+            if status is None:
+                if not self.state.stopped():
+                    self.state = Pipeline.State.ERROR
+                status = self._local_status()
+                params = self._local_params()
+            self._final_params = params
+            self._final_status = status
+            self.state = status["state"]
+            if self.remote_id is not None:
+                self._node.instances.pop(self.remote_id, None)
+        self._finished_callback()
@@ -3,7 +3,9 @@
 *
 * SPDX-License-Identifier: BSD-3-Clause
 '''
+import time
 from enum import Enum, auto
+from threading import Lock
 
 class Pipeline:
     class State(Enum):
@@ -28,10 +30,38 @@ class Pipeline:
     def params(self):
         pass
 
+    def profile(self):
+        return {}
+
     @staticmethod
     def validate_config(config):
         pass
 
+    @staticmethod
+    def get_metrics():
+        return {}
+
+    @staticmethod
+    def preload(config, model_manager, devices):
+        pass
+
+    @staticmethod
+    def is_portable(request):
+        """True if the request can run outside this process.
+
+        Application sources and destinations hold objects owned by the
+        caller and RTSP and WebRTC destinations use servers owned by
+        this process.
+        """
+        local_only_types = ("application", "rtsp", "webrtc")
+        source = request.get("source", {})
+        if isinstance(source, dict) and source.get("type") in local_only_types:
+            return False
+        for section in request.get("destination", {}).values():
+            if isinstance(section, dict) and section.get("type") in local_only_types:
+                return False
+        return True
+
     @staticmethod
     def get_config_section(config, config_section):
         for key in config_section:
@@ -47,3 +77,81 @@ class Pipeline:
         config = Pipeline.get_config_section(config, config_section)
 
         return request, config
+
+
+class StartPhases:
+    """
+    Records when each phase of a pipeline start ended. The duration of a
+    phase is the time since the end of the previous recorded phase, or
+    since the instance was created for the first phase. Phases that have
+    not ended yet are reported as None.
+    """
+
+    PHASES = ("queued", "parse", "configure", "preroll", "first_frame")
+
+    def __init__(self):
+        self._lock = Lock()
+        self._created = time.time()
+        self._ends = {}
+
+    def end(self, phase):
+        with self._lock:
+            if phase not in self._ends:
+                self._ends[phase] = time.time()
+
+    def durations(self):
+        with self._lock:
+            result = {}
+            previous = self._created
+            for phase in StartPhases.PHASES:
+                end = self._ends.get(phase)
+                if end is None:
+                    result[phase] = None
+                    continue
+                result[phase] = max(0.0, end - previous)
+                previous = max(previous, end)
+            return result
+
+
+class PipelineTombstone:
+    """
+    Compact record kept in place of a pipeline instance once it has
+    stopped. Only the final state, timing and frame rate counters are
+    kept; the request, launch command and profile are released with the
+    pipeline.
+    """
+
+    STATUS_FIELDS = ("id", "state", "avg_fps", "fps", "frames", "start_time", "elapsed_time")
+
+    __slots__ = ("identifier", "state", "name", "version", "type", "_status")
+
+    def __init__(self, pipeline):
+        request_pipeline = pipeline.request["pipeline"]
+        status = pipeline.status()
+        self.identifier = pipeline.identifier
+        self.state = status["state"]
+        self.name = request_pipeline["name"]
+        self.version = request_pipeline["version"]
+        self.type = pipeline.config["type"]
+        self._status = {key: status[key] for key in PipelineTombstone.STATUS_FIELDS
+                        if key in status}
+
+    @property
+    def request(self):
+        return {"pipeline": {"name": self.name, "version": self.version}}
+
+    def stop(self):
+        return self.status()
+
+    def status(self):
+        return dict(self._status)
+
+    def profile(self):
+        return {}
+
+    def params(self):
+        return {
+            "id": self.identifier,
+            "request": self.request,
+            "type": self.type
+        }
@@ -5,36 +5,66 @@
 '''
 
 import os
+import re
 import json
 import string
+import time
 import traceback
 from threading import Lock
-from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from collections import defaultdict
+from collections import namedtuple
+from functools import partial
 import uuid
 import jsonschema
 from server.common.utils import logging
-from server.pipeline import Pipeline
+from server.pipeline import Pipeline, PipelineTombstone
+from server.pipeline_scheduler import PipelineScheduler
+from server.resource_budget import ResourceBudget
+from server.admission_controller import FpsAdmissionController
+from server.instance_index import InstanceIndex
 from server import schema
 
 class PipelineManager:
 
+    RequestSchema = namedtuple("RequestSchema", ["validators", "defaults"])
+    BULK_WORKERS = 16
+
     def __init__(self, model_manager, pipeline_dir, max_running_pipelines,
-                 ignore_init_errors=False):
+                 ignore_init_errors=False, node_budget=None, fps_control=None,
+                 instance_ttl=-1, max_stopped_instances=-1, start_workers=4,
+                 worker_pool=None, node_coordinator=None, preload_pipelines=None):
         self.max_running_pipelines = max_running_pipelines
         self.model_manager = model_manager
-        self.running_pipelines = 0
         self.pipeline_types = {}
         self.pipeline_instances = {}
+        self.worker_pool = worker_pool
+        self.node_coordinator = node_coordinator
+        self.instance_ttl = instance_ttl
+        self.max_stopped_instances = max_stopped_instances
+        self._stopped_instances = OrderedDict()
+        self._instances_lock = Lock()
+        self.instance_index = InstanceIndex()
         self.pipeline_state = {}
         self.pipelines = {}
-        self.pipeline_queue = deque()
+        self._request_schemas = {}
+        self._empty_validator = self._create_validator({})
+        self.scheduler = PipelineScheduler(max_running_pipelines)
+        self.resource_budget = ResourceBudget(node_budget)
+        self.admission_controller = FpsAdmissionController(
+            self._get_running_instances, self._start,
+            max_running_pipelines=max_running_pipelines, **(fps_control or {}))
+        self._start_executor = ThreadPoolExecutor(max_workers=max(1, start_workers),
+                                                  thread_name_prefix="PipelineManagerStart")
+        self._bulk_executor = ThreadPoolExecutor(max_workers=PipelineManager.BULK_WORKERS,
+                                                 thread_name_prefix="PipelineManagerBulk")
         self.pipeline_dir = pipeline_dir
         self.logger = logging.get_logger('PipelineManager', is_static=True)
-        self._run_counter_lock = Lock()
         success = self._load_pipelines()
         if (not ignore_init_errors) and (not success):
             raise Exception("Error Initializing Pipelines")
+        self._preload_pipelines(preload_pipelines or {})
 
 
     def _import_pipeline_types(self):
@@ -133,10 +163,79 @@ class PipelineManager:
         # Remove pipelines with no valid versions
         pipelines = {pipeline: versions for pipeline,
                      versions in pipelines.items() if len(versions) > 0}
+        self._request_schemas = {(pipeline, version): self._compile_request_schema(config)
+                                 for pipeline, versions in pipelines.items()
+                                 for version, config in versions.items()}
         self.pipelines = pipelines
+        self._configure_scheduler()
         self.log_banner("Completed Loading Pipelines")
         return not error_occurred
 
+    def _preload_pipelines(self, preload_pipelines):
+        """Warms the inference elements of pipelines marked for preload"""
+        preload = {}
+        for pipeline, versions in self.pipelines.items():
+            for version, config in versions.items():
+                devices = config.get("preload")
+                if devices is True:
+                    devices = ["CPU"]
+                elif isinstance(devices, str):
+                    devices = [devices]
+                if devices:
+                    preload[(pipeline, version)] = devices
+        for key, devices in preload_pipelines.items():
+            preload[key] = sorted(set(preload.get(key, []) + (devices or ["CPU"])))
+        if not preload:
+            return
+        self.log_banner("Preloading Pipelines")
+        for (pipeline, version), devices in preload.items():
+            config = self.pipelines.get(pipeline, {}).get(version)
+            if not config:
+                self.logger.error("Preload Pipeline {}/{} not found".format(pipeline, version))
+                continue
+            try:
+                self.pipeline_types[config["type"]].preload(config, self.model_manager, devices)
+            except Exception as error:
+                self.logger.error("Error Preloading Pipeline {}/{}: {}".format(
+                    pipeline, version, error))
+        self.log_banner("Completed Preloading Pipelines")
+
+    @staticmethod
+    def get_referenced_models(pipeline_dir):
+        """Names of the models referenced by pipeline definitions in pipeline_dir"""
+        reference = re.compile(r"models\[([^\]\[{}]+)\]")
+        model_names = set()
+        for root, _, files in os.walk(pipeline_dir):
+            for file in files:
+                if file.endswith(".json"):
+                    with open(os.path.join(root, file), 'r') as jsonfile:
+                        model_names.update(reference.findall(jsonfile.read()))
+        return model_names
+
+    def _configure_scheduler(self):
+        for pipeline, versions in self.pipelines.items():
+            for version, config in versions.items():
+                scheduler_config = config.get("scheduler", {})
+                self.scheduler.configure((pipeline, version),
+                                         weight=scheduler_config.get("weight", 1),
+                                         max_running_pipelines=scheduler_config.get(
+                                             "max_running_pipelines", -1))
+                self.resource_budget.configure((pipeline, version), config.get("cost"))
+
+    def _get_priority(self, request, pipeline_config):
+        priority = request.get("priority",
+                               pipeline_config.get("scheduler", {}).get("priority", 0))
+        if isinstance(priority, bool) or not isinstance(priority, int):
+            return None
+        return priority
+
+    def _get_target_fps(self, request, pipeline_config):
+        target_fps = request.get("target_fps", pipeline_config.get("target_fps"))
+        if target_fps is not None and (isinstance(target_fps, bool) or
+                                       not isinstance(target_fps, (int, float))):
+            raise ValueError("target_fps must be a number")
+        return target_fps
+
     def _update_defaults_from_env(self, config):
         config = Pipeline.get_config_section(
             config, ["parameters", "properties"])
@@ -204,13 +303,53 @@ class PipelineManager:
             params_obj["parameters"] = self.pipelines[name][version]["parameters"]
         return params_obj
 
-    def is_input_valid(self, request, pipeline_config, section):
-        config = pipeline_config.get(section, {})
+    @staticmethod
+    def _create_validator(section_schema):
+        return jsonschema.Draft4Validator(
+            schema=section_schema, format_checker=jsonschema.draft4_format_checker)
+
+    @staticmethod
+    def _get_section_defaults(config, config_section):
+        config = Pipeline.get_config_section(config, config_section)
+        return {key: value["default"] for key, value in config.items()
+                if isinstance(value, dict) and "default" in value}
+
+    def _compile_request_schema(self, config):
+        if ("destination" not in config):
+            config["destination"] = schema.destination
+        if ("source" not in config):
+            config["source"] = schema.source
+        if ("tags" not in config):
+            config["tags"] = schema.tags
+
+        validators = {section: self._create_validator(config.get(section, {}))
+                      for section in ["parameters", "source", "tags"]}
+        validators["destination"] = {
+            destination: self._create_validator(destination_config)
+            for destination, destination_config in config["destination"].items()
+            if isinstance(destination_config, dict)}
+
+        defaults = {
+            "parameters": self._get_section_defaults(config, ["parameters", "properties"]),
+            "tags": self._get_section_defaults(config, ["tags", "properties"]),
+            "source": {source_type: self._get_section_defaults(
+                config, ["source", source_type, "properties"])
+                       for source_type, source_config in config["source"].items()
+                       if isinstance(source_config, dict)},
+            "destination": {destination: {destination_type: self._get_section_defaults(
+                config, ["destination", destination, destination_type, "properties"])
+                                          for destination_type, destination_type_config
+                                          in destination_config.items()
+                                          if isinstance(destination_type_config, dict)}
+                            for destination, destination_config in config["destination"].items()
+                            if isinstance(destination_config, dict)}
+        }
+        return PipelineManager.RequestSchema(validators, defaults)
+
+    def is_input_valid(self, request, validator, section):
         try:
             if (section in request):
-                input_validator = jsonschema.Draft4Validator(
-                    schema=config, format_checker=jsonschema.draft4_format_checker)
-                input_validator.validate(request.get(section, {}))
+                validator.validate(request.get(section, {}))
                 self.logger.debug(
                     "{} Validation successful".format(section))
             return True
@@ -219,161 +358,360 @@ class PipelineManager:
                 "Validation error in request section {}, error: {}".format(section, error))
             return False
 
-    def set_section_defaults(self, request, config, request_section, config_section):
-        section, config = Pipeline.get_section_and_config(
-            request, config, request_section, config_section)
-        for key in config:
-            if key not in section and "default" in config[key]:
-                section[key] = config[key]["default"]
-
-        if (len(section) != 0):
-            result = request
-            for key in request_section[0:-1]:
-                result = result.setdefault(key, {})
-            result[request_section[-1]] = section
-
-    def set_defaults(self, request, config):
-
-        if ("destination" not in config):
-            config["destination"] = schema.destination
-        if ("source" not in config):
-            config["source"] = schema.source
-        if ("tags" not in config):
-            config["tags"] = schema.tags
-
-        self.set_section_defaults(request, config, ["parameters"],
-                                  ["parameters", "properties"])
-        if "destination" in request:
-            if "type" in request["destination"]:
-                metadata = {"metadata": request["destination"]}
-                request["destination"] = metadata
-
-            for dest_type in request["destination"]:
-                if "type" in request["destination"][dest_type]:
-                    self.set_section_defaults(request, config, ["destination", dest_type],
-                                              ["destination", dest_type,
-                                               request["destination"][dest_type]["type"],
-                                               "properties"])
-
-        if ("source" in request) and ("type" in request["source"]):
-            self.set_section_defaults(request, config, ["source"],
-                                      ["source",
-                                       request["source"]["type"],
-                                       "properties"])
-
-        self.set_section_defaults(request, config, ["tags"],
-                                  ["tags", "properties"])
+    @staticmethod
+    def _merge_section_defaults(defaults, section):
+        if not defaults:
+            return section
+        result = dict(defaults)
+        result.update(section)
+        return result
+
+    def set_defaults(self, request, request_schema):
+        defaults = request_schema.defaults
+
+        parameters = self._merge_section_defaults(defaults["parameters"],
+                                                  request.get("parameters", {}))
+        if parameters:
+            request["parameters"] = parameters
+
+        if isinstance(request.get("destination"), dict):
+            destination = request["destination"]
+            if "type" in destination:
+                destination = {"metadata": destination}
+            destination = dict(destination)
+            for dest_type, dest_section in destination.items():
+                if isinstance(dest_section, dict) and isinstance(dest_section.get("type"), str):
+                    destination[dest_type] = self._merge_section_defaults(
+                        defaults["destination"].get(dest_type, {}).get(dest_section["type"], {}),
+                        dest_section)
+            request["destination"] = destination
+
+        if isinstance(request.get("source"), dict) and \
+                isinstance(request["source"].get("type"), str):
+            request["source"] = self._merge_section_defaults(
+                defaults["source"].get(request["source"]["type"], {}), request["source"])
+
+        tags = self._merge_section_defaults(defaults["tags"], request.get("tags", {}))
+        if tags:
+            request["tags"] = tags
 
     def create_instance(self, name, version, request_original, options):
         self.logger.info(
             "Creating Instance of Pipeline {name}/{v}".format(name=name, v=version))
         if not self.pipeline_exists(name, version):
             return None, "Invalid Pipeline or Version"
+        if not isinstance(request_original, dict):
+            return None, "Invalid Request"
 
         pipeline_type = self.pipelines[name][str(version)]['type']
         pipeline_config = self.pipelines[name][str(version)]
 
+        request_schema = self._request_schemas[(name, str(version))]
+        validators = request_schema.validators
+
         request = request_original.copy()
 
-        self.set_defaults(request, pipeline_config)
+        self.set_defaults(request, request_schema)
 
-        if not self.is_input_valid(request, pipeline_config, "parameters"):
+        if not self.is_input_valid(request, validators["parameters"], "parameters"):
             return None, "Invalid Parameters"
         if "destination" in request:
             destination_section = request.get("destination")
-            destination_config = pipeline_config.get("destination", {})
             for destination in destination_section:
-                if not self.is_input_valid(destination_section, destination_config, destination) or \
+                validator = validators["destination"].get(destination,
+                                                          self._empty_validator)
+                if not self.is_input_valid(destination_section, validator, destination) or \
                         not isinstance(destination_section[destination], dict):
                     return None, "Invalid Destination"
-        if not self.is_input_valid(request, pipeline_config, "source"):
+        if not self.is_input_valid(request, validators["source"], "source"):
             return None, "Invalid Source"
-        if not self.is_input_valid(request, pipeline_config, "tags"):
+        if not self.is_input_valid(request, validators["tags"], "tags"):
             return None, "Invalid Tags"
+        priority = self._get_priority(request, pipeline_config)
+        if priority is None:
+            return None, "Invalid Priority"
+        try:
+            target_fps = self._get_target_fps(request, pipeline_config)
+        except ValueError:
+            return None, "Invalid Target FPS"
 
         instance_id = uuid.uuid1().hex
         request["pipeline"] = {
             "name": name,
             "version": version
         }
-        self.pipeline_instances[instance_id] = self.pipeline_types[pipeline_type](
-            instance_id,
-            pipeline_config,
-            self.model_manager,
-            request,
-            self._pipeline_finished,
-            options)
-        self.pipeline_queue.append(instance_id)
+        pipeline = None
+        if self.node_coordinator and self.node_coordinator.supports(request):
+            pipeline = self.node_coordinator.create_pipeline(
+                instance_id,
+                pipeline_config,
+                request,
+                partial(self._pipeline_finished, instance_id))
+        remote = pipeline is not None
+        if pipeline is None and self.worker_pool and self.worker_pool.supports(request):
+            pipeline = self.worker_pool.create_pipeline(
+                pipeline_type,
+                instance_id,
+                pipeline_config,
+                request,
+                partial(self._pipeline_finished, instance_id))
+        if pipeline is None:
+            pipeline = self.pipeline_types[pipeline_type](
+                instance_id,
+                pipeline_config,
+                self.model_manager,
+                request,
+                partial(self._pipeline_finished, instance_id),
+                options)
+        self.pipeline_instances[instance_id] = pipeline
+        self.instance_index.add(instance_id, name, str(version), request.get("tags"))
+        if remote:
+            # The node queues, budgets and admits its own instances
+            self.instance_index.set_running(instance_id)
+            self._start_executor.submit(self._start_instance, instance_id)
+            return instance_id, None
+        self.admission_controller.set_target(instance_id, target_fps)
+        self.scheduler.push(instance_id, (name, str(version)), priority)
         self._start()
         return instance_id, None
 
-    def _get_next_pipeline_identifier(self):
-        if (self.max_running_pipelines > 0):
-            if (self.running_pipelines >= self.max_running_pipelines):
-                return None
+    def _bulk(self, function, items):
+        futures = [self._bulk_executor.submit(function, item) for item in items]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as error:
+                self.logger.error("Bulk operation failed: {}".format(error))
+                results.append(None)
+        return results
 
-        try:
-            if (self.pipeline_queue):
-                return self.pipeline_queue.popleft()
-        except Exception:
-            pass
+    def create_instances(self, name, version, requests, options):
+        if not self.pipeline_exists(name, version):
+            return None, "Invalid Pipeline or Version"
 
-        return None
+        def create(request):
+            return self.create_instance(name, version, request, options)
+
+        results = []
+        for result in self._bulk(create, requests):
+            instance_id, err = result or (None, "Unexpected error")
+            if instance_id is not None:
+                results.append({"id": instance_id})
+            else:
+                results.append({"error": err})
+        return results, None
+
+    def stop_instances(self, instance_ids=None, pipeline=None, tags=None):
+        if instance_ids is None:
+            instance_ids = list(self.instance_index.query([Pipeline.State.QUEUED,
+                                                           Pipeline.State.RUNNING],
+                                                          pipeline, tags))
+        results = []
+        for instance_id, status in zip(instance_ids,
+                                       self._bulk(self.stop_instance, instance_ids)):
+            if status is not None:
+                results.append({"id": instance_id, "state": status["state"]})
+            else:
+                results.append({"id": instance_id, "error": "Invalid instance"})
+        return results
+
+    def wait_for_instances(self, instance_ids, timeout=None, interval=0.1):
+        end_time = (time.time() + timeout) if timeout else None
+        pending = list(instance_ids)
+        while pending:
+            pending = [instance_id for instance_id in pending
+                       if not self._instance_stopped(instance_id)]
+            if (not pending) or (end_time and time.time() > end_time):
+                break
+            time.sleep(interval)
+        return pending
+
+    def _instance_stopped(self, instance_id):
+        pipeline = self.pipeline_instances.get(instance_id)
+        return (pipeline is None) or pipeline.status()["state"].stopped()
+
+    def _admit(self, instance_id, key):
+        if not self.admission_controller.admit(instance_id, self.scheduler.running_instances()):
+            return False
+        return self.resource_budget.reserve(instance_id, key)
+
+    def _get_running_instances(self):
+        return [(instance_id, self.pipeline_instances[instance_id])
+                for instance_id in self.scheduler.running_instances()
+                if instance_id in self.pipeline_instances]
 
     def _start(self):
-        pipeline_identifier = self._get_next_pipeline_identifier()
-        if (pipeline_identifier):
-            pipeline_to_start = self.pipeline_instances[pipeline_identifier]
-            with self._run_counter_lock:
-                self.running_pipelines += 1
-            pipeline_to_start.start()
-
-    def _pipeline_finished(self):
-        with self._run_counter_lock:
-            self.running_pipelines -= 1
+        pipeline_identifier = self.scheduler.pop(self._admit)
+        while (pipeline_identifier):
+            self.instance_index.set_running(pipeline_identifier)
+            self._start_executor.submit(self._start_instance, pipeline_identifier)
+            pipeline_identifier = self.scheduler.pop(self._admit)
+
+    def _start_instance(self, instance_id):
+        pipeline = self.pipeline_instances.get(instance_id)
+        if pipeline is None:
+            return
+        try:
+            pipeline.start()
+        except Exception as error:
+            self.logger.error("Error starting pipeline instance {}: {}".format(
+                instance_id, error))
+            self.logger.error(traceback.format_exc())
+            # The pipeline failed before it could report its own end, so
+            # release its slot and reservation here
+            if not pipeline.state.stopped():
+                pipeline.state = Pipeline.State.ERROR
+            if instance_id in self.scheduler.running_instances():
+                self._pipeline_finished(instance_id)
+
+    def _pipeline_finished(self, instance_id):
+        self.scheduler.release(instance_id)
+        self.resource_budget.release(instance_id)
+        self.admission_controller.remove(instance_id)
+        self._retire_instance(instance_id)
         self._start()
 
+    def get_capacity(self):
+        capacity = self.resource_budget.capacity()
+        capacity["max_running_pipelines"] = self.max_running_pipelines
+        capacity["running"] = self.scheduler.running_count()
+        capacity["queued"] = self.scheduler.queued_count()
+        return capacity
+
+    def get_metrics(self):
+        metrics = {
+            "running": self.scheduler.running_count(),
+            "queued": self.scheduler.queued_count(),
+            "pipeline_types": {pipeline_type: pipeline_class.get_metrics()
+                               for pipeline_type, pipeline_class in self.pipeline_types.items()}
+        }
+        if self.worker_pool:
+            metrics["workers"] = self.worker_pool.get_metrics()
+        if self.model_manager.compiled_model_cache:
+            metrics["model_cache"] = self.model_manager.compiled_model_cache.get_stats()
+        return metrics
+
+    def get_admission_state(self):
+        state = self.admission_controller.get_state()
+        state["running"] = self.scheduler.running_count()
+        state["queued"] = self.scheduler.queued_count()
+        return state
+
+    def _retire_instance(self, instance_id):
+        with self._instances_lock:
+            pipeline = self.pipeline_instances.get(instance_id)
+            if (pipeline is None) or isinstance(pipeline, PipelineTombstone):
+                return
+            tombstone = PipelineTombstone(pipeline)
+            self.pipeline_instances[instance_id] = tombstone
+            self.instance_index.set_stopped(instance_id, tombstone.state)
+            self._stopped_instances[instance_id] = time.time()
+            self._evict_stopped_instances()
+
+    def _touch_stopped_instance(self, instance_id):
+        with self._instances_lock:
+            if instance_id in self._stopped_instances:
+                self._stopped_instances[instance_id] = time.time()
+                self._stopped_instances.move_to_end(instance_id)
+
+    def _evict_stopped_instances(self):
+        expired = time.time() - self.instance_ttl
+        while self._stopped_instances:
+            instance_id, last_access = next(iter(self._stopped_instances.items()))
+            if (0 < self.max_stopped_instances < len(self._stopped_instances)) or \
+                    (self.instance_ttl >= 0 and last_access < expired):
+                del self._stopped_instances[instance_id]
+                del self.pipeline_instances[instance_id]
+                self.instance_index.remove(instance_id)
+                self.logger.debug("Evicted pipeline instance {}".format(instance_id))
+            else:
+                break
+
+    def _get_instance(self, instance_id, name=None, version=None):
+        pipeline = self.pipeline_instances.get(instance_id)
+        if pipeline is not None:
+            if name and version:
+                request_pipeline = pipeline.request["pipeline"]
+                if name == request_pipeline["name"] and version == request_pipeline["version"]:
+                    return pipeline
+            else:
+                return pipeline
+        self.logger.warning("Invalid Instance ID")
+        return None
+
     def get_instance_summary(self, instance_id):
-        if self.instance_exists(instance_id):
-            return self.pipeline_instances[instance_id].params()
+        pipeline = self._get_instance(instance_id)
+        if pipeline:
+            self._touch_stopped_instance(instance_id)
+            return pipeline.params()
         return None
 
     def get_instance_parameters(self, name, version, instance_id):
-        if self.instance_exists(instance_id, name, version):
-            return self.pipeline_instances[instance_id].params()
+        pipeline = self._get_instance(instance_id, name, version)
+        if pipeline:
+            self._touch_stopped_instance(instance_id)
+            return pipeline.params()
         return None
 
     def get_all_instance_status(self):
-        results = []
-        for pipeline_instance in self.pipeline_instances.values():
-            results.append(pipeline_instance.status())
+        results, _ = self.query_instance_status()
         return results
 
+    def query_instance_status(self, states=None, pipeline=None, tags=None,
+                              limit=None, cursor=None, fields=None):
+        # pylint: disable=too-many-arguments
+        if self.instance_ttl >= 0:
+            with self._instances_lock:
+                self._evict_stopped_instances()
+        results = []
+        next_cursor = None
+        for instance_id in self.instance_index.query(states, pipeline, tags, cursor):
+            pipeline_instance = self.pipeline_instances.get(instance_id)
+            if pipeline_instance is None:
+                continue
+            status = pipeline_instance.status()
+            # Live instances are matched on the scheduler's state, as a
+            # started pipeline reports QUEUED until it is playing
+            if states and status["state"].stopped() and status["state"] not in states:
+                continue
+            if (limit is not None) and len(results) >= limit:
+                break
+            if fields:
+                status = {key: status[key] for key in fields if key in status}
+            results.append(status)
+            next_cursor = self.instance_index.cursor(instance_id)
+        else:
+            next_cursor = None
+        return results, next_cursor
+
     def get_instance_status(self, instance_id, name=None, version=None):
-        if self.instance_exists(instance_id, name, version):
-            status = self.pipeline_instances[instance_id].status()
-            return status
+        pipeline = self._get_instance(instance_id, name, version)
+        if pipeline:
+            self._touch_stopped_instance(instance_id)
+            return pipeline.status()
+        return None
+
+    def get_instance_profile(self, instance_id):
+        pipeline = self._get_instance(instance_id)
+        if pipeline:
+            self._touch_stopped_instance(instance_id)
+            return pipeline.profile()
         return None
 
     def stop_instance(self, instance_id, name=None, version=None):
-        if self.instance_exists(instance_id, name, version):
-            try:
-                self.pipeline_queue.remove(instance_id)
-            except Exception:
-                pass
-            return self.pipeline_instances[instance_id].stop()
+        pipeline = self._get_instance(instance_id, name, version)
+        if pipeline:
+            dequeued = self.scheduler.remove(instance_id)
+            status = pipeline.stop()
+            if dequeued:
+                self.admission_controller.remove(instance_id)
+                self._retire_instance(instance_id)
+            return status
         return None
 
     def instance_exists(self, instance_id, name=None, version=None):
-        if instance_id in self.pipeline_instances:
-            if name and version:
-                pipeline = self.pipeline_instances[instance_id].request["pipeline"]
-                if name == pipeline["name"] and version == pipeline["version"]:
-                    return True
-            else:
-                return True
-        self.logger.warning("Invalid Instance ID")
-        return False
+        return self._get_instance(instance_id, name, version) is not None
 
     def pipeline_exists(self, name, version):
         if name in self.pipelines and str(version) in self.pipelines[name]:
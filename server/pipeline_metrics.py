@@ -0,0 +1,215 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import math
+import time
+from collections import OrderedDict, deque
+from threading import Lock
+
+
+class LatencyHistogram:
+    '''
+    Fixed size latency histogram with log scale buckets.
+
+    Bucket boundaries grow by a factor of 2^(1/4) starting at one
+    microsecond, so a recorded value costs one log and one increment
+    and percentiles are accurate to within about 19%. Values are in
+    seconds.
+    '''
+
+    MIN_VALUE = 1e-6
+    BUCKETS_PER_DOUBLING = 4
+    NUM_BUCKETS = 128
+
+    def __init__(self):
+        self._lock = Lock()
+        self._counts = [0] * LatencyHistogram.NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    @staticmethod
+    def _bucket(value):
+        if value <= LatencyHistogram.MIN_VALUE:
+            return 0
+        index = int(math.log2(value / LatencyHistogram.MIN_VALUE) *
+                    LatencyHistogram.BUCKETS_PER_DOUBLING)
+        return min(index, LatencyHistogram.NUM_BUCKETS - 1)
+
+    @staticmethod
+    def _upper_bound(index):
+        return LatencyHistogram.MIN_VALUE * \
+            2 ** ((index + 1) / LatencyHistogram.BUCKETS_PER_DOUBLING)
+
+    def record(self, value):
+        index = LatencyHistogram._bucket(value)
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def reset(self):
+        with self._lock:
+            self._counts = [0] * LatencyHistogram.NUM_BUCKETS
+            self.count = 0
+            self.total = 0.0
+            self.max = 0.0
+
+    def _percentile(self, quantile):
+        if not self.count:
+            return None
+        rank = quantile * self.count
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if count and seen >= rank:
+                return min(LatencyHistogram._upper_bound(index), self.max)
+        return self.max
+
+    def percentile(self, quantile):
+        with self._lock:
+            return self._percentile(quantile)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "mean": (self.total / self.count) if self.count else None,
+                "max": self.max if self.count else None,
+                "p50": self._percentile(0.5),
+                "p95": self._percentile(0.95),
+                "p99": self._percentile(0.99)
+            }
+
+
+class LatencyTracker:
+    '''
+    Latency of sampled frames from one point of a pipeline to another,
+    matched by a key such as the buffer timestamp.
+
+    One in every sample_interval frames passed to start() is sampled.
+    Pending samples are held in a fixed size ring until end() is called
+    with their key, however many frames or samples later that is. A
+    sample is only counted as unmatched when the ring evicts it to make
+    room for a new one, so a frame that never reaches the end, such as
+    one dropped by a leaky queue or one whose timestamp was rewritten,
+    is not held for the life of the pipeline.
+    '''
+
+    SIZE = 64
+
+    def __init__(self, sample_interval=1, size=SIZE):
+        self.sample_interval = max(1, sample_interval)
+        self.histogram = LatencyHistogram()
+        self.unmatched = 0
+        self._lock = Lock()
+        self._frames = 0
+        self._size = max(1, size)
+        self._pending = OrderedDict()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def start(self, key, now=None):
+        """Counts a frame and samples it when due, returns True if sampled"""
+        with self._lock:
+            self._frames += 1
+            if self._frames % self.sample_interval:
+                return False
+            if self._pending.pop(key, None) is not None:
+                self.unmatched += 1
+            elif len(self._pending) >= self._size:
+                self._pending.popitem(last=False)
+                self.unmatched += 1
+            self._pending[key] = time.perf_counter() if now is None else now
+            return True
+
+    def end(self, key, now=None):
+        """Records the latency of the sample pending for key, returns True if there was one"""
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            start = self._pending.pop(key, None)
+        if start is None:
+            return False
+        self.histogram.record(now - start)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._pending.clear()
+
+    def snapshot(self):
+        snapshot = self.histogram.snapshot()
+        with self._lock:
+            snapshot["unmatched"] = self.unmatched
+        return snapshot
+
+
+class FrameRateMeter:
+    '''
+    Frame rate over sliding windows, computed from samples of a frame
+    count recorded by update().
+
+    Samples are kept at least MIN_SAMPLE_INTERVAL apart and only for as
+    long as the largest window needs them. The rate for a window is
+    measured from the most recent sample at least that old, so it spans
+    the window or slightly more when samples are sparse, and spans the
+    time since start for instances younger than the window. Rates only
+    depend on the recorded samples, not on how often they are read.
+    '''
+
+    WINDOWS = (1, 10, 60)
+    MIN_SAMPLE_INTERVAL = 0.25
+
+    def __init__(self):
+        self._lock = Lock()
+        self._samples = deque()
+
+    @staticmethod
+    def unmeasured():
+        return {"{}s".format(window): None for window in FrameRateMeter.WINDOWS}
+
+    def start(self, now=None):
+        with self._lock:
+            self._samples.clear()
+            self._samples.append((time.time() if now is None else now, 0))
+
+    def update(self, frame_count, now=None):
+        """Records a sample of frame_count"""
+        now = time.time() if now is None else now
+        with self._lock:
+            if not self._samples:
+                return
+            if now - self._samples[-1][0] >= FrameRateMeter.MIN_SAMPLE_INTERVAL:
+                self._samples.append((now, frame_count))
+            while (len(self._samples) > 2 and
+                   now - self._samples[1][0] >= FrameRateMeter.WINDOWS[-1]):
+                self._samples.popleft()
+
+    def rates(self, now=None):
+        """
+        Returns the frame rate for each window ending at now, or at the
+        last sample, counting no frames after the last sample
+        """
+        with self._lock:
+            if not self._samples:
+                return FrameRateMeter.unmeasured()
+            last_time, frame_count = self._samples[-1]
+            now = last_time if now is None else max(now, last_time)
+            rates = {}
+            for window in FrameRateMeter.WINDOWS:
+                base = self._samples[0]
+                for sample in reversed(self._samples):
+                    if now - sample[0] >= window:
+                        base = sample
+                        break
+                elapsed = now - base[0]
+                rates["{}s".format(window)] = \
+                    max(0, frame_count - base[1]) / elapsed if elapsed > 0 else None
+            return rates
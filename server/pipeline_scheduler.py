@@ -0,0 +1,163 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import heapq
+import itertools
+from threading import RLock
+
+
+class PipelineScheduler:
+    '''
+    Selects the next queued pipeline instance to start.
+
+    Instances are grouped by pipeline name/version. Within a group,
+    instances are ordered by request priority (higher first) and then by
+    arrival. Across groups, the highest priority head wins and ties are
+    broken by a weighted virtual time so that groups share slots in
+    proportion to their weight. Groups that have reached their own
+    concurrency cap are parked until one of their instances is released.
+    Queue and release operations are O(log n).
+
+    An optional admit callback passed to pop() can reserve resources for
+    the head instance of a group. Groups it declines are skipped, but
+    only in favor of groups of the same priority: groups of lower
+    priority are not started while a higher priority head is declined,
+    so cheaper low priority instances cannot starve it.
+    '''
+
+    class _Group:
+        # pylint: disable=too-few-public-methods
+        def __init__(self, key, weight=1, max_running_pipelines=-1):
+            self.key = key
+            self.weight = weight
+            self.max_running_pipelines = max_running_pipelines
+            self.running = 0
+            self.virtual_time = 0.0
+            self.queue = []
+            self.token = None
+
+        def at_capacity(self):
+            return 0 < self.max_running_pipelines <= self.running
+
+    def __init__(self, max_running_pipelines=-1):
+        self.max_running_pipelines = max_running_pipelines
+        self._lock = RLock()
+        self._sequence = itertools.count()
+        self._groups = {}
+        self._ready = []
+        self._queued = {}
+        self._running = {}
+        self._virtual_time = 0.0
+
+    def configure(self, key, weight=1, max_running_pipelines=-1):
+        with self._lock:
+            group = self._get_group(key)
+            group.weight = weight if weight and weight > 0 else 1
+            group.max_running_pipelines = max_running_pipelines
+            self._schedule(group)
+
+    def push(self, instance_id, key, priority=0):
+        with self._lock:
+            group = self._get_group(key)
+            self._clean(group)
+            if not group.queue:
+                group.virtual_time = max(group.virtual_time, self._virtual_time)
+            heapq.heappush(group.queue, (-priority, next(self._sequence), instance_id))
+            self._queued[instance_id] = key
+            if group.queue[0][2] == instance_id:
+                self._schedule(group)
+
+    def pop(self, admit=None):
+        with self._lock:
+            if 0 < self.max_running_pipelines <= len(self._running):
+                return None
+            deferred = []
+            result = None
+            while self._ready:
+                entry = heapq.heappop(self._ready)
+                neg_priority, _, token, key = entry
+                group = self._groups[key]
+                if group.token != token:
+                    continue
+                self._clean(group)
+                if not group.queue:
+                    group.token = None
+                    continue
+                if group.queue[0][0] != neg_priority:
+                    self._schedule(group)
+                    continue
+                if deferred and neg_priority > deferred[0][0]:
+                    deferred.append(entry)
+                    break
+                instance_id = group.queue[0][2]
+                if admit and not admit(instance_id, key):
+                    deferred.append(entry)
+                    continue
+                heapq.heappop(group.queue)
+                del self._queued[instance_id]
+                self._running[instance_id] = key
+                group.running += 1
+                self._virtual_time = max(self._virtual_time, group.virtual_time)
+                group.virtual_time += 1.0 / group.weight
+                self._schedule(group)
+                result = instance_id
+                break
+            for entry in deferred:
+                heapq.heappush(self._ready, entry)
+            return result
+
+    def release(self, instance_id):
+        with self._lock:
+            key = self._running.pop(instance_id, None)
+            if key is None:
+                return False
+            group = self._groups[key]
+            group.running -= 1
+            if group.token is None:
+                self._schedule(group)
+            return True
+
+    def remove(self, instance_id):
+        with self._lock:
+            return self._queued.pop(instance_id, None) is not None
+
+    def is_queued(self, instance_id):
+        return instance_id in self._queued
+
+    def running_instances(self):
+        with self._lock:
+            return list(self._running)
+
+    def queued_count(self):
+        return len(self._queued)
+
+    def running_count(self, key=None):
+        with self._lock:
+            if key is None:
+                return len(self._running)
+            group = self._groups.get(key)
+            return group.running if group else 0
+
+    def _get_group(self, key):
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = PipelineScheduler._Group(key)
+        return group
+
+    def _clean(self, group):
+        while group.queue and group.queue[0][2] not in self._queued:
+            heapq.heappop(group.queue)
+
+    def _schedule(self, group):
+        self._clean(group)
+        if (not group.queue) or group.at_capacity():
+            group.token = None
+            return
+        group.token = next(self._sequence)
+        heapq.heappush(self._ready, (group.queue[0][0],
+                                     group.virtual_time,
+                                     group.token,
+                                     group.key))
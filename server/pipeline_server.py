@@ -10,6 +10,9 @@ from collections import namedtuple
 from server.arguments import parse_options
 from server.pipeline_manager import PipelineManager
 from server.model_manager import ModelManager
+from server.model_cache import CompiledModelCache
+from server.worker_pool import WorkerPool
+from server.node_coordinator import NodeCoordinator
 from server.common.utils import logging
 
 # Allow non-PascalCase class name for __PipelineServer
@@ -67,9 +70,11 @@ class __PipelineServer:
 
             if (self._instance):
                 result = self._pipeline_server.pipeline_manager.get_instance_status(self._instance)
+                if result is None:
+                    return None
 
-                if 'avg_pipeline_latency' not in result:
-                    result['avg_pipeline_latency'] = None
+                if 'pipeline_latency' not in result:
+                    result['pipeline_latency'] = None
 
                 if (not self._status_named_tuple):
                     self._status_named_tuple = namedtuple(
@@ -79,6 +84,11 @@ class __PipelineServer:
 
             return None
 
+        def profile(self):
+            if (self._instance):
+                return self._pipeline_server.pipeline_manager.get_instance_profile(self._instance)
+            return None
+
         def _set_or_update(self, request, section_name, section=None):
             if (section is None):
                 section = {}
@@ -110,6 +120,8 @@ class __PipelineServer:
         self.options = None
         self.model_manager = None
         self.pipeline_manager = None
+        self.worker_pool = None
+        self.node_coordinator = None
         self._stopped = True
 
     def _log_options(self):
@@ -127,19 +139,47 @@ class __PipelineServer:
             self.options = parse_options(_options)
             logging.set_default_log_level(self.options.log_level)
             self._log_options()
+            pipeline_dir = os.path.abspath(os.path.join(self.options.config_path,
+                                                        self.options.pipeline_dir))
+            model_names = None
+            if (self.options.model_scan == "referenced"):
+                model_names = PipelineManager.get_referenced_models(pipeline_dir)
             self.model_manager = ModelManager(
                 os.path.abspath(
                     os.path.join(self.options.config_path,
                                  self.options.model_dir)),
                 self.options.network_preference,
-                self.options.ignore_init_errors)
+                self.options.ignore_init_errors,
+                manifest_path=self.options.model_manifest or None,
+                model_names=model_names,
+                reload_callback=self._reload_worker_models,
+                compiled_model_cache=CompiledModelCache.create(self.options))
+
+            if (self.options.worker_processes > 0):
+                self.worker_pool = WorkerPool(self.options.worker_processes,
+                                              self.options,
+                                              self.model_manager.model_dir,
+                                              model_names)
+
+            if (self.options.coordinator) or (self.options.coordinator_nodes):
+                self.node_coordinator = NodeCoordinator(self.options.coordinator_nodes)
 
             self.pipeline_manager = PipelineManager(
                 self.model_manager,
-                os.path.abspath(os.path.join(self.options.config_path,
-                                             self.options.pipeline_dir)),
+                pipeline_dir,
                 max_running_pipelines=self.options.max_running_pipelines,
-                ignore_init_errors=self.options.ignore_init_errors)
+                ignore_init_errors=self.options.ignore_init_errors,
+                node_budget=self.options.node_budget,
+                fps_control={"target_fps": self.options.target_fps,
+                             "hysteresis": self.options.fps_hysteresis,
+                             "window": self.options.fps_window},
+                instance_ttl=self.options.instance_ttl,
+                max_stopped_instances=self.options.max_stopped_instances,
+                start_workers=self.options.start_workers,
+                worker_pool=self.worker_pool,
+                node_coordinator=self.node_coordinator,
+                preload_pipelines=self.options.preload_pipelines)
+            self.model_manager.watch(self.options.model_reload_interval)
             self._stopped = False
 
     def __del__(self):
@@ -150,18 +190,26 @@ class __PipelineServer:
 
     def wait(self):
         for instance in self.pipeline_instances():
-            status = instance.status()
-            while (not status.state.stopped()):
-                time.sleep(1)
-                status = instance.status()
+            instance.wait()
 
     def stop(self):
 
-        for instance in self.pipeline_instances():
-            if (not instance.status().state.stopped()):
-                instance.stop()
-                while (not instance.status().state.stopped()):
-                    time.sleep(1)
+        if (self.pipeline_manager):
+            stopped = self.pipeline_manager.stop_instances()
+            self.pipeline_manager.wait_for_instances(
+                [result["id"] for result in stopped])
+            self.pipeline_manager.admission_controller.stop()
+
+        if (self.model_manager):
+            self.model_manager.stop()
+
+        if (self.worker_pool):
+            self.worker_pool.stop()
+            self.worker_pool = None
+
+        if (self.node_coordinator):
+            self.node_coordinator.stop()
+            self.node_coordinator = None
 
         if (self.options) and (self.options.framework == "gstreamer") and (not self._stopped):
             try:
@@ -178,7 +226,8 @@ class __PipelineServer:
                                        pipeline.config,
                                        self._logger,
                                        instance_id)
-                    for instance_id, pipeline in self.pipeline_manager.pipeline_instances.items()]
+                    for instance_id, pipeline
+                    in list(self.pipeline_manager.pipeline_instances.items())]
 
         return []
 
@@ -200,11 +249,27 @@ class __PipelineServer:
         return [self.ModelProxy(self, x, self._logger)
                 for x in self.model_manager.get_loaded_models()]
 
+    def reload_models(self):
+        reloaded = self.model_manager.reload()
+        if (reloaded):
+            self._reload_worker_models()
+        return reloaded
+
+    def _reload_worker_models(self):
+        if (self.worker_pool):
+            self.worker_pool.reload_models()
+
     def pipeline_instance(self, name, version, request):
         if (not self._stopped):
             return self.pipeline_manager.create_instance(name, version, request, self.options)
 
         return None, "Pipeline Server Stopped"
 
+    def pipeline_instances_batch(self, name, version, requests):
+        if (not self._stopped):
+            return self.pipeline_manager.create_instances(name, version, requests, self.options)
+
+        return None, "Pipeline Server Stopped"
+
 
 PipelineServer = __PipelineServer()
@@ -0,0 +1,49 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import string
+from threading import Lock
+
+
+class PipelineTemplate:
+    '''
+    Pipeline template parsed once into a render plan of literal text and
+    replacement fields. Rendering resolves only the fields the template
+    references, with the same lookup and formatting rules as str.format,
+    so values can be a view over the request instead of a copy.
+    '''
+
+    _cache = {}
+    _cache_lock = Lock()
+
+    def __init__(self, template):
+        self.template = template
+        self._formatter = string.Formatter()
+        self._plan = list(self._formatter.parse(template))
+        self.field_names = {field_name for _, field_name, _, _ in self._plan
+                            if field_name is not None}
+
+    @staticmethod
+    def get(template):
+        compiled = PipelineTemplate._cache.get(template)
+        if compiled is None:
+            compiled = PipelineTemplate(template)
+            with PipelineTemplate._cache_lock:
+                compiled = PipelineTemplate._cache.setdefault(template, compiled)
+        return compiled
+
+    def render(self, values):
+        parts = []
+        for literal, field_name, format_spec, conversion in self._plan:
+            parts.append(literal)
+            if field_name is None:
+                continue
+            value, _ = self._formatter.get_field(field_name, [], values)
+            value = self._formatter.convert_field(value, conversion)
+            if format_spec and "{" in format_spec:
+                format_spec = self._formatter.vformat(format_spec, [], values)
+            parts.append(self._formatter.format_field(value, format_spec))
+        return "".join(parts)
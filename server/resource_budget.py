@@ -0,0 +1,138 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import os
+import time
+from threading import Lock
+from server.common.utils import logging
+
+
+class ResourceBudget:
+    '''
+    Tracks the node resource budget and the resources reserved by
+    running pipeline instances.
+
+    Each pipeline version declares a cost vector in its definition,
+    for example {"cpu": 2, "memory": 1024, "inference": 1}. An instance
+    is admitted only while the remaining budget covers its cost. When a
+    pipeline opts in to learning, its cpu cost is replaced by an
+    exponential moving average of the cpu used by completed runs. Cpu
+    time is measured for the whole process and split evenly across the
+    instances that were running at the same time, so learned values are
+    an approximation.
+    '''
+
+    RESOURCES = ("cpu", "memory", "inference")
+    MIN_LEARNING_DURATION = 1.0
+
+    def __init__(self, budget=None, learning_rate=0.2):
+        self._logger = logging.get_logger('ResourceBudget', is_static=True)
+        self._lock = Lock()
+        self.budget = {}
+        for resource, value in (budget or {}).items():
+            if resource not in ResourceBudget.RESOURCES:
+                self._logger.warning("Ignoring unknown resource {} in node budget".format(resource))
+                continue
+            if value > 0:
+                self.budget[resource] = float(value)
+        self.learning_rate = learning_rate
+        self._used = dict.fromkeys(self.budget, 0.0)
+        self._costs = {}
+        self._learned = {}
+        self._learn = set()
+        self._reservations = {}
+        self._busy_integral = 0.0
+        self._busy_time = time.time()
+
+    def enabled(self):
+        return bool(self.budget)
+
+    def configure(self, key, cost=None):
+        cost = dict(cost or {})
+        learn = cost.pop("learn", False)
+        with self._lock:
+            self._costs[key] = {resource: float(cost.get(resource, 0))
+                                for resource in ResourceBudget.RESOURCES}
+            if learn:
+                self._learn.add(key)
+            else:
+                self._learn.discard(key)
+
+    def cost(self, key):
+        result = dict(self._costs.get(key, dict.fromkeys(ResourceBudget.RESOURCES, 0.0)))
+        result.update(self._learned.get(key, {}))
+        return result
+
+    def reserve(self, instance_id, key):
+        with self._lock:
+            if instance_id in self._reservations:
+                return True
+            cost = self.cost(key)
+            if self._reservations and not self._fits(cost):
+                return False
+            if not self._reservations and not self._fits(cost):
+                self._logger.warning("Cost of pipeline {} exceeds node budget, "
+                                     "starting it on an idle node".format("/".join(key)))
+            self._update_busy_integral()
+            for resource in self._used:
+                self._used[resource] += cost[resource]
+            self._reservations[instance_id] = (key, cost, time.time(),
+                                               self._cpu_time(), self._busy_integral)
+            return True
+
+    def release(self, instance_id):
+        with self._lock:
+            reservation = self._reservations.get(instance_id)
+            if reservation is None:
+                return
+            self._update_busy_integral()
+            del self._reservations[instance_id]
+            key, cost, start_time, start_cpu_time, start_busy_integral = reservation
+            for resource in self._used:
+                self._used[resource] = max(0.0, self._used[resource] - cost[resource])
+            if key in self._learn:
+                self._learn_cpu(key, time.time() - start_time,
+                                self._cpu_time() - start_cpu_time,
+                                self._busy_integral - start_busy_integral)
+
+    def capacity(self):
+        with self._lock:
+            return {
+                "budget": dict(self.budget),
+                "used": dict(self._used),
+                "available": {resource: max(0.0, value - self._used[resource])
+                              for resource, value in self.budget.items()},
+                "reserved_instances": len(self._reservations),
+                "pipelines": {"/".join(key): self.cost(key) for key in self._costs}
+            }
+
+    def _fits(self, cost):
+        return all(self._used[resource] + cost[resource] <= value
+                   for resource, value in self.budget.items())
+
+    def _update_busy_integral(self):
+        now = time.time()
+        self._busy_integral += len(self._reservations) * (now - self._busy_time)
+        self._busy_time = now
+
+    def _learn_cpu(self, key, duration, cpu_time, busy_integral):
+        if duration < ResourceBudget.MIN_LEARNING_DURATION or busy_integral <= 0:
+            return
+        concurrency = busy_integral / duration
+        observed = cpu_time / duration / concurrency
+        learned = self._learned.setdefault(key, {})
+        previous = learned.get("cpu")
+        if previous is None:
+            learned["cpu"] = observed
+        else:
+            learned["cpu"] = previous + self.learning_rate * (observed - previous)
+        self._logger.debug("Learned cpu cost {:.2f} for pipeline {}".format(
+            learned["cpu"], "/".join(key)))
+
+    @staticmethod
+    def _cpu_time():
+        times = os.times()
+        return times.user + times.system + times.children_user + times.children_system
@@ -6,6 +6,7 @@
 from http import HTTPStatus
 import connexion
 from server.common.utils import logging
+from server.pipeline import Pipeline
 from server.pipeline_server import PipelineServer
 
 
@@ -31,6 +32,73 @@ def models_get():  # noqa: E501
         return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
 
 
+def models_reload_post():  # noqa: E501
+    """models_reload_post
+
+    Reload models from the models directory # noqa: E501
+
+
+    :rtype: object
+    """
+    try:
+        logger.debug("POST on /models/reload")
+        reloaded = PipelineServer.reload_models()
+        return {"reloaded": reloaded,
+                "models": PipelineServer.model_manager.get_loaded_models()}
+    except Exception as error:
+        logger.error('models_reload_post %s', error)
+        return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+def nodes_get():  # noqa: E501
+    """nodes_get
+
+    Return nodes registered with the coordinator and their load # noqa: E501
+
+
+    :rtype: List[object]
+    """
+    try:
+        logger.debug("GET on /nodes")
+        if not PipelineServer.node_coordinator:
+            return ('Coordinator mode not enabled', HTTPStatus.BAD_REQUEST)
+        return PipelineServer.node_coordinator.get_nodes()
+    except Exception as error:
+        logger.error('nodes_get %s', error)
+        return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+def nodes_post():  # noqa: E501
+    """nodes_post
+
+    Register a pipeline server node with the coordinator # noqa: E501
+
+    :param node_request:
+    :type node_request: dict | bytes
+
+    :rtype: object
+    """
+    logger.debug("POST on /nodes")
+    if connexion.request.is_json:
+        try:
+            if not PipelineServer.node_coordinator:
+                return ('Coordinator mode not enabled', HTTPStatus.BAD_REQUEST)
+            node_request = connexion.request.get_json()
+            if not isinstance(node_request, dict):
+                return ('Invalid Request, Body must be an object', HTTPStatus.BAD_REQUEST)
+            url = node_request.get("url")
+            if not url:
+                return ('Invalid Request, url is required', HTTPStatus.BAD_REQUEST)
+            if not isinstance(url, str):
+                return ('Invalid Request, url must be a string', HTTPStatus.BAD_REQUEST)
+            return PipelineServer.node_coordinator.register(url)
+        except Exception as error:
+            logger.error('Exception in nodes_post %s', error)
+            return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
+
+    return('Invalid Request, Body must be valid JSON', HTTPStatus.BAD_REQUEST)
+
+
 def pipelines_get():  # noqa: E501
     """pipelines_get
 
@@ -198,24 +266,95 @@ def pipelines_name_version_instance_id_status_get(name, version, instance_id):
         logger.error('pipelines_name_version_instance_id_status_get %s', error)
         return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
 
-def pipelines_status_get_all():  # noqa: E501
+def pipelines_status_get_all(state=None, pipeline=None, tag=None,
+                             limit=None, cursor=None, fields=None):  # noqa: E501
     """pipelines_status_get_all
 
     Returns all instance status summary # noqa: E501
 
+    :param state: Comma separated list of states to return
+    :type state: str
+    :param pipeline: Pipeline name or name/version to return
+    :type pipeline: str
+    :param tag: Tags as key or key:value that instances must have
+    :type tag: List[str]
+    :param limit: Maximum number of instances to return
+    :type limit: int
+    :param cursor: Cursor returned in X-Next-Cursor by a previous request
+    :type cursor: str
+    :param fields: Comma separated list of status fields to return
+    :type fields: str
+
     :rtype: object
     """
+    # pylint: disable=too-many-arguments
     try:
         logger.debug("GET on /pipelines/status")
-        results = PipelineServer.pipeline_manager.get_all_instance_status()
+        try:
+            states = [Pipeline.State[value.strip().upper()]
+                      for value in state.split(",")] if state else None
+            cursor = int(cursor) if cursor else None
+        except (KeyError, ValueError):
+            return ('Invalid state or cursor', HTTPStatus.BAD_REQUEST)
+        fields = [field.strip() for field in fields.split(",")] if fields else None
+        results, next_cursor = PipelineServer.pipeline_manager.query_instance_status(
+            states, pipeline, tag, limit, cursor, fields)
         for result in results:
-            result['state'] = result['state'].name
+            if 'state' in result:
+                result['state'] = result['state'].name
+        if next_cursor is not None:
+            return results, HTTPStatus.OK, {'X-Next-Cursor': str(next_cursor)}
         return results
     except Exception as error:
         logger.error('pipelines_status_get %s', error)
         return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
 
 
+def pipelines_capacity_get():  # noqa: E501
+    """pipelines_capacity_get
+
+    Returns node resource budget and usage # noqa: E501
+
+    :rtype: object
+    """
+    try:
+        logger.debug("GET on /pipelines/capacity")
+        return PipelineServer.pipeline_manager.get_capacity()
+    except Exception as error:
+        logger.error('pipelines_capacity_get %s', error)
+        return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+def pipelines_admission_get():  # noqa: E501
+    """pipelines_admission_get
+
+    Returns state and recent decisions of the fps admission controller # noqa: E501
+
+    :rtype: object
+    """
+    try:
+        logger.debug("GET on /pipelines/admission")
+        return PipelineServer.pipeline_manager.get_admission_state()
+    except Exception as error:
+        logger.error('pipelines_admission_get %s', error)
+        return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+def pipelines_metrics_get():  # noqa: E501
+    """pipelines_metrics_get
+
+    Returns pipeline server runtime metrics # noqa: E501
+
+    :rtype: object
+    """
+    try:
+        logger.debug("GET on /pipelines/metrics")
+        return PipelineServer.pipeline_manager.get_metrics()
+    except Exception as error:
+        logger.error('pipelines_metrics_get %s', error)
+        return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
 def pipelines_instance_id_status_get(instance_id):  # noqa: E501
     """pipelines_instance_id_status_get
 
@@ -238,6 +377,27 @@ def pipelines_instance_id_status_get(instance_id):  # noqa: E501
         return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
 
 
+def pipelines_instance_id_profile_get(instance_id):  # noqa: E501
+    """pipelines_instance_id_profile_get
+
+    Return instance per element latency profile # noqa: E501
+
+    :param instance_id:
+    :type instance_id: int
+
+    :rtype: object
+    """
+    try:
+        logger.debug("GET on /pipelines/{id}/profile".format(id=instance_id))
+        result = PipelineServer.pipeline_manager.get_instance_profile(instance_id)
+        if result is not None:
+            return result
+        return ('Invalid instance', HTTPStatus.BAD_REQUEST)
+    except Exception as error:
+        logger.error('pipelines_instance_id_profile_get %s', error)
+        return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
 def pipelines_name_version_post(name, version):  # noqa: E501
     """pipelines_name_version_post
 
@@ -268,3 +428,83 @@ def pipelines_name_version_post(name, version):  # noqa: E501
             return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
 
     return('Invalid Request, Body must be valid JSON', HTTPStatus.BAD_REQUEST)
+
+
+def pipelines_name_version_batch_post(name, version):  # noqa: E501
+    """pipelines_name_version_batch_post
+
+    Start new instances of pipeline, one per request in the body.
+    Returns the instance id or error of each request in order # noqa: E501
+
+    :param name:
+    :type name: str
+    :param version:
+    :type version: str
+    :param pipeline_requests:
+    :type pipeline_requests: list | bytes
+
+    :rtype: List[object]
+    """
+
+    logger.debug(
+        "POST on /pipelines/{name}/{version}/batch".format(name=name, version=str(version)))
+    if connexion.request.is_json:
+        try:
+            requests = connexion.request.get_json()
+            if not isinstance(requests, list):
+                return ('Invalid Request, Body must be a list of requests', HTTPStatus.BAD_REQUEST)
+            results, err = PipelineServer.pipeline_instances_batch(name, version, requests)
+            if results is not None:
+                return results
+            return (err, HTTPStatus.BAD_REQUEST)
+        except Exception as error:
+            logger.error('Exception in pipelines_name_version_batch_post %s', error)
+            return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
+
+    return('Invalid Request, Body must be valid JSON', HTTPStatus.BAD_REQUEST)
+
+
+def _is_string_list(value):
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def pipelines_stop_post():  # noqa: E501
+    """pipelines_stop_post
+
+    Stop pipeline instances by id, pipeline or tags.
+    Returns the state or error of each selected instance # noqa: E501
+
+    :param stop_request:
+    :type stop_request: dict | bytes
+
+    :rtype: List[object]
+    """
+
+    logger.debug("POST on /pipelines/stop")
+    if connexion.request.is_json:
+        try:
+            stop_request = connexion.request.get_json()
+            if not isinstance(stop_request, dict):
+                return ('Invalid Request, Body must be an object', HTTPStatus.BAD_REQUEST)
+            instances = stop_request.get("instances")
+            if (instances is not None) and (not _is_string_list(instances)):
+                return ('Invalid Request, instances must be a list of ids', HTTPStatus.BAD_REQUEST)
+            pipeline = stop_request.get("pipeline")
+            if (pipeline is not None) and (not isinstance(pipeline, str)):
+                return ('Invalid Request, pipeline must be a string', HTTPStatus.BAD_REQUEST)
+            tags = stop_request.get("tags")
+            if (tags is not None) and (not _is_string_list(tags)):
+                return ('Invalid Request, tags must be a list of strings', HTTPStatus.BAD_REQUEST)
+            if (instances is None) and (not pipeline) and (not tags):
+                return ('Invalid Request, one of instances, pipeline or tags is required',
+                        HTTPStatus.BAD_REQUEST)
+            results = PipelineServer.pipeline_manager.stop_instances(instances, pipeline, tags)
+            for result in results:
+                if 'state' in result:
+                    result['state'] = result['state'].name
+            return results
+        except Exception as error:
+            logger.error('Exception in pipelines_stop_post %s', error)
+            return ('Unexpected error', HTTPStatus.INTERNAL_SERVER_ERROR)
+
+    return('Invalid Request, Body must be valid JSON', HTTPStatus.BAD_REQUEST)
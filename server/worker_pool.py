@@ -0,0 +1,490 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import copy
+import itertools
+import multiprocessing
+import traceback
+from argparse import Namespace
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from threading import Event, Lock, Thread
+from server.common.utils import logging
+from server.pipeline import Pipeline, StartPhases
+from server.pipeline_metrics import FrameRateMeter
+
+
+def _import_pipeline_types(logger):
+    pipeline_types = {}
+    try:
+        from server.gstreamer_pipeline import GStreamerPipeline  # pylint: disable=import-outside-toplevel
+        pipeline_types['GStreamer'] = GStreamerPipeline
+    except Exception as error:
+        logger.info("GStreamer Pipelines Not Enabled: %s", error)
+    try:
+        from server.ffmpeg_pipeline import FFmpegPipeline  # pylint: disable=import-outside-toplevel
+        pipeline_types['FFmpeg'] = FFmpegPipeline
+    except Exception as error:
+        logger.info("FFmpeg Pipelines Not Enabled: %s", error)
+    return pipeline_types
+
+
+def _worker_main(connection, options, model_dir, model_names):
+    _Worker(connection, options, model_dir, model_names).run()
+
+
+class _Worker:
+    '''
+    Runs in a worker process. Hosts pipeline instances and serves
+    calls from the parent process received on the connection. Each call
+    runs on a thread pool so a slow start does not block status calls.
+    The status of every hosted instance is pushed to the parent each
+    status interval.
+    '''
+
+    THREADS = 8
+    STATUS_INTERVAL = 1.0
+
+    def __init__(self, connection, options, model_dir, model_names):
+        # pylint: disable=import-outside-toplevel
+        from server.model_manager import ModelManager
+        from server.model_cache import CompiledModelCache
+        logging.set_default_log_level(options.log_level)
+        self._logger = logging.get_logger('PipelineWorker', is_static=True)
+        self._connection = connection
+        self._options = options
+        self._send_lock = Lock()
+        self._pipelines = {}
+        self._stop_requested = set()
+        self._executor = ThreadPoolExecutor(max_workers=_Worker.THREADS)
+        self._stopped = Event()
+        self._model_manager = ModelManager(model_dir,
+                                           options.network_preference,
+                                           options.ignore_init_errors,
+                                           manifest_path=options.model_manifest or None,
+                                           model_names=model_names,
+                                           compiled_model_cache=CompiledModelCache.create(options))
+        self._pipeline_types = _import_pipeline_types(self._logger)
+
+    def run(self):
+        status_thread = Thread(target=self._push_status, daemon=True)
+        status_thread.start()
+        while True:
+            try:
+                message = self._connection.recv()
+            except (EOFError, OSError):
+                message = None
+            if message is None:
+                break
+            self._executor.submit(self._handle, *message)
+        self._stopped.set()
+        status_thread.join()
+        for pipeline in list(self._pipelines.values()):
+            pipeline.stop()
+        self._executor.shutdown(wait=True)
+
+    def _push_status(self):
+        while not self._stopped.wait(_Worker.STATUS_INTERVAL):
+            statuses = {}
+            for instance_id, pipeline in list(self._pipelines.items()):
+                try:
+                    statuses[instance_id] = pipeline.status()
+                except Exception as error:
+                    self._logger.warning("Error reading status of Pipeline {}: {}".format(
+                        instance_id, error))
+            if statuses:
+                try:
+                    self._send(("status", statuses))
+                except (OSError, ValueError):
+                    break
+
+    def _send(self, message):
+        with self._send_lock:
+            self._connection.send(message)
+
+    def _handle(self, call_id, method, args):
+        try:
+            result = getattr(self, "_call_" + method)(*args)
+            self._send(("result", call_id, result, None))
+        except Exception as error:
+            self._logger.error(traceback.format_exc())
+            self._send(("result", call_id, None, str(error)))
+
+    def _call_start(self, instance_id, pipeline_type, config, request):
+        pipeline = self._pipeline_types[pipeline_type](
+            instance_id,
+            config,
+            self._model_manager,
+            request,
+            partial(self._finished, instance_id),
+            self._options)
+        self._pipelines[instance_id] = pipeline
+        if instance_id in self._stop_requested:
+            self._stop_requested.discard(instance_id)
+            pipeline.stop()
+        try:
+            pipeline.start()
+        except Exception:
+            # The parent reports the instance as failed, so do not leave
+            # it running here
+            self._pipelines.pop(instance_id, None)
+            pipeline.stop()
+            raise
+        return pipeline.status()
+
+    def _call_stop(self, instance_id):
+        pipeline = self._pipelines.get(instance_id)
+        if pipeline is None:
+            self._stop_requested.add(instance_id)
+            return None
+        return pipeline.stop()
+
+    def _call_status(self, instance_id):
+        pipeline = self._pipelines.get(instance_id)
+        return pipeline.status() if pipeline else None
+
+    def _call_params(self, instance_id):
+        pipeline = self._pipelines.get(instance_id)
+        return pipeline.params() if pipeline else None
+
+    def _call_profile(self, instance_id):
+        pipeline = self._pipelines.get(instance_id)
+        return pipeline.profile() if pipeline else None
+
+    def _call_reload_models(self):
+        return self._model_manager.reload()
+
+    def _call_metrics(self):
+        return {pipeline_type: pipeline_class.get_metrics()
+                for pipeline_type, pipeline_class in self._pipeline_types.items()}
+
+    def _finished(self, instance_id):
+        pipeline = self._pipelines.pop(instance_id, None)
+        if pipeline is not None:
+            self._send(("finished", instance_id, pipeline.status(), pipeline.params(),
+                        pipeline.profile()))
+
+
+class WorkerProcess:
+    '''
+    Parent side of a worker process. Calls are sent over a pipe and
+    matched with their results by id on a reader thread, which also
+    delivers the status pushed by the worker and pipeline finished
+    events.
+    '''
+
+    CALL_TIMEOUT = 60.0
+
+    def __init__(self, index, options, model_dir, model_names=None):
+        self.index = index
+        self._logger = logging.get_logger('WorkerProcess', is_static=True)
+        self.pipelines = {}
+        self.assigned = 0
+        self._stopping = False
+        self._lock = Lock()
+        self._send_lock = Lock()
+        self._calls = {}
+        self._sequence = itertools.count()
+        context = multiprocessing.get_context("spawn")
+        self._connection, child_connection = context.Pipe()
+        self._process = context.Process(target=_worker_main,
+                                        args=(child_connection, options, model_dir, model_names),
+                                        name="PipelineWorker{}".format(index),
+                                        daemon=True)
+        self._process.start()
+        child_connection.close()
+        self.alive = True
+        self._reader = Thread(target=self._read, daemon=True)
+        self._reader.start()
+        self._logger.info("Started pipeline worker {} pid {}".format(index, self._process.pid))
+
+    def call(self, method, *args, timeout=CALL_TIMEOUT):
+        call_id = next(self._sequence)
+        pending = [Event(), None, None]
+        with self._lock:
+            if not self.alive:
+                raise RuntimeError("Pipeline worker {} exited".format(self.index))
+            self._calls[call_id] = pending
+        try:
+            try:
+                with self._send_lock:
+                    self._connection.send((call_id, method, args))
+            except (OSError, ValueError) as error:
+                raise RuntimeError("Pipeline worker {} exited".format(self.index)) from error
+            if not pending[0].wait(timeout):
+                raise RuntimeError("Pipeline worker {} did not respond to {}".format(
+                    self.index, method))
+        finally:
+            with self._lock:
+                self._calls.pop(call_id, None)
+        if pending[2]:
+            raise RuntimeError(pending[2])
+        return pending[1]
+
+    def _read(self):
+        while True:
+            try:
+                message = self._connection.recv()
+            except (EOFError, OSError):
+                break
+            if message[0] == "result":
+                _, call_id, result, error = message
+                with self._lock:
+                    pending = self._calls.get(call_id)
+                if pending:
+                    pending[1] = result
+                    pending[2] = error
+                    pending[0].set()
+            elif message[0] == "status":
+                for instance_id, status in message[1].items():
+                    pipeline = self.pipelines.get(instance_id)
+                    if pipeline:
+                        pipeline.update_status(status)
+            elif message[0] == "finished":
+                _, instance_id, status, params, profile = message
+                pipeline = self.pipelines.pop(instance_id, None)
+                if pipeline:
+                    pipeline.finished(status, params, profile)
+        if self._stopping:
+            self._logger.info("Pipeline worker {} stopped".format(self.index))
+        else:
+            self._logger.warning("Pipeline worker {} exited".format(self.index))
+        with self._lock:
+            self.alive = False
+            for pending in self._calls.values():
+                pending[2] = "Pipeline worker {} exited".format(self.index)
+                pending[0].set()
+        for instance_id in list(self.pipelines):
+            pipeline = self.pipelines.pop(instance_id, None)
+            if pipeline:
+                pipeline.finished(None, None)
+
+    def stop(self, timeout=5.0):
+        self._stopping = True
+        try:
+            with self._send_lock:
+                self._connection.send(None)
+        except (OSError, ValueError):
+            pass
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+
+    def assign(self):
+        with self._lock:
+            self.assigned += 1
+
+    def release(self):
+        with self._lock:
+            self.assigned = max(0, self.assigned - 1)
+
+    def get_metrics(self):
+        metrics = {
+            "worker": self.index,
+            "pid": self._process.pid,
+            "alive": self.alive,
+            "instances": self.assigned,
+            "running": len(self.pipelines)
+        }
+        try:
+            metrics["pipeline_types"] = self.call("metrics")
+        except RuntimeError:
+            metrics["pipeline_types"] = {}
+        return metrics
+
+
+class RemotePipeline:
+    '''
+    Pipeline instance hosted by a worker process. Until it is started
+    the instance only exists in the parent. Status is served from the
+    last status pushed by the worker. Once finished, the final status
+    and parameters reported by the worker are kept locally.
+    '''
+
+    def __init__(self, worker, pipeline_type, identifier, config, request, finished_callback):
+        self._worker = worker
+        self._pipeline_type = pipeline_type
+        self.identifier = identifier
+        self.config = config
+        self.request = request
+        self.state = Pipeline.State.QUEUED
+        self._finished_callback = finished_callback
+        self._logger = logging.get_logger('RemotePipeline', is_static=True)
+        self._lock = Lock()
+        self._started = False
+        self._status = None
+        self._final_status = None
+        self._final_params = None
+        self._final_profile = {}
+        self._start_phases = StartPhases()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            stopped = self.state.stopped()
+            if not stopped:
+                self._worker.pipelines[self.identifier] = self
+        if stopped:
+            self.finished(None, None)
+            return
+        try:
+            # Start includes building the pipeline and loading its models,
+            # so it is not bounded by the call timeout. The call still
+            # returns if the worker exits.
+            status = self._worker.call("start", self.identifier, self._pipeline_type,
+                                       self.config, self.request, timeout=None)
+            if status is not None:
+                self.update_status(status)
+        except Exception as error:
+            self._logger.error("Error on Pipeline {id}: {err}".format(
+                id=self.identifier, err=error))
+            self._worker.pipelines.pop(self.identifier, None)
+            self.finished(None, None)
+
+    def stop(self):
+        with self._lock:
+            if not self._started:
+                if not self.state.stopped():
+                    self.state = Pipeline.State.ABORTED
+                return self.status()
+        if self._final_status is None:
+            try:
+                status = self._worker.call("stop", self.identifier)
+                if status is not None:
+                    return status
+            except RuntimeError as error:
+                self._logger.warning("Error stopping Pipeline {id}: {err}".format(
+                    id=self.identifier, err=error))
+        return self.status()
+
+    def _local_status(self):
+        return {
+            "id": self.identifier,
+            "state": self.state,
+            "avg_fps": 0,
+            "fps": FrameRateMeter.unmeasured(),
+            "frames": {"processed": 0, "dropped": 0},
+            "start_time": None,
+            "elapsed_time": None,
+            "start_phases": self._start_phases.durations()
+        }
+
+    def update_status(self, status):
+        with self._lock:
+            if self._final_status is None:
+                self._status = status
+                self.state = status["state"]
+
+    def status(self):
+        if self._final_status is not None:
+            return dict(self._final_status)
+        status = self._status
+        if status is not None:
+            return dict(status)
+        return self._local_status()
+
+    def params(self):
+        if self._final_params is not None:
+            return copy.deepcopy(self._final_params)
+        if self._started:
+            try:
+                params = self._worker.call("params", self.identifier)
+                if params is not None:
+                    return params
+            except RuntimeError:
+                pass
+        return self._local_params()
+
+    def _local_params(self):
+        request = copy.deepcopy(self.request)
+        request.pop("models", None)
+        return {
+            "id": self.identifier,
+            "request": request,
+            "type": self.config["type"],
+            "launch_command": None
+        }
+
+    def profile(self):
+        if self._final_status is not None:
+            return self._final_profile
+        if self._started:
+            try:
+                profile = self._worker.call("profile", self.identifier)
+                if profile is not None:
+                    return profile
+            except RuntimeError:
+                pass
+        return {}
+
+    def finished(self, status, params, profile=None):
+        with self._lock:
+            if self._final_status is not None:
+                return
+            if status is None:
+                if not self.state.stopped():
+                    self.state = Pipeline.State.ERROR
+                status = self._local_status()
+                params = self._local_params()
+            self._final_params = params
+            self._final_profile = profile or {}
+            self._final_status = status
+            self.state = status["state"]
+        self._worker.release()
+        self._finished_callback()
+
+
+class WorkerPool:
+    '''
+    Pool of worker processes hosting pipeline instances. New instances
+    are placed on the live worker hosting the fewest instances. Requests
+    that are not portable run in the parent process.
+    '''
+
+    def __init__(self, processes, options, model_dir, model_names=None):
+        worker_options = Namespace(**vars(options))
+        worker_options.enable_rtsp = False
+        worker_options.enable_webrtc = False
+        worker_options.worker_processes = 0
+        # The parent watches the model directory and reloads workers
+        worker_options.model_reload_interval = 0
+        self._logger = logging.get_logger('WorkerPool', is_static=True)
+        self._lock = Lock()
+        self.workers = [WorkerProcess(index, worker_options, model_dir, model_names)
+                        for index in range(processes)]
+
+    def supports(self, request):
+        if not Pipeline.is_portable(request):
+            return False
+        return any(worker.alive for worker in self.workers)
+
+    def create_pipeline(self, pipeline_type, identifier, config, request, finished_callback):
+        with self._lock:
+            workers = [worker for worker in self.workers if worker.alive]
+            if not workers:
+                return None
+            worker = min(workers, key=lambda worker: worker.assigned)
+            worker.assign()
+            return RemotePipeline(worker, pipeline_type, identifier,
+                                  config, request, finished_callback)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+    def reload_models(self):
+        for worker in self.workers:
+            if worker.alive:
+                try:
+                    worker.call("reload_models")
+                except RuntimeError as error:
+                    self._logger.warning("Error reloading models in pipeline worker {}: {}".format(
+                        worker.index, error))
+
+    def get_metrics(self):
+        return [worker.get_metrics() for worker in self.workers]
@@ -0,0 +1,42 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+from server.admission_controller import FpsAdmissionController
+
+
+def _controller(running):
+    controller = FpsAdmissionController(lambda: list(running), lambda: None)
+    controller.stop()
+    return controller
+
+
+def test_untargeted_instances_not_limited():
+    running = []
+    controller = _controller(running)
+    controller.set_target("targeted", 30)
+    assert controller.limit == 1
+    assert controller.admit("untargeted", ["a", "b", "c"])
+    assert controller.admit("targeted", ["a", "b", "c"])
+
+
+def test_limit_counts_targeted_instances():
+    running = [("first", None)]
+    controller = _controller(running)
+    controller.set_target("first", 30)
+    controller.set_target("second", 30)
+    assert controller.limit == 1
+    assert not controller.admit("second", ["first", "other"])
+
+
+def test_limit_reset_when_no_targeted_instance_running():
+    running = [("targeted", None)]
+    controller = _controller(running)
+    controller.set_target("targeted", 30)
+    running.clear()
+    controller.remove("targeted")
+    assert controller.evaluate()
+    assert controller.limit is None
+    assert controller.admit("next", ["other"])
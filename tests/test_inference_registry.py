@@ -0,0 +1,61 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+from server.inference_registry import InferenceRegistry
+
+
+class _Type:
+    name = "GstGvaDetect"
+
+
+class _Element:
+    __gtype__ = _Type()
+
+    def __init__(self, **properties):
+        self.properties = {"model": "model.xml", "device": "CPU", "batch-size": 1}
+        self.properties.update(properties)
+
+    def get_property(self, name):
+        return self.properties[name]
+
+
+def _key(**properties):
+    element = _Element(**properties)
+    return InferenceRegistry.get_key(element, element.properties)
+
+
+def test_at_most_two_instances_per_configuration():
+    registry = InferenceRegistry(max_batch_size=8)
+    instances = [registry.acquire(_key(), object()) for _ in range(32)]
+    assert [instance.batch_size for instance in instances[:2]] == [1, 8]
+    assert {instance.identifier for instance in instances[1:]} == {instances[1].identifier}
+    assert len(registry.get_metrics()) == 2
+
+
+def test_elements_of_one_pipeline_share_instance():
+    registry = InferenceRegistry(max_batch_size=8)
+    pipeline = object()
+    first = registry.acquire(_key(), pipeline)
+    assert registry.acquire(_key(), pipeline) is first
+
+
+def test_explicit_batch_size_grouped_and_kept():
+    registry = InferenceRegistry(max_batch_size=8)
+    assert _key(**{"batch-size": 4}) != _key()
+    instances = [registry.acquire(_key(**{"batch-size": 4}), object()) for _ in range(3)]
+    assert {instance.batch_size for instance in instances} == {4}
+    assert len({instance.identifier for instance in instances}) == 1
+
+
+def test_instance_freed_with_last_stream():
+    registry = InferenceRegistry(max_batch_size=8)
+    first, second = object(), object()
+    registry.acquire(_key(), first)
+    registry.acquire(_key(), second)
+    registry.release(first)
+    assert [info["batch_size"] for info in registry.get_metrics()] == [8]
+    registry.release(second)
+    assert registry.get_metrics() == []
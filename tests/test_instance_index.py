@@ -0,0 +1,88 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import itertools
+
+from server.instance_index import InstanceIndex
+from server.pipeline import Pipeline
+
+
+def _index(count):
+    index = InstanceIndex()
+    for number in range(count):
+        index.add("id{}".format(number), "detection" if number % 2 else "classification", "1",
+                  {"camera": "lobby" if number % 3 else "gate"})
+    return index
+
+
+def test_query_in_creation_order():
+    index = _index(200)
+    assert list(index.query()) == ["id{}".format(number) for number in range(200)]
+
+
+def test_query_filters():
+    index = _index(20)
+    result = list(index.query(pipeline="detection/1", tags=["camera:gate"]))
+    assert result == ["id{}".format(number) for number in range(20)
+                      if number % 2 and not number % 3]
+
+
+def test_query_states_in_creation_order():
+    index = _index(10)
+    index.set_stopped("id7", Pipeline.State.COMPLETED)
+    index.set_stopped("id2", Pipeline.State.ERROR)
+    index.set_stopped("id4", Pipeline.State.COMPLETED)
+    assert list(index.query([Pipeline.State.COMPLETED, Pipeline.State.ERROR])) == \
+        ["id2", "id4", "id7"]
+    active = list(index.query([Pipeline.State.QUEUED, Pipeline.State.ERROR]))
+    assert active == ["id{}".format(number) for number in range(10) if number not in (4, 7)]
+
+
+def test_query_queued_and_running_separately():
+    index = _index(10)
+    for number in (1, 5, 8):
+        index.set_running("id{}".format(number))
+    index.set_stopped("id5", Pipeline.State.COMPLETED)
+    index.set_stopped("id3", Pipeline.State.ABORTED)
+    assert list(index.query([Pipeline.State.RUNNING])) == ["id1", "id8"]
+    assert list(index.query([Pipeline.State.QUEUED])) == \
+        ["id{}".format(number) for number in (0, 2, 4, 6, 7, 9)]
+    index.set_running("id3")
+    assert list(index.query([Pipeline.State.ABORTED])) == ["id3"]
+
+
+def test_query_pages_from_cursor():
+    index = _index(500)
+    pages = []
+    cursor = None
+    while True:
+        page = list(itertools.islice(index.query(cursor=cursor), 30))
+        if not page:
+            break
+        pages.extend(page)
+        cursor = index.cursor(page[-1])
+    assert pages == ["id{}".format(number) for number in range(500)]
+
+
+def test_remove():
+    index = _index(5)
+    index.set_stopped("id1", Pipeline.State.ABORTED)
+    index.remove("id1")
+    index.remove("id3")
+    assert list(index.query()) == ["id0", "id2", "id4"]
+    assert not list(index.query([Pipeline.State.ABORTED]))
+    assert index.cursor("id1") is None
+
+
+def test_query_sees_removal_in_later_batch():
+    index = _index(InstanceIndex.QUERY_BATCH * 4)
+    result = []
+    for instance_id in index.query(pipeline="detection/1"):
+        result.append(instance_id)
+        if len(result) == 1:
+            index.remove("id201")
+    assert "id201" not in result
+    assert len(result) == InstanceIndex.QUERY_BATCH * 2 - 1
@@ -0,0 +1,88 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+import os
+import time
+from server.model_cache import CompiledModelCache
+
+
+def _network(tmp_path, name):
+    network = tmp_path / "models" / "{}.xml".format(name)
+    network.parent.mkdir(exist_ok=True)
+    network.write_text(name)
+    return str(network)
+
+
+def _cache(tmp_path, max_size=-1):
+    cache = CompiledModelCache(str(tmp_path / "cache"), max_size)
+    _update(cache)
+    return cache
+
+
+def _update(cache):
+    cache.schedule_update()
+    cache._executor.submit(lambda: None).result()
+
+
+def _write(cache_dir, size, age=0):
+    with open(os.path.join(cache_dir, "model.blob"), "wb") as blob:
+        blob.write(b"0" * size)
+    os.utime(cache_dir, (time.time() - age, time.time() - age))
+
+
+def test_miss_then_hit(tmp_path):
+    cache = _cache(tmp_path)
+    network = _network(tmp_path, "a")
+    cache_dir = cache.get_cache_dir(network, "CPU")
+    _write(cache_dir, 10)
+    assert cache.get_cache_dir(network, "CPU") == cache_dir
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used_after_write(tmp_path):
+    cache = _cache(tmp_path, max_size=150)
+    old = cache.get_cache_dir(_network(tmp_path, "old"), "CPU")
+    new = cache.get_cache_dir(_network(tmp_path, "new"), "CPU")
+    _write(old, 100, age=60)
+    _write(new, 100)
+    _update(cache)
+    assert not os.path.exists(old)
+    assert os.path.isdir(new)
+    assert cache.get_stats()["size"] == 100
+    assert cache.evictions == 1
+
+
+def test_pending_entry_not_evicted(tmp_path):
+    cache = _cache(tmp_path, max_size=0)
+    cache_dir = cache.get_cache_dir(_network(tmp_path, "a"), "CPU")
+    _update(cache)
+    assert os.path.isdir(cache_dir)
+
+
+def test_unmarked_directories_kept(tmp_path):
+    other = tmp_path / "cache" / "other"
+    other.mkdir(parents=True)
+    (other / "data").write_bytes(b"0" * 100)
+    cache = _cache(tmp_path, max_size=0)
+    network = _network(tmp_path, "a")
+    _write(cache.get_cache_dir(network, "CPU"), 10)
+    _update(cache)
+    assert (other / "data").exists()
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_changed_network_invalidates(tmp_path):
+    cache = _cache(tmp_path)
+    network = _network(tmp_path, "a")
+    first = cache.get_cache_dir(network, "CPU")
+    _write(first, 10)
+    with open(network, "a") as network_file:
+        network_file.write("changed")
+    second = cache.get_cache_dir(network, "CPU")
+    _update(cache)
+    assert first != second
+    assert not os.path.exists(first)
+    assert cache.invalidations == 1
@@ -0,0 +1,30 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+from server.model_manager import ModelManager
+
+
+def _model(model_dir, name, precision):
+    version_dir = model_dir / name / "1"
+    (version_dir / precision).mkdir(parents=True)
+    (version_dir / precision / "{}.xml".format(name)).write_text(name)
+    (version_dir / "{}.json".format(name)).write_text("{}")
+
+
+def test_reload_swaps_snapshot(tmp_path):
+    _model(tmp_path, "first", "FP32")
+    manager = ModelManager(str(tmp_path))
+    snapshot = manager.snapshot
+    reference = "{models[second][1][VA_DEVICE_DEFAULT][network]}"
+    _model(tmp_path, "second", "FP32")
+    assert manager.reload()
+    # A reader holding the old snapshot keeps a consistent view
+    assert set(snapshot.models) == {"first"}
+    assert manager.get_default_network_for_device("CPU", reference, snapshot) == \
+        "{models[second][1][network]}"
+    network = manager.get_default_network_for_device("CPU", reference)
+    assert network == str(tmp_path / "second" / "1" / "FP32" / "second.xml")
+    assert manager.snapshot.model_properties["model-proc"][network].endswith("second.json")
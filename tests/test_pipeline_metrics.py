@@ -0,0 +1,45 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+from server.pipeline_metrics import FrameRateMeter, LatencyTracker
+
+
+def test_unmatched_only_when_evicted():
+    tracker = LatencyTracker(size=4)
+    for key in range(4):
+        assert tracker.start(key, now=key)
+    assert tracker.snapshot()["unmatched"] == 0
+    tracker.start(4, now=4)
+    assert tracker.snapshot()["unmatched"] == 1
+    assert not tracker.end(0, now=5)
+    assert tracker.end(1, now=5)
+    assert tracker.pending == 3
+    assert tracker.snapshot()["count"] == 1
+
+
+def test_latency_longer_than_interval_recorded():
+    tracker = LatencyTracker(sample_interval=3)
+    sampled = [frame for frame in range(30) if tracker.start(frame, now=frame)]
+    assert sampled == list(range(2, 30, 3))
+    # Each sampled frame arrives 10 frames, three sample intervals, later
+    for frame in sampled:
+        assert tracker.end(frame, now=frame + 10)
+    snapshot = tracker.snapshot()
+    assert (snapshot["count"], snapshot["unmatched"]) == (len(sampled), 0)
+    assert snapshot["max"] == 10
+
+
+def test_frame_rate_from_samples_only():
+    meter = FrameRateMeter()
+    meter.start(now=0)
+    for tick in range(1, 41):
+        # 30 fps for 5 seconds, then stalled
+        now = tick * 0.25
+        meter.update(min(now, 5) * 30, now=now)
+    assert meter.rates() == meter.rates()
+    rates = meter.rates()
+    assert rates["1s"] == 0
+    assert rates["10s"] == 15
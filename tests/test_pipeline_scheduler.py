@@ -0,0 +1,134 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+from server.pipeline_scheduler import PipelineScheduler
+
+HEAVY = ("heavy", "1")
+LIGHT = ("light", "1")
+
+
+def _push(scheduler, key, count, priority=0):
+    ids = ["{}-{}".format(key[0], index) for index in range(count)]
+    for instance_id in ids:
+        scheduler.push(instance_id, key, priority)
+    return ids
+
+
+def _pop_all(scheduler):
+    result = []
+    instance_id = scheduler.pop()
+    while instance_id is not None:
+        result.append(instance_id)
+        instance_id = scheduler.pop()
+    return result
+
+
+def test_weighted_share():
+    scheduler = PipelineScheduler()
+    scheduler.configure(HEAVY, weight=3)
+    scheduler.configure(LIGHT, weight=1)
+    _push(scheduler, HEAVY, 12)
+    _push(scheduler, LIGHT, 12)
+    started = _pop_all(scheduler)
+    assert len(started) == 24
+    first = started[:16]
+    heavy = sum(1 for instance_id in first if instance_id.startswith("heavy"))
+    assert heavy == 12
+    assert len(first) - heavy == 4
+
+
+def test_weighted_share_with_global_cap():
+    scheduler = PipelineScheduler(max_running_pipelines=4)
+    scheduler.configure(HEAVY, weight=3)
+    _push(scheduler, HEAVY, 20)
+    _push(scheduler, LIGHT, 20)
+    started = _pop_all(scheduler)
+    assert len(started) == 4
+    assert scheduler.pop() is None
+    for _ in range(10):
+        scheduler.release(started.pop(0))
+        started.extend(_pop_all(scheduler))
+    heavy = sum(1 for instance_id in started if instance_id.startswith("heavy"))
+    assert heavy == 3 * (len(started) - heavy)
+
+
+def test_priority_before_arrival():
+    scheduler = PipelineScheduler()
+    _push(scheduler, HEAVY, 2)
+    scheduler.push("urgent", LIGHT, priority=5)
+    assert scheduler.pop() == "urgent"
+
+
+def test_per_version_cap():
+    scheduler = PipelineScheduler()
+    scheduler.configure(HEAVY, max_running_pipelines=2)
+    heavy = _push(scheduler, HEAVY, 5)
+    light = _push(scheduler, LIGHT, 1)
+    started = _pop_all(scheduler)
+    assert sorted(started) == sorted(heavy[:2] + light)
+    assert scheduler.running_count(HEAVY) == 2
+    assert scheduler.pop() is None
+    assert scheduler.release(heavy[0])
+    assert scheduler.pop() == heavy[2]
+    assert scheduler.pop() is None
+    assert scheduler.queued_count() == 2
+
+
+def test_remove_queued_head():
+    scheduler = PipelineScheduler()
+    first, second, third = _push(scheduler, HEAVY, 3)
+    assert scheduler.remove(first)
+    assert not scheduler.is_queued(first)
+    assert not scheduler.remove(first)
+    assert scheduler.pop() == second
+    assert scheduler.pop() == third
+    assert scheduler.pop() is None
+    assert not scheduler.release(first)
+
+
+def test_remove_only_queued_instance_of_group():
+    scheduler = PipelineScheduler()
+    (head,) = _push(scheduler, HEAVY, 1)
+    (other,) = _push(scheduler, LIGHT, 1)
+    assert scheduler.remove(head)
+    assert _pop_all(scheduler) == [other]
+    assert scheduler.queued_count() == 0
+
+
+def test_admit_declines_group():
+    scheduler = PipelineScheduler()
+    _push(scheduler, HEAVY, 2)
+    (light,) = _push(scheduler, LIGHT, 1)
+    assert scheduler.pop(lambda _, key: key != HEAVY) == light
+    assert scheduler.pop() == "heavy-0"
+
+
+def test_release_reschedules_capped_group():
+    scheduler = PipelineScheduler()
+    scheduler.configure(HEAVY, max_running_pipelines=1)
+    first, second = _push(scheduler, HEAVY, 2)
+    assert _pop_all(scheduler) == [first]
+    assert scheduler.release(first)
+    assert scheduler.pop() == second
+    assert scheduler.running_instances() == [second]
+
+
+def test_push_higher_priority_behind_running_head():
+    scheduler = PipelineScheduler()
+    first, second = _push(scheduler, HEAVY, 2)
+    assert scheduler.pop() == first
+    scheduler.push("urgent", HEAVY, priority=1)
+    assert scheduler.pop() == "urgent"
+    assert scheduler.pop() == second
+
+
+def test_declined_head_blocks_lower_priority():
+    scheduler = PipelineScheduler()
+    scheduler.push("costly", HEAVY, priority=5)
+    _push(scheduler, LIGHT, 2)
+    assert scheduler.pop(lambda _, key: key != HEAVY) is None
+    assert scheduler.pop() == "costly"
+    assert scheduler.pop() == "light-0"
@@ -0,0 +1,32 @@
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+from server.pipeline import Pipeline, PipelineTombstone
+
+
+class _Pipeline:
+    identifier = "id1"
+    config = {"type": "GStreamer"}
+    request = {"pipeline": {"name": "object_detection", "version": "person_vehicle_bike"},
+               "source": {"uri": "file:///tmp/video.mp4", "type": "uri"}}
+
+    @staticmethod
+    def status():
+        return {"id": "id1", "state": Pipeline.State.COMPLETED, "avg_fps": 30.0,
+                "fps": {"1s": 30.0}, "start_time": 1.0, "elapsed_time": 2.0,
+                "start_phases": {"parse": 0.1}, "pipeline_latency": {"count": 1}}
+
+
+def test_keeps_only_summary():
+    tombstone = PipelineTombstone(_Pipeline())
+    assert tombstone.state == Pipeline.State.COMPLETED
+    assert tombstone.status() == {"id": "id1", "state": Pipeline.State.COMPLETED,
+                                  "avg_fps": 30.0, "fps": {"1s": 30.0},
+                                  "start_time": 1.0, "elapsed_time": 2.0}
+    assert tombstone.params() == {
+        "id": "id1", "type": "GStreamer",
+        "request": {"pipeline": {"name": "object_detection", "version": "person_vehicle_bike"}}}
+    assert tombstone.profile() == {}
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+# Measures PipelineManager.create_instance throughput: request
+# validation, default merging and bookkeeping, with a pipeline type
+# that does not start anything. Pass --repo to measure another checkout.
+
+import argparse
+import os
+import sys
+import timeit
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline instance creation")
+    parser.add_argument("--repo", default=os.path.join(os.path.dirname(__file__), "..", ".."))
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    repo = os.path.abspath(args.repo)
+    sys.path.insert(0, repo)
+    # pylint: disable=import-outside-toplevel
+    from server.pipeline import Pipeline
+    from server.pipeline_manager import PipelineManager
+
+    class IdlePipeline(Pipeline):
+        # pylint: disable=too-many-arguments,super-init-not-called
+        def __init__(self, identifier, config, model_manager, request, finished_callback,
+                     options):
+            self.identifier = identifier
+            self.config = config
+            self.request = request
+            self.state = Pipeline.State.QUEUED
+
+        def start(self):
+            pass
+
+        def stop(self):
+            return self.status()
+
+        def params(self):
+            return {"id": self.identifier, "request": self.request}
+
+        def status(self):
+            return {"id": self.identifier, "state": self.state}
+
+    class Models:
+        # pylint: disable=too-few-public-methods
+        models = {}
+
+    PipelineManager._import_pipeline_types = lambda self: {"GStreamer": IdlePipeline}
+    manager = PipelineManager(Models(), os.path.join(repo, "pipelines", "gstreamer"), 1, True)
+    request = {"source": {"uri": "file:///tmp/video.mp4", "type": "uri"},
+               "destination": {"metadata": {"type": "file", "path": "/tmp/results.jsonl",
+                                            "format": "json-lines"}},
+               "parameters": {"detection-device": "CPU", "threshold": 0.5},
+               "tags": {"camera": "lobby"}}
+
+    def create():
+        manager.create_instance("object_detection", "person_vehicle_bike", request, None)
+
+    best = min(timeit.repeat(create, number=args.count, repeat=args.repeat))
+    print("{:.0f} creates/s ({:.1f} us per create)".format(
+        args.count / best, best / args.count * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+# Measures the cost of element property lookups for one start of a many
+# element pipeline built with Gst.parse_launch, listing the properties
+# of the element for every lookup (as before the per GType cache) and
+# with GStreamerPipeline._get_properties. Parse time is reported for
+# scale. Requires GStreamer and its Python bindings, plus Intel(R) DL
+# Streamer for the default launch string.
+
+import argparse
+import os
+import sys
+import timeit
+
+DEFAULT_LAUNCH = ("videotestsrc num-buffers=1 ! decodebin ! videoconvert ! " +
+                  " ! ".join(["gvadetect model=model.xml name=detect{0} ! queue name=queue{0}".format(
+                      index) for index in range(20)]) +
+                  " ! gvametaconvert ! gvametapublish ! appsink name=appsink")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark element property lookups")
+    parser.add_argument("--repo", default=os.path.join(os.path.dirname(__file__), "..", ".."))
+    parser.add_argument("--launch", default=DEFAULT_LAUNCH)
+    parser.add_argument("--lookups", type=int, default=8,
+                        help="Property lookups per element and start")
+    parser.add_argument("--repeat", type=int, default=20)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, os.path.abspath(args.repo))
+    # pylint: disable=import-outside-toplevel
+    import gi
+    gi.require_version('Gst', '1.0')
+    from gi.repository import Gst
+    Gst.init(None)
+    from server.gstreamer_pipeline import GStreamerPipeline
+
+    pipeline = Gst.parse_launch(args.launch)
+    elements = list(pipeline.iterate_recurse())
+    names = ["model", "device", "model-instance-id", "ie-config",
+             "model-proc", "labels", "batch-size", "nireq"]
+
+    def listed():
+        for element in elements:
+            for index in range(args.lookups):
+                _ = names[index % len(names)] in [x.name for x in element.list_properties()]
+
+    def cached():
+        for element in elements:
+            properties = GStreamerPipeline._get_properties(element)
+            for index in range(args.lookups):
+                _ = names[index % len(names)] in properties
+
+    def parse():
+        Gst.parse_launch(args.launch).set_state(Gst.State.NULL)
+
+    results = {
+        "parse_launch": min(timeit.repeat(parse, number=1, repeat=args.repeat)),
+        "listed per lookup": min(timeit.repeat(listed, number=1, repeat=args.repeat)),
+        "cached per GType": min(timeit.repeat(cached, number=1, repeat=args.repeat)),
+    }
+    print("{} elements, {} lookups per element".format(len(elements), args.lookups))
+    for name, seconds in results.items():
+        print("{:<18} {:8.3f} ms per start".format(name, seconds * 1000))
+
+
+if __name__ == "__main__":
+    main()
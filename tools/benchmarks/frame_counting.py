@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+# Measures the process CPU time spent counting frames at an appsink for
+# a number of concurrent streams: pulling every sample into Python on
+# new-sample (as before native counting) against discarding frames in
+# the sink and reading its rendered statistics, optionally with a
+# source pad probe as used by latency sampling. Requires GStreamer and
+# its Python bindings.
+
+import argparse
+import time
+
+import gi
+gi.require_version('Gst', '1.0')
+gi.require_version('GstApp', '1.0')
+from gi.repository import GLib, Gst  # pylint: disable=wrong-import-position
+
+LAUNCH = ("videotestsrc name=source num-buffers={frames} ! "
+          "video/x-raw,width=320,height=240,framerate=1000/1 ! appsink name=appsink sync=false")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark appsink frame counting")
+    parser.add_argument("--streams", type=int, default=100)
+    parser.add_argument("--frames", type=int, default=1000)
+    return parser.parse_args()
+
+
+def _on_sample(sink, counts):
+    sink.emit("pull-sample")
+    counts[0] += 1
+    return Gst.FlowReturn.OK
+
+
+def _source_probe(unused_pad, unused_info, counts):
+    counts[1] += 1
+    return Gst.PadProbeReturn.OK
+
+
+def run(mode, args):
+    loop = GLib.MainLoop()
+    pipelines = []
+    remaining = [args.streams]
+
+    def on_message(unused_bus, message, pipeline):
+        if message.type in (Gst.MessageType.EOS, Gst.MessageType.ERROR):
+            pipeline[1] = pipeline[0].get_by_name("appsink").get_property(
+                "stats").get_value("rendered")
+            remaining[0] -= 1
+            if not remaining[0]:
+                loop.quit()
+
+    for _ in range(args.streams):
+        pipeline = Gst.parse_launch(LAUNCH.format(frames=args.frames))
+        sink = pipeline.get_by_name("appsink")
+        counts = [0, 0]
+        if mode == "signal":
+            sink.set_property("emit-signals", True)
+            sink.connect("new-sample", _on_sample, counts)
+        else:
+            sink.set_property("emit-signals", False)
+            sink.set_property("drop", True)
+            sink.set_property("max-buffers", 1)
+            if mode == "stats+probe":
+                pipeline.get_by_name("source").get_static_pad("src").add_probe(
+                    Gst.PadProbeType.BUFFER, _source_probe, counts)
+        entry = [pipeline, 0, counts]
+        bus = pipeline.get_bus()
+        bus.add_signal_watch()
+        bus.connect("message", on_message, entry)
+        pipelines.append(entry)
+
+    cpu = time.process_time()
+    wall = time.perf_counter()
+    for pipeline, _, _ in pipelines:
+        pipeline.set_state(Gst.State.PLAYING)
+    loop.run()
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    frames = sum(entry[2][0] if mode == "signal" else entry[1] for entry in pipelines)
+    for pipeline, _, _ in pipelines:
+        pipeline.get_bus().remove_signal_watch()
+        pipeline.set_state(Gst.State.NULL)
+    print("{:<12} {:8d} frames {:8.2f} s CPU {:8.2f} s wall {:8.1f} us CPU per frame".format(
+        mode, frames, cpu, wall, cpu / max(1, frames) * 1e6))
+
+
+def main():
+    args = parse_args()
+    Gst.init(None)
+    for mode in ("signal", "stats", "stats+probe"):
+        run(mode, args)
+
+
+if __name__ == "__main__":
+    main()
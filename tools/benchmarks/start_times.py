@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+'''
+* Copyright (C) 2019-2020 Intel Corporation.
+*
+* SPDX-License-Identifier: BSD-3-Clause
+'''
+
+# Measures pipeline start latency against a running pipeline server.
+# Instances are started one at a time and each is stopped once it is
+# RUNNING, so every start sees an idle server. Reports the time from
+# the POST to RUNNING and the start_phases of each instance.
+
+import argparse
+import json
+import statistics
+import time
+import urllib.request
+
+PHASES = ("queued", "parse", "configure", "preroll", "first_frame")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark pipeline start latency")
+    parser.add_argument("--server", default="http://localhost:8080")
+    parser.add_argument("--pipeline", default="object_detection/person_vehicle_bike")
+    parser.add_argument("--request", default=json.dumps({
+        "source": {"uri": "https://github.com/intel-iot-devkit/sample-videos/blob/master/"
+                          "person-bicycle-car-detection.mp4?raw=true",
+                   "type": "uri"},
+        "destination": {"metadata": {"type": "file", "path": "/tmp/results.jsonl",
+                                     "format": "json-lines"}}}),
+                        help="Request body as JSON")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    return parser.parse_args()
+
+
+def _call(method, url, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, method=method,
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read() or "null")
+
+
+def start_instance(args, request):
+    start = time.perf_counter()
+    instance_id = _call("POST", "{}/pipelines/{}".format(args.server, args.pipeline), request)
+    status_url = "{}/pipelines/status/{}".format(args.server, instance_id)
+    while True:
+        status = _call("GET", status_url)
+        if status["state"] != "QUEUED":
+            break
+        if time.perf_counter() - start > args.timeout:
+            raise RuntimeError("Instance {} did not start".format(instance_id))
+        time.sleep(0.005)
+    elapsed = time.perf_counter() - start
+    _call("DELETE", "{}/pipelines/{}".format(args.server, instance_id))
+    if status["state"] != "RUNNING":
+        raise RuntimeError("Instance {} ended as {}".format(instance_id, status["state"]))
+    return elapsed, status.get("start_phases") or {}
+
+
+def main():
+    args = parse_args()
+    request = json.loads(args.request)
+    results = []
+    for _ in range(args.count):
+        elapsed, phases = start_instance(args, request)
+        results.append(elapsed)
+        print("start {:.1f} ms ({})".format(elapsed * 1000, ", ".join(
+            "{} {:.1f}".format(phase, phases[phase] * 1000)
+            for phase in PHASES if phases.get(phase) is not None)))
+    print("first {:.1f} ms, median of the rest {:.1f} ms".format(
+        results[0] * 1000, statistics.median(results[1:] or results) * 1000))
+
+
+if __name__ == "__main__":
+    main()